@@ -0,0 +1,71 @@
+# Benchmarks the lookups of the resolver cache for growing counts of names,
+# e.g.: python benchmark_cache.py --entries 1000 100000 --shared-response
+
+# std libraries
+import csv
+import json
+import sys
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+# local libraries
+from dns.recursive_resolver.cache_benchmark import CacheBenchmark
+from logger import logger
+
+
+def started_as_main() -> bool:
+    return __name__ == "__main__"
+
+
+def parse_arguments(argv: [str]) -> Namespace:
+    parser = ArgumentParser(
+        description="Fills the resolver cache with growing counts of names, "
+                    "benchmarks its lookups "
+                    "and prints one JSON line per count."
+    )
+    parser.add_argument("-e", "--entries", type=int, nargs="+",
+                        default=[1000, 10000, 100000, 1000000],
+                        help="Counts of cached names.")
+    parser.add_argument("--lookups", type=int,
+                        default=CacheBenchmark.DEFAULT_LOOKUPS,
+                        help="Lookups per measured operation.")
+    parser.add_argument("--shared-response", action="store_true",
+                        help="Cache one shared response for all names, "
+                             "so e.g. 10M names fit into the memory.")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("--csv", default=None,
+                        help="File to write the results as CSV to.")
+    return parser.parse_args(argv)
+
+
+def run_benchmark(arguments: Namespace, entries: int) -> {str: float}:
+    """
+    Runs the benchmark of one count of names, in a new process.
+    """
+    logger.set_enabled(False)
+    benchmark = CacheBenchmark(
+        entries, arguments.lookups, arguments.shared_response, arguments.seed
+    )
+    return benchmark.run()
+
+
+def main(argv: [str]) -> None:
+    arguments = parse_arguments(argv)
+    all_results = []
+    context = get_context("spawn")  # clean memory per count
+    for entries in sorted(arguments.entries):
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            results = executor.submit(
+                run_benchmark, arguments, entries
+            ).result()
+        print(json.dumps(results), flush=True)
+        all_results.append(results)
+    if arguments.csv is not None and all_results:
+        with open(arguments.csv, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=all_results[0])
+            writer.writeheader()
+            writer.writerows(all_results)
+
+
+if started_as_main():
+    main(sys.argv[1:])
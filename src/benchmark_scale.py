@@ -0,0 +1,109 @@
+# Benchmarks the servers for growing generated topologies, e.g.:
+# python benchmark_scale.py --depth 2 --fan-outs 2 8 32 --records 10 1000
+
+# std libraries
+import csv
+import json
+import sys
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+# local libraries
+from logger import logger
+from topology.scale_benchmark import ScaleBenchmark
+from topology.topology_generator import TopologyGenerator
+from transport.memory_transport import MemoryTransport
+
+
+def started_as_main() -> bool:
+    return __name__ == "__main__"
+
+
+def parse_arguments(argv: [str]) -> Namespace:
+    parser = ArgumentParser(
+        description="Generates topologies of growing size, "
+                    "benchmarks the servers for each of them "
+                    "and prints one JSON line per topology."
+    )
+    parser.add_argument("-d", "--depth", type=int, nargs="+", default=[2],
+                        help="Counts of zone levels below the root.")
+    parser.add_argument("-f", "--fan-outs", type=int, nargs="+",
+                        default=[2, 4, 8, 16, 32],
+                        help="Counts of child zones per zone.")
+    parser.add_argument("-r", "--records", type=int, nargs="+",
+                        default=[10, 100, 1000],
+                        help="Counts of A records per leaf zone.")
+    parser.add_argument("--lookups", type=int,
+                        default=ScaleBenchmark.DEFAULT_LOOKUPS,
+                        help="Authoritative lookups per topology.")
+    parser.add_argument("--rate", type=float,
+                        default=ScaleBenchmark.DEFAULT_QUERY_RATE,
+                        help="Resolver queries per simulated second.")
+    parser.add_argument("--duration", type=float,
+                        default=ScaleBenchmark.DEFAULT_QUERY_DURATION,
+                        help="Simulated seconds of resolver queries.")
+    parser.add_argument("--names", type=int,
+                        default=ScaleBenchmark.DEFAULT_DISTINCT_NAMES,
+                        help="Count of different names queried.")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-o", "--output-dir", default="../log/topology",
+                        help="Directory for the generated topologies.")
+    parser.add_argument("--csv", default=None,
+                        help="File to write the results as CSV to.")
+    parser.add_argument("--max-startup", type=float, default=None,
+                        help="Stop growing the topology, "
+                             "once the startup takes longer (seconds).")
+    parser.add_argument("--kernel-sockets", action="store_true",
+                        help="Bind kernel sockets instead of "
+                             "using an in-memory transport.")
+    return parser.parse_args(argv)
+
+
+def run_benchmark(arguments: Namespace,
+                  depth: int, fan_out: int, records: int) -> {str: float}:
+    """
+    Runs the benchmark of one topology, in a new process.
+    """
+    logger.set_enabled(False)
+    benchmark = ScaleBenchmark(
+        TopologyGenerator(depth, fan_out, records),
+        f"{arguments.output_dir}/d{depth}_f{fan_out}_r{records}",
+        arguments.lookups, arguments.rate, arguments.duration,
+        arguments.names, arguments.seed,
+        transport=None if arguments.kernel_sockets else MemoryTransport()
+    )
+    return benchmark.run()
+
+
+def main(argv: [str]) -> None:
+    arguments = parse_arguments(argv)
+    sizes = sorted(
+        (TopologyGenerator(depth, fan_out, records).get_record_count(),
+         depth, fan_out, records)
+        for depth in arguments.depth
+        for fan_out in arguments.fan_outs
+        for records in arguments.records
+    )
+    all_results = []
+    context = get_context("spawn")  # clean memory per topology
+    for _, depth, fan_out, records in sizes:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            results = executor.submit(
+                run_benchmark, arguments, depth, fan_out, records
+            ).result()
+        print(json.dumps(results), flush=True)
+        all_results.append(results)
+        if arguments.max_startup is not None \
+                and results["startup_seconds"] > arguments.max_startup:
+            print(f"Startup took longer than {arguments.max_startup}s, "
+                  f"larger topologies are skipped.")
+            break
+    if arguments.csv is not None and all_results:
+        with open(arguments.csv, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=all_results[0])
+            writer.writeheader()
+            writer.writerows(all_results)
+
+
+if started_as_main():
+    main(sys.argv[1:])
@@ -0,0 +1,281 @@
+# Resolves a large list of names, e.g.:
+# python bulk_resolve.py names.txt -o results.jsonl --concurrency 64 --rate 500
+
+# std libraries
+import csv
+import json
+import os
+import sys
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+from typing import Callable, Iterable, TextIO
+# local libraries
+from dns.dns_message import DnsMessage
+from latency_histogram import LatencyHistogram
+from token_bucket import TokenBucket
+
+
+class BulkResolver:
+    """
+    Resolves a stream of names with a bounded count of parallel lookups
+    and an optional rate limit.
+    The results are written as JSON lines or CSV in the order of the names,
+    as soon as all previous names are resolved.
+    Since at most a window of names is in flight,
+    the memory usage doesn't depend on the count of names.
+    After every CHECKPOINT_INTERVAL results, the count of written results
+    is stored in the checkpoint file, so an interrupted run can be resumed.
+    The checkpoint also stores the size of the output file in bytes
+    at that time, so results written after the checkpoint are cut off
+    on resume
+    instead of being written twice.
+    """
+
+    CSV_FIELDS = ("name", "address", "ttl", "rcode", "latency_ms", "error")
+    CHECKPOINT_INTERVAL = 1000
+    WINDOW_PER_WORKER = 4
+
+    @staticmethod
+    def read_checkpoint(checkpoint_file: str or None) -> (int, int or None):
+        """
+        Returns the count of names, which were already resolved,
+        or 0 if there is no checkpoint,
+        and the size of the output file with their results
+        or None if it is unknown (e.g. written to stdout).
+        """
+        if checkpoint_file is None or not os.path.exists(checkpoint_file):
+            return 0, None
+        with open(checkpoint_file) as file:
+            values = file.read().split()
+        written = int(values[0]) if values else 0
+        output_size = int(values[1]) if len(values) > 1 else None
+        return written, output_size
+
+    def __init__(self,
+                 resolve: Callable[[str], DnsMessage],
+                 output: TextIO, output_format: str = "jsonl",
+                 concurrency: int = 16, rate: float or None = None,
+                 checkpoint_file: str or None = None):
+        """
+        :param resolve: The function used to resolve a name.
+        :param output: The file to write the results to.
+        :param output_format: Either 'jsonl' or 'csv'.
+        :param concurrency: The max. count of parallel lookups.
+        :param rate: The max. count of lookups per second or None.
+        :param checkpoint_file: The file to store the progress in or None.
+        """
+        self.resolve = resolve
+        self.output = output
+        self.csv_writer = csv.writer(output) if output_format == "csv" \
+            else None
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(rate) if rate else None
+        self.checkpoint_file = checkpoint_file
+        self.window = BoundedSemaphore(
+            concurrency * BulkResolver.WINDOW_PER_WORKER
+        )
+        self.lock = Lock()
+        self.pending_results: {int: {str: str or int or float}} = {}
+        self.next_index = 0
+        self.written = 0
+        self.errors = 0
+        self.not_found = 0
+        self.latencies = LatencyHistogram()
+
+    def run(self, names: Iterable[str], skip: int = 0) -> None:
+        """
+        Resolves all names and writes the results.
+        :param skip: The count of names to skip, e.g. from a checkpoint.
+        """
+        self.next_index = skip
+        self.written = skip
+        if self.csv_writer is not None and skip == 0:
+            self.csv_writer.writerow(BulkResolver.CSV_FIELDS)
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            for index, name in enumerate(names):
+                if index < skip:
+                    continue
+                self.window.acquire()
+                if self.rate_limiter is not None:
+                    self.rate_limiter.consume()
+                executor.submit(self._resolve_name, index, name)
+        self._write_checkpoint()
+        self.output.flush()
+
+    def get_summary(self, elapsed_time: float) -> {str: int or float}:
+        summary = {
+            "resolved": self.latencies.count,
+            "not_found": self.not_found,
+            "errors": self.errors,
+            "seconds": elapsed_time,
+            "names_per_second":
+                self.latencies.count / elapsed_time if elapsed_time else 0.0
+        }
+        for key, latency in self.latencies.get_summary().items():
+            if key != "count":
+                summary[f"latency_{key}_ms"] = latency * 1000
+        return summary
+
+    def _resolve_name(self, index: int, name: str) -> None:
+        result = {"name": name, "address": None, "ttl": None,
+                  "rcode": None, "latency_ms": None, "error": None}
+        start_time = monotonic()
+        try:
+            dns_resp = self.resolve(name)
+            latency = monotonic() - start_time
+            self.latencies.add(latency)
+            result.update(address=dns_resp.get_address(),
+                          ttl=dns_resp.get_ttl(),
+                          rcode=dns_resp.get_value("dns.flags.rcode"),
+                          latency_ms=round(latency * 1000, 3))
+        except Exception as error:  # one failing name shouldn't stop the run
+            result["error"] = repr(error)
+        self._add_result(index, result)
+
+    def _add_result(self,
+                    index: int, result: {str: str or int or float}) -> None:
+        """
+        Writes the result and all following results, which are complete.
+        """
+        with self.lock:
+            self.pending_results[index] = result
+            while self.next_index in self.pending_results:
+                self._write_result(self.pending_results.pop(self.next_index))
+                self.next_index += 1
+                self.window.release()
+
+    def _write_result(self, result: {str: str or int or float}) -> None:
+        if result["error"] is not None:
+            self.errors += 1
+        elif not result["address"]:
+            self.not_found += 1
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(
+                [result[field] for field in BulkResolver.CSV_FIELDS]
+            )
+        else:
+            self.output.write(json.dumps(result) + "\n")
+        self.written += 1
+        if self.written % BulkResolver.CHECKPOINT_INTERVAL == 0:
+            self._write_checkpoint()
+
+    def _write_checkpoint(self) -> None:
+        """
+        Flushes the output and atomically replaces the checkpoint file.
+        The size of the output is read from its binary buffer,
+        since tell() of a text file isn't a count of bytes.
+        """
+        if self.checkpoint_file is None:
+            return
+        self.output.flush()
+        try:
+            output_size = self.output.buffer.tell()
+        except (AttributeError, OSError):  # e.g. a pipe or no file at all
+            output_size = None
+        tmp_filename = f"{self.checkpoint_file}.tmp"
+        with open(tmp_filename, "w") as file:
+            file.write(str(self.written) if output_size is None
+                       else f"{self.written} {output_size}")
+        os.replace(tmp_filename, self.checkpoint_file)
+
+
+def started_as_main() -> bool:
+    return __name__ == "__main__"
+
+
+def parse_arguments(argv: [str]) -> Namespace:
+    parser = ArgumentParser(
+        description="Resolves a list of names, one name per line."
+    )
+    parser.add_argument("input", nargs="?", default="-",
+                        help="File containing the names, '-' for stdin.")
+    parser.add_argument("-o", "--output", default="-",
+                        help="File to write the results to, '-' for stdout.")
+    parser.add_argument("-f", "--format", choices=("jsonl", "csv"),
+                        default="jsonl")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-r", "--rate", type=float, default=None,
+                        help="Max. count of lookups per second.")
+    parser.add_argument("--resolver", default="127.0.0.10:53053",
+                        help="Address of the recursive resolver, "
+                             "multiple comma separated addresses "
+                             "shard the names between the resolvers.")
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--in-process", action="store_true",
+                        help="Resolve by a local RecursiveResolver, "
+                             "instead of sending requests to a resolver.")
+    parser.add_argument("--start-servers", action="store_true",
+                        help="Start all servers of the config first.")
+    parser.add_argument("--checkpoint", default=None,
+                        help="File to store the progress in, "
+                             "an existing checkpoint will be resumed.")
+    return parser.parse_args(argv)
+
+
+def create_resolve_function(arguments: Namespace) -> Callable:
+    if arguments.in_process:
+        from dns.recursive_resolver.recursive_resolver import \
+            RecursiveResolver
+        from main import load_config
+        rec_res_config = load_config()[2]
+        return RecursiveResolver(rec_res_config["root"]).resolve
+    from dns.recursive_resolver.resolver_client import ResolverClient
+    from dns.recursive_resolver.sharded_resolver_client import \
+        ShardedResolverClient
+    resolver_addresses = [
+        (ip_address, int(port)) for ip_address, port in (
+            address.split(":") for address in arguments.resolver.split(",")
+        )
+    ]
+    if len(resolver_addresses) > 1:
+        client = ShardedResolverClient(
+            resolver_addresses, arguments.timeout, use_cache=False
+        )
+    else:
+        client = ResolverClient(
+            resolver_addresses[0], arguments.timeout, use_cache=False
+        )
+    return client.query
+
+
+def read_names(input_file: TextIO) -> Iterable[str]:
+    for line in input_file:
+        name = line.strip()
+        if name:
+            yield name
+
+
+def main(argv: [str]) -> None:
+    arguments = parse_arguments(argv)
+    if arguments.start_servers:
+        from main import main as run_all_server
+        run_all_server(in_background=True)
+    skip, output_size = BulkResolver.read_checkpoint(arguments.checkpoint)
+    input_file = sys.stdin if arguments.input == "-" \
+        else open(arguments.input)
+    if skip and output_size is not None and arguments.output != "-" \
+            and os.path.exists(arguments.output):
+        # drop the results written after the checkpoint, they're resolved again
+        os.truncate(arguments.output, output_size)
+    output_mode = "a" if skip else "w"
+    output = sys.stdout if arguments.output == "-" \
+        else open(arguments.output, output_mode, newline="")
+    bulk_resolver = BulkResolver(
+        create_resolve_function(arguments), output, arguments.format,
+        arguments.concurrency, arguments.rate, arguments.checkpoint
+    )
+    start_time = monotonic()
+    try:
+        bulk_resolver.run(read_names(input_file), skip)
+    finally:
+        summary = bulk_resolver.get_summary(monotonic() - start_time)
+        print(json.dumps(summary), file=sys.stderr)
+        for file in (input_file, output):
+            if file not in (sys.stdin, sys.stdout):
+                file.close()
+
+
+if started_as_main():
+    main(sys.argv[1:])
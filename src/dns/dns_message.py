@@ -1,4 +1,5 @@
 import json
+import re
 
 
 class DnsMessage:
@@ -8,8 +9,18 @@ class DnsMessage:
     to get a string representation as json string of the message.
     After the constructor the methods as_dns_request() and as_dns_response()
     can be used to set specific default values.
+    The values are stored in slots instead of a dict,
+    the boolean flags are packed into a bitfield
+    and unset values fall back to the shared defaults of the message type.
+    Messages created from a string are only decoded on first access.
     """
 
+    __slots__ = (
+        "_encoded", "_defaults", "_flags", "_flags_set",
+        "_id", "_address", "_answers", "_rcode", "_ns",
+        "_name", "_type", "_ttl", "_extra"
+    )
+
     # https://support.umbrella.com/hc/en-us/articles/232254248-Common-DNS-return-codes-for-any-DNS-service-and-Umbrella-
     R_CODES = {
         "NOERROR": 0,  # DNS Query completed successfully
@@ -33,6 +44,7 @@ class DnsMessage:
         "DNS": {
             "dns.a": None,  # IP Agresse
             "dns.count.answers": None,  # Count of answers
+            "dns.id": None,  # ID of the request, copied to the response
             "dns.flags.authoritative": None,  # True, if authoritative DNS server or False if recursive DNS server
             "dns.flags.rcode": None,  # response code,
             "dns.flags.recdesired": None,  # True, if recursion should be used by the server
@@ -63,10 +75,88 @@ class DnsMessage:
         }
     }
 
+    # the keys stored in typed slots, all other keys are stored in _extra
+    FIELD_SLOTS = {
+        "dns.id": "_id",
+        "dns.a": "_address",
+        "dns.count.answers": "_answers",
+        "dns.flags.rcode": "_rcode",
+        "dns.ns": "_ns",
+        "dns.qry.name": "_name",
+        "dns.qry.type": "_type",
+        "dns.resp.ttl": "_ttl"
+    }
+
+    FLAG_BITS = {
+        "dns.flags.authoritative": 1,
+        "dns.flags.recdesired": 2,
+        "dns.flags.response": 4
+    }
+
+    # batch messages, only included if set
+    BATCH_NAMES_KEY = "dns.qry.names"
+    BATCH_STREAM_KEY = "dns.flags.stream"
+    BATCH_ANSWERS_KEY = "dns.answers"
+    BATCH_REMAINING_KEY = "dns.batch.remaining"
+    ANSWER_KEYS = (
+        "dns.a", "dns.count.answers", "dns.flags.rcode", "dns.ns",
+        "dns.resp.ttl"
+    )
+    # set for responses without answers, the request should be sent over tcp
+    TRUNCATED_KEY = "dns.flags.truncated"
+    # zone transfers between a primary and its secondaries,
+    # the records are sent as lists of name, ttl, class, type and value
+    XFR_REQUEST_KEY = "dns.qry.xfr"
+    XFR_FOLLOW_KEY = "dns.flags.follow"
+    XFR_SERIAL_KEY = "dns.xfr.serial"
+    XFR_FULL_KEY = "dns.xfr.full"
+    XFR_ADDED_KEY = "dns.xfr.added"
+    XFR_REMOVED_KEY = "dns.xfr.removed"
+    XFR_REMAINING_KEY = "dns.xfr.remaining"
+    # the addresses of replicas of the name server of a referral
+    ADDITIONAL_NS_KEY = "dns.ns.additional"
+
+    # shared (never copied) defaults, used for values which aren't set
+    BASIC_DEFAULTS = dict(DEFAULT_SETTINGS["DNS"])
+    REQUEST_DEFAULTS = {**BASIC_DEFAULTS, **DEFAULT_SETTINGS["DNS_request"]}
+    RESPONSE_DEFAULTS = {**BASIC_DEFAULTS, **DEFAULT_SETTINGS["DNS_response"]}
+
+    VALUE_DECODER = json.JSONDecoder()
+    KEY_PATTERNS: {str: re.Pattern} = {}  # compiled by peek_value()
+
+    @staticmethod
+    def peek_value(encoded_msg: str,
+                   key: str) -> str or int or bool or None:
+        """
+        Reads one value of an encoded message without decoding the message,
+        which is faster if only a few values are needed.
+        Whitespace around the colon is optional, as in any JSON.
+        :return: The value or None if the message doesn't contain the key.
+        """
+        key_pattern = DnsMessage.KEY_PATTERNS.get(key)
+        if key_pattern is None:
+            key_pattern = DnsMessage.KEY_PATTERNS[key] = re.compile(
+                rf'"{re.escape(key)}"\s*:\s*'
+            )
+        key_match = key_pattern.search(encoded_msg)
+        if key_match is None:
+            return None
+        try:
+            return DnsMessage.VALUE_DECODER.raw_decode(
+                encoded_msg, key_match.end()
+            )[0]
+        except ValueError:
+            return None
+
     @classmethod
     def from_str(cls, encoded_msg: str) -> 'DnsMessage':
-        values = json.loads(encoded_msg)
-        return DnsMessage(values)
+        """
+        Creates a message from a JSON string.
+        The string will only be decoded, when a value is accessed.
+        """
+        dns_msg = cls()
+        dns_msg._encoded = encoded_msg
+        return dns_msg
 
     @classmethod
     def new_dns_request(cls, values: {} or str = None) -> 'DnsMessage':
@@ -77,8 +167,7 @@ class DnsMessage:
         :return: Self, which will be dns request message.
         """
         dns_request = cls._get_basic_object(values)
-        dns_req_defaults = cls.DEFAULT_SETTINGS["DNS_request"]
-        dns_request.set_values(dns_req_defaults, replace=False)
+        dns_request._defaults = cls.REQUEST_DEFAULTS
         return dns_request
 
     @classmethod
@@ -90,20 +179,56 @@ class DnsMessage:
         :return: Self, which will be dns response message.
         """
         dns_response = cls._get_basic_object(values)
-        dns_resp_defaults = DnsMessage.DEFAULT_SETTINGS["DNS_response"]
-        dns_response.set_values(dns_resp_defaults, replace=False)
+        dns_response._defaults = cls.RESPONSE_DEFAULTS
         return dns_response
 
     @classmethod
     def _get_basic_object(cls, values: {} or str = None) -> 'DnsMessage':
-        values = values or {}
-        dns_response = DnsMessage.from_str(values)\
+        dns_response = cls.from_str(values) \
             if type(values) == str else cls(values)
         return dns_response
 
-    def __init__(self, values: {}):
-        self.values = values
-        self._init_basic_request()
+    def __init__(self, values: {} = None):
+        self._encoded = None
+        self._defaults = DnsMessage.BASIC_DEFAULTS
+        self._flags = 0
+        self._flags_set = 0
+        self._id = None
+        self._address = None
+        self._answers = None
+        self._rcode = None
+        self._ns = None
+        self._name = None
+        self._type = None
+        self._ttl = None
+        self._extra = None
+        if values:
+            self.set_values(values)
+
+    def copy(self) -> 'DnsMessage':
+        """
+        Returns a copy of the message,
+        which can be changed without changing this message.
+        """
+        dns_msg = DnsMessage.__new__(DnsMessage)
+        for slot in DnsMessage.__slots__:
+            setattr(dns_msg, slot, getattr(self, slot))
+        if self._extra is not None:
+            dns_msg._extra = dict(self._extra)
+        return dns_msg
+
+    @property
+    def values(self) -> {str: str or int or bool or None}:
+        """
+        A dict containing all values of the message,
+        including the defaults for values which aren't set.
+        """
+        self._decode()
+        values = {key: self.get_value(key) for key in self._defaults}
+        if self._extra is not None:
+            for key in self._extra:
+                values[key] = self.get_value(key)
+        return values
 
     def build_message(self) -> str:
         """
@@ -112,7 +237,8 @@ class DnsMessage:
         return json.dumps(self.values)
 
     def set_value(self, key: str, value: str or None = None) -> None:
-        self.values[key] = value
+        self._decode()
+        self._store(key, value)
 
     def set_values(self,
                    repl_values: {str: str or int or bool or None},
@@ -121,21 +247,43 @@ class DnsMessage:
         Updates the current values by the ones in repl_values.
         If replace is True, existing values will be replaced.
         """
+        self._decode()
         for key, value in repl_values.items():
-            if replace or key not in self.values or self.values[key] is None:
-                self.set_value(key, value)
+            if replace or self._is_key_empty(key):
+                self._store(key, value)
 
     def get_value(self, key: str) -> str:
         """
         Throws KeyError if key doesn't exist.
         """
-        return self.values[key]
-
-    def set_empty_resp(self, authoritative: bool = True):
+        self._decode()
+        slot = DnsMessage.FIELD_SLOTS.get(key)
+        if slot is not None:
+            value = getattr(self, slot)
+        elif key in DnsMessage.FLAG_BITS:
+            value = self._get_flag(DnsMessage.FLAG_BITS[key])
+        elif self._extra is not None and key in self._extra:
+            value = self._extra[key]
+        elif key in self._defaults:
+            value = None
+        else:
+            raise KeyError(key)
+        return self._defaults.get(key) if value is None else value
+
+    def set_empty_resp(self,
+                       authoritative: bool = True,
+                       rcode: str or None = None) -> None:
+        """
+        Sets a response without an answer.
+        :param rcode: The name of the response code, see R_CODES,
+        or None to keep the current one.
+        """
         self.set_resp(
             "", answers=0, set_positive_rcode=False,
             authoritative=authoritative
         )
+        if rcode is not None:
+            self._rcode = DnsMessage.R_CODES[rcode]
 
     def set_resp(self,
                  address: str, answers: int = 1,
@@ -152,17 +300,16 @@ class DnsMessage:
         :param name_server_name: The name of the name server,
         if there is one, else None.
         """
-        value_updates = {
-            "dns.a": address,
-            "dns.count.answers": answers,
-            "dns.flags.authoritative": authoritative,
-            "dns.flags.response": True,
-            "dns.resp.ttl": ttl,
-            "dns.ns": name_server_name
-        }
+        self._decode()
+        self._address = address
+        self._answers = answers
+        self._set_flag(DnsMessage.FLAG_BITS["dns.flags.authoritative"],
+                       authoritative)
+        self._set_flag(DnsMessage.FLAG_BITS["dns.flags.response"], True)
+        self._ttl = ttl
+        self._ns = name_server_name
         if set_positive_rcode:
-            value_updates["dns.flags.rcode"] = DnsMessage.R_CODES["NOERROR"]
-        self.set_values(value_updates)
+            self._rcode = DnsMessage.R_CODES["NOERROR"]
 
     def set_req(self,
                 name: str, name_server_record: bool = False,
@@ -175,37 +322,228 @@ class DnsMessage:
         :param recursion_desired: If recursion_desired is None,
         it won't be changed.
         """
-        value_updates = {
-            "dns.qry.name": name,
-            "dns.qry.type": 1 + name_server_record
-        }
+        self._decode()
+        self._name = name
+        self._type = 1 + name_server_record
+        if recursion_desired is not None:
+            self._set_flag(DnsMessage.FLAG_BITS["dns.flags.recdesired"],
+                           recursion_desired)
+
+    def set_batch_req(self,
+                      names: [str], recursion_desired: bool or None = None,
+                      stream: bool = False) -> None:
+        """
+        Sets the data for a batch request, asking for multiple names.
+        :param names: The domains to lookup.
+        :param recursion_desired: If recursion_desired is None,
+        it won't be changed.
+        :param stream: True, if every answer should be sent
+        as soon as it is known, instead of combining them.
+        """
+        self._decode()
+        self._store(DnsMessage.BATCH_NAMES_KEY, list(names))
+        self._store(DnsMessage.BATCH_STREAM_KEY, stream)
         if recursion_desired is not None:
-            value_updates["dns.flags.recdesired"] = recursion_desired
-        self.set_values(value_updates)
+            self._set_flag(DnsMessage.FLAG_BITS["dns.flags.recdesired"],
+                           recursion_desired)
+
+    def set_batch_resp(self,
+                       answers: {str: 'DnsMessage'},
+                       remaining: int = 0) -> None:
+        """
+        Sets the data for a (partial) response to a batch request.
+        :param answers: The responses by their requested name.
+        :param remaining: The count of answers,
+        which will be sent in further responses.
+        """
+        self._decode()
+        answer_values = []
+        for name, dns_resp in answers.items():
+            answer = {
+                key: dns_resp.get_value(key) for key in DnsMessage.ANSWER_KEYS
+            }
+            answer["dns.qry.name"] = name
+            answer_values.append(answer)
+        self._store(DnsMessage.BATCH_ANSWERS_KEY, answer_values)
+        self._store(DnsMessage.BATCH_REMAINING_KEY, remaining)
+        self._answers = len(answers)
+        self._rcode = DnsMessage.R_CODES["NOERROR"]
+        self._set_flag(DnsMessage.FLAG_BITS["dns.flags.response"], True)
+
+    def is_batch_request(self) -> bool:
+        return self._get_extra(DnsMessage.BATCH_NAMES_KEY) is not None
+
+    def is_stream_desired(self) -> bool:
+        return bool(self._get_extra(DnsMessage.BATCH_STREAM_KEY))
+
+    def get_requested_names(self) -> [str]:
+        """
+        Returns the requested names of a batch request
+        or the requested name of a normal request as list.
+        """
+        names = self._get_extra(DnsMessage.BATCH_NAMES_KEY)
+        return [self.get_requested_name()] if names is None else names
+
+    def get_answers(self) -> {str: 'DnsMessage'}:
+        """
+        Returns the answers of a batch response by their requested name,
+        which are authoritative only if the batch response is.
+        """
+        answers = {}
+        authoritative = self.get_value("dns.flags.authoritative")
+        for answer in self._get_extra(DnsMessage.BATCH_ANSWERS_KEY) or []:
+            dns_resp = DnsMessage.new_dns_response(answer)
+            dns_resp.set_authoritative(authoritative)
+            answers[answer["dns.qry.name"]] = dns_resp
+        return answers
+
+    def get_batch_remaining(self) -> int or None:
+        """
+        Returns the count of answers, which will follow this response,
+        or None if it isn't a batch response.
+        """
+        return self._get_extra(DnsMessage.BATCH_REMAINING_KEY)
+
+    def set_truncated(self) -> None:
+        """
+        Marks the response as truncated,
+        so the client should repeat the request over TCP.
+        """
+        self._decode()
+        self._store(DnsMessage.TRUNCATED_KEY, True)
+
+    def is_truncated(self) -> bool:
+        return bool(self._get_extra(DnsMessage.TRUNCATED_KEY))
+
+    def set_transfer_req(self,
+                         serial: int or None = None,
+                         follow: bool = False) -> None:
+        """
+        Sets the data for a zone transfer request.
+        :param serial: The serial of the zone known by the requester,
+        to only transfer the changes since (IXFR),
+        or None to transfer the whole zone (AXFR).
+        :param follow: True, if the changes should be streamed
+        over the connection as soon as they are made.
+        """
+        self._decode()
+        self._store(DnsMessage.XFR_REQUEST_KEY,
+                    "AXFR" if serial is None else "IXFR")
+        self._store(DnsMessage.XFR_SERIAL_KEY, serial)
+        self._store(DnsMessage.XFR_FOLLOW_KEY, follow)
+
+    def set_transfer_resp(self,
+                          serial: int, added: [[str]], removed: [str],
+                          full: bool = False, remaining: int = 0) -> None:
+        """
+        Sets the data for a (partial) response to a zone transfer request.
+        :param serial: The serial of the zone after applying the response.
+        :param added: The added or changed records as lists of
+        name, ttl, class, type and value.
+        :param removed: The names of the removed records.
+        :param full: True, if the added records replace the whole zone.
+        :param remaining: The count of responses,
+        which belong to the same change and will follow this response.
+        """
+        self._decode()
+        self._store(DnsMessage.XFR_SERIAL_KEY, serial)
+        self._store(DnsMessage.XFR_FULL_KEY, full)
+        self._store(DnsMessage.XFR_ADDED_KEY, added)
+        self._store(DnsMessage.XFR_REMOVED_KEY, removed)
+        self._store(DnsMessage.XFR_REMAINING_KEY, remaining)
+        self._rcode = DnsMessage.R_CODES["NOERROR"]
+        self._set_flag(DnsMessage.FLAG_BITS["dns.flags.response"], True)
+
+    def is_transfer_request(self) -> bool:
+        return self._get_extra(DnsMessage.XFR_REQUEST_KEY) is not None
+
+    def is_follow_desired(self) -> bool:
+        return bool(self._get_extra(DnsMessage.XFR_FOLLOW_KEY))
+
+    def get_transfer_serial(self) -> int or None:
+        return self._get_extra(DnsMessage.XFR_SERIAL_KEY)
+
+    def is_full_transfer(self) -> bool:
+        return bool(self._get_extra(DnsMessage.XFR_FULL_KEY))
+
+    def get_added_records(self) -> [[str]]:
+        return self._get_extra(DnsMessage.XFR_ADDED_KEY) or []
+
+    def get_removed_names(self) -> [str]:
+        return self._get_extra(DnsMessage.XFR_REMOVED_KEY) or []
+
+    def get_transfer_remaining(self) -> int:
+        return self._get_extra(DnsMessage.XFR_REMAINING_KEY) or 0
+
+    def set_additional_name_servers(self, addresses: [str]) -> None:
+        """
+        Adds the addresses of replicas of the name server,
+        which can be asked instead of the address of the response.
+        """
+        self._decode()
+        self._store(DnsMessage.ADDITIONAL_NS_KEY, list(addresses))
+
+    def get_name_server_addresses(self) -> [str]:
+        """
+        Returns the address of the response
+        and the addresses of the replicas of the name server.
+        """
+        additional = self._get_extra(DnsMessage.ADDITIONAL_NS_KEY) or []
+        return [self.get_address(), *additional]
 
     def is_recursion_desired(self) -> bool:
-        return self.values["dns.flags.recdesired"]
+        self._decode()
+        flag = self._get_flag(DnsMessage.FLAG_BITS["dns.flags.recdesired"])
+        return self._defaults["dns.flags.recdesired"] if flag is None \
+            else flag
+
+    def get_id(self) -> int or None:
+        self._decode()
+        return self._id
+
+    def set_id(self, msg_id: int or None) -> None:
+        self._decode()
+        self._id = msg_id
 
     def get_requested_name(self) -> str:
-        return self.values["dns.qry.name"]
+        self._decode()
+        return self._defaults["dns.qry.name"] if self._name is None \
+            else self._name
 
     def get_requested_type(self) -> int:
-        return self.values["dns.qry.type"]
+        self._decode()
+        return self._defaults["dns.qry.type"] if self._type is None \
+            else self._type
 
     def get_name_server_name(self) -> str or None:
-        return self.values["dns.ns"]
+        self._decode()
+        return self._defaults["dns.ns"] if self._ns is None else self._ns
+
+    def get_answer_type(self) -> str:
+        """
+        Returns NS for a response naming a name server (a referral
+        or the answer for a zone), otherwise A, also if nothing was found.
+        """
+        return "A" if self.get_name_server_name() is None else "NS"
 
     def get_address(self) -> str:
-        return self.values["dns.a"]
+        self._decode()
+        return self._defaults["dns.a"] if self._address is None \
+            else self._address
 
     def get_ttl(self) -> int:
-        return self.values["dns.resp.ttl"]
+        self._decode()
+        return self._defaults["dns.resp.ttl"] if self._ttl is None \
+            else self._ttl
 
     def set_authoritative(self, authoritative: bool) -> None:
-        self.values["dns.flags.authoritative"] = authoritative
+        self._decode()
+        self._set_flag(DnsMessage.FLAG_BITS["dns.flags.authoritative"],
+                       authoritative)
 
     def set_updated_ttl(self, new_ttl: int) -> None:
-        self.values["dns.resp.ttl"] = new_ttl
+        self._decode()
+        self._ttl = new_ttl
 
     def match_type(self, other_type: str) -> bool:
         return DnsMessage.QRY_TYPES[other_type] == self.get_requested_type()
@@ -218,11 +556,47 @@ class DnsMessage:
         The key is empty, if the value isn't set or None.
         An empty string won't be recognized as empty.
         """
-        return key not in self.values or self.values[key] is None
+        try:
+            return self.get_value(key) is None
+        except KeyError:
+            return True
+
+    def _get_extra(self, key: str) -> str or int or bool or None:
+        self._decode()
+        return None if self._extra is None else self._extra.get(key)
 
-    def _init_basic_request(self) -> None:
-        basic_req_settings = DnsMessage.DEFAULT_SETTINGS["DNS"]
-        self.set_values(basic_req_settings, replace=False)
+    def _decode(self) -> None:
+        """
+        Decodes the JSON string, the message was created from,
+        if it wasn't decoded yet.
+        """
+        encoded_msg = self._encoded
+        if encoded_msg is not None:
+            self._encoded = None
+            for key, value in json.loads(encoded_msg).items():
+                self._store(key, value)
+
+    def _store(self, key: str, value: str or int or bool or None) -> None:
+        slot = DnsMessage.FIELD_SLOTS.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+        elif key in DnsMessage.FLAG_BITS:
+            self._set_flag(DnsMessage.FLAG_BITS[key], value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def _get_flag(self, bit: int) -> bool or None:
+        return bool(self._flags & bit) if self._flags_set & bit else None
+
+    def _set_flag(self, bit: int, value: bool or None) -> None:
+        if value is None:
+            self._flags_set &= ~bit
+            self._flags &= ~bit
+        else:
+            self._flags_set |= bit
+            self._flags = self._flags | bit if value else self._flags & ~bit
 
 
 if __name__ == "__main__":  # for testing
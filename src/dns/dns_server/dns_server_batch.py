@@ -1,5 +1,7 @@
 # local libraries
 from logger import logger
+from dns.dns_server.multi_zone_dns_server import MultiZoneDnsServer
+from dns.dns_server.secondary_dns_server import SecondaryDnsServer
 from dns.dns_server.simple_dns_server import SimpleDnsServer
 
 
@@ -7,6 +9,13 @@ class DnsServerBatch:
     """
     A batch of DNS servers,
     witch can be used to create, run and stop multiple DNS servers.
+    The zone files are looked up by the zone file pattern,
+    e.g. to use generated zone files instead of the ones in rsrc.
+    If a list of zones is set for an address,
+    one MultiZoneDnsServer answers for all of them.
+    Replicas are SecondaryDnsServers, which transfer the zone
+    of their primary and follow its changes, they are started after
+    the primaries and announced in every referral to their primary.
     """
 
     GENERIC_ZONE_LOC = "../rsrc/zone_files/{}.zone"
@@ -15,13 +24,39 @@ class DnsServerBatch:
     def get_full_filename(cls, name: str) -> str:
         return cls.GENERIC_ZONE_LOC.format(name)
 
-    def __init__(self, ip_zone_map: {str: str}, port: int = 53053):
+    def __init__(self,
+                 ip_zone_map: {str: str or [str]}, port: int = 53053,
+                 serve_tcp: bool = False,
+                 transport: object or None = None,
+                 zone_file_pattern: str = GENERIC_ZONE_LOC,
+                 replicas: {str: str} or None = None):
+        """
+        :param replicas: The addresses of the primaries
+        by the address of their secondary.
+        The primaries serve TCP to transfer their zone.
+        """
+        replicas = replicas or {}
+        replicas_by_primary = {}
+        for replica, primary in replicas.items():
+            replicas_by_primary.setdefault(primary, []).append(replica)
         self.dns_servers = [
-            SimpleDnsServer(
-                DnsServerBatch.get_full_filename(zone_file),
-                ip_address, port
+            MultiZoneDnsServer(
+                {zone: zone_file_pattern.format(zone) for zone in zone_file},
+                ip_address, port,
+                serve_tcp=serve_tcp or ip_address in replicas_by_primary,
+                transport=transport, replicas=replicas_by_primary
+            ) if isinstance(zone_file, list) else SimpleDnsServer(
+                zone_file_pattern.format(zone_file), ip_address, port,
+                serve_tcp=serve_tcp or ip_address in replicas_by_primary,
+                transport=transport, replicas=replicas_by_primary
             )
             for ip_address, zone_file in ip_zone_map.items()
+        ] + [
+            SecondaryDnsServer(
+                (primary, port), replica, port, serve_tcp=serve_tcp,
+                transport=transport, replicas=replicas_by_primary
+            )
+            for replica, primary in replicas.items()
         ]
         assert len(self.dns_servers) >= 0, \
             "Error, there should at least be one server."
@@ -34,6 +69,14 @@ class DnsServerBatch:
             if log_separator:
                 logger.log("---------------", logger_key)
 
+    def reload_zone_files(self) -> None:
+        """
+        Loads the zone files of all primaries again,
+        the changes are transferred to their secondaries.
+        """
+        for dns_server in self.dns_servers:
+            dns_server.reload_zone_file()
+
     def stop(self) -> None:
         for dns_server in self.dns_servers:
             dns_server.stop_listening()
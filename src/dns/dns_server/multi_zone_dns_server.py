@@ -0,0 +1,69 @@
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.dns_server.simple_dns_server import SimpleDnsServer
+from dns.resource_record.record_match import RecordMatch
+from dns.resource_record.resource_record_manager import ResourceRecordManager
+from rate_limiter import RateLimiter
+
+
+class MultiZoneDnsServer(SimpleDnsServer):
+    """
+    A DNS server, which is authoritative for multiple zones
+    and answers for all of them on one socket.
+    The records of all zone files are loaded into one index,
+    so if the server hosts several levels of a name,
+    it answers with the deepest record directly,
+    e.g. with the A record of www.switch.telematik
+    instead of the NS record of telematik, if it hosts both zones.
+    A referral to a hosted zone is never returned,
+    if the zone doesn't contain the name, the name isn't found.
+    The parent zones, which aren't hosted by this server,
+    should delegate the hosted zones to the address of this server.
+    """
+
+    ROOT_ZONE = "root"
+
+    @staticmethod
+    def _get_zone_depth(zone: str) -> int:
+        return 0 if zone == MultiZoneDnsServer.ROOT_ZONE \
+            else zone.count(".") + 1
+
+    def __init__(self,
+                 zone_files: {str: str}, ip_address: str, port: int = 53053,
+                 serve_tcp: bool = False,
+                 rate_limiter: RateLimiter or None = None,
+                 transport: object or None = None,
+                 replicas: {str: [str]} or None = None):
+        """
+        :param zone_files: The zone files by the name of their zone,
+        the root zone is named 'root'.
+        See SimpleDnsServer for the other arguments.
+        """
+        self.zones = set(zone_files)
+        super().__init__(
+            zone_files, ip_address, port,
+            serve_tcp=serve_tcp, rate_limiter=rate_limiter,
+            transport=transport, replicas=replicas
+        )
+
+    def _load_record_manager(self,
+                             zone_files: {str: str}
+                             ) -> ResourceRecordManager:
+        """
+        Loads the records of all zones, the records of deeper zones
+        replace the records of their parent zones with the same name.
+        """
+        resource_records = []
+        for zone in sorted(zone_files, key=self._get_zone_depth):
+            resource_records.extend(
+                ResourceRecordManager.load_resource_records(zone_files[zone])
+            )
+        return ResourceRecordManager(resource_records)
+
+    def _get_match(self, request: DnsMessage) -> RecordMatch:
+        record = self.record_manager.get_deepest_record(request)
+        if record is not None and record.get_type() == "NS" \
+                and record.get_name() in self.zones \
+                and record.get_name() != request.get_requested_name():
+            record = None  # the hosted zone doesn't contain the name
+        return RecordMatch(record)
@@ -0,0 +1,159 @@
+# std libraries
+from _thread import start_new_thread
+from threading import Event
+from time import sleep
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.dns_server.simple_dns_server import SimpleDnsServer
+from dns.resource_record.resource_record import ResourceRecord
+from dns.resource_record.resource_record_manager import ResourceRecordManager
+from logger import logger
+from rate_limiter import RateLimiter
+from tcp_connection import TcpConnection
+
+
+class SecondaryDnsServer(SimpleDnsServer):
+    """
+    A DNS server, which answers with the records of a primary server,
+    so the zone of the primary is served by multiple servers.
+    On run(), the whole zone is transferred from the primary over TCP,
+    afterwards the server follows the changes of the primary
+    over the same connection, so they are applied as soon as they are made.
+    If the connection is lost, the server reconnects
+    and only requests the changes since its serial.
+    Changes are applied to a copy of the records,
+    so requests in progress always see a consistent zone.
+    """
+
+    SYNC_TIMEOUT = 5  # seconds run() waits for the first transfer
+    RECONNECT_DELAY = 1  # seconds
+    # the primary sends a frame at least every TRANSFER_HEARTBEAT seconds
+    READ_TIMEOUT = 3 * SimpleDnsServer.TRANSFER_HEARTBEAT
+
+    def __init__(self,
+                 primary_address: (str, int), ip_address: str,
+                 port: int = 53053, serve_tcp: bool = False,
+                 rate_limiter: RateLimiter or None = None,
+                 transport: object or None = None,
+                 replicas: {str: [str]} or None = None):
+        """
+        :param primary_address: The address of the TCP server of the primary.
+        See SimpleDnsServer for the other arguments.
+        """
+        self.primary_address = tuple(primary_address)
+        self.serial: int or None = None
+        self.pending_frames: [DnsMessage] = []
+        self.synchronized = Event()
+        self.is_following = False
+        self.connection: TcpConnection or None = None
+        super().__init__(
+            None, ip_address, port,
+            serve_tcp=serve_tcp, rate_limiter=rate_limiter,
+            transport=transport, replicas=replicas
+        )
+
+    def run(self,
+            in_background: bool = True,
+            logger_key: object = None) -> None:
+        """
+        Transfers the zone from the primary, opens the socket
+        and starts receiving requests.
+        If the zone can't be transferred within SYNC_TIMEOUT,
+        the server starts without records
+        and keeps on trying in the background.
+        """
+        self.is_following = True
+        start_new_thread(self._follow_primary, ())
+        if not self.synchronized.wait(SecondaryDnsServer.SYNC_TIMEOUT):
+            logger.log(f"Secondary {self.ip_address} couldn't transfer "
+                       f"the zone from {self.primary_address[0]}.",
+                       logger_key)
+        super().run(in_background, logger_key)
+
+    def stop_listening(self) -> None:
+        """
+        Stops following the primary and listening for requests.
+        """
+        self.is_following = False
+        connection = self.connection
+        if connection is not None:
+            connection.stop_reading()
+        super().stop_listening()
+
+    def reload_zone_file(self) -> None:
+        """
+        A secondary has no zone file, the changes of its primary
+        are applied as soon as they are made.
+        """
+        return None
+
+    def _load_record_manager(self,
+                             _zone_file: None) -> ResourceRecordManager:
+        return ResourceRecordManager([])
+
+    def _follow_primary(self) -> None:
+        while self.is_following:
+            try:
+                self._receive_transfers()
+            except OSError as error:
+                logger.log(f"Transfer from {self.primary_address[0]} "
+                           f"to {self.ip_address} failed: {error}")
+            if self.is_following:
+                sleep(SecondaryDnsServer.RECONNECT_DELAY)
+
+    def _receive_transfers(self) -> None:
+        """
+        Requests the changes since the serial, or the whole zone
+        if no serial is known yet, and applies the streamed changes
+        till the connection ends.
+        """
+        conn = self.server.transport.create_socket(False)
+        conn.settimeout(SecondaryDnsServer.READ_TIMEOUT)
+        try:
+            conn.connect(self.primary_address)
+        except OSError:
+            conn.close()
+            raise
+        self.connection = TcpConnection(conn, SecondaryDnsServer.READ_TIMEOUT)
+        try:
+            dns_request = DnsMessage.new_dns_request()
+            dns_request.set_transfer_req(self.serial, follow=True)
+            self.connection.send_frame(dns_request.build_message().encode())
+            frame = self.connection.read_frame()
+            while frame is not None and self.is_following:
+                self._receive_frame(DnsMessage.new_dns_response(frame))
+                frame = self.connection.read_frame()
+        finally:
+            self.pending_frames = []
+            self.connection.close()
+            self.connection = None
+
+    def _receive_frame(self, dns_resp: DnsMessage) -> None:
+        """
+        Applies the change of the frame,
+        after all frames of the change are received.
+        """
+        self.pending_frames.append(dns_resp)
+        if dns_resp.get_transfer_remaining() > 0:
+            return
+        frames, self.pending_frames = self.pending_frames, []
+        added = [
+            ResourceRecord.load_data_from_list(record)
+            for frame in frames for record in frame.get_added_records()
+        ]
+        removed = [name for frame in frames
+                   for name in frame.get_removed_names()]
+        serial = dns_resp.get_transfer_serial()
+        if frames[0].is_full_transfer():
+            self.record_manager = ResourceRecordManager(added)
+            logger.log(f"Secondary {self.ip_address} transferred "
+                       f"{len(added)} records of serial {serial}.")
+        elif added or removed:
+            self.record_manager = self.record_manager.get_updated(
+                added, removed
+            )
+            logger.log(f"Secondary {self.ip_address} applied serial "
+                       f"{serial}: {len(added)} changed and "
+                       f"{len(removed)} removed records.")
+        self.serial = serial
+        self.synchronized.set()
@@ -1,11 +1,16 @@
 # std libraries
 from sys import argv
 from time import sleep
+from typing import Iterator
 # local libraries
 from connection_argument_extractor import ConnectionArgumentExtractor
+from dns.dns_server.zone_journal import ZoneJournal
 from dns.resource_record.record_match import RecordMatch
+from dns.resource_record.resource_record import ResourceRecord
 from dns.dns_message import DnsMessage
 from logger import logger
+from rate_limiter import RateLimiter
+from tracer import tracer
 from request_server import RequestServer
 from dns.resource_record.resource_record_manager import ResourceRecordManager
 
@@ -19,8 +24,15 @@ class SimpleDnsServer:
     The run() method can be used to start the server.
     The handle_request() method will be called for incoming requests
     to process them.
+    Changes of the records are versioned by a ZoneJournal,
+    secondaries can request them over TCP, either the whole zone (AXFR)
+    or the changes since their serial (IXFR), and can follow the changes,
+    which are streamed over the connection as soon as they are made.
     """
 
+    MAX_TRANSFER_RECORDS = 200  # per frame, to stay below the max. length
+    TRANSFER_HEARTBEAT = 2  # seconds between frames of an unchanged zone
+
     @staticmethod
     def _dns_resp_from_match(match: RecordMatch) -> DnsMessage:
         dns_resp = DnsMessage.new_dns_response()
@@ -34,15 +46,66 @@ class SimpleDnsServer:
             dns_resp.set_empty_resp()
         return dns_resp
 
-    def __init__(self, zone_file: str, ip_address: str, port: int = 53053):
-        self.record_manager = ResourceRecordManager.from_file(zone_file)
+    @staticmethod
+    def _build_transfer_responses(dns_request: DnsMessage,
+                                  serial: int, added: [[str]],
+                                  removed: [str],
+                                  full: bool = False) -> Iterator[str]:
+        """
+        Splits a change into frames of at most MAX_TRANSFER_RECORDS records.
+        """
+        max_records = SimpleDnsServer.MAX_TRANSFER_RECORDS
+        changes = [(True, record) for record in added] \
+            + [(False, name) for name in removed]
+        frame_count = max(1, -(-len(changes) // max_records))
+        for frame in range(frame_count):
+            frame_changes = changes[
+                frame * max_records:(frame + 1) * max_records
+            ]
+            dns_resp = DnsMessage.new_dns_response()
+            dns_resp.set_id(dns_request.get_id())
+            dns_resp.set_transfer_resp(
+                serial,
+                [change for is_added, change in frame_changes if is_added],
+                [change for is_added, change in frame_changes
+                 if not is_added],
+                full=full, remaining=frame_count - frame - 1
+            )
+            yield dns_resp.build_message()
+
+    def __init__(self,
+                 zone_file: str, ip_address: str, port: int = 53053,
+                 serve_tcp: bool = False,
+                 rate_limiter: RateLimiter or None = None,
+                 transport: object or None = None,
+                 replicas: {str: [str]} or None = None):
+        """
+        :param serve_tcp: True, if the server should additionally
+        accept length prefixed requests over TCP on the same port,
+        needed to transfer the zone to secondaries.
+        :param rate_limiter: Limits the requests per client and name,
+        shared by UDP and TCP.
+        :param transport: Creates the sockets, by default kernel sockets.
+        :param replicas: The addresses of the secondaries
+        by the address of their primary, which are added to referrals.
+        """
+        self.zone_file = zone_file
+        self.record_manager = self._load_record_manager(zone_file)
+        self.journal = ZoneJournal()
+        self.replicas = replicas or {}
         self.ip_address = ip_address
         self.port = port
         self._ensure_connection_information()
         self.server = RequestServer(
             self.ip_address, self.port,
-            self.handle_request, log_requests=True
+            self.handle_request, log_requests=True,
+            rate_limiter=rate_limiter, transport=transport
         )
+        self.tcp_server = RequestServer(
+            self.ip_address, self.port, self.handle_tcp_request,
+            use_udp=False, log_requests=True, use_length_prefix=True,
+            rate_limiter=rate_limiter, transport=transport
+        ) if serve_tcp else None
 
     def run(self,
             in_background: bool = True,
@@ -55,6 +118,9 @@ class SimpleDnsServer:
         self.record_manager.log_entries(logger_key)
         self.server.open_socket()
         self.server.run()  # will be in background
+        if self.tcp_server is not None:
+            self.tcp_server.open_socket()
+            self.tcp_server.run()
         if not in_background:
             self.run_till_interrupt()
 
@@ -65,32 +131,137 @@ class SimpleDnsServer:
         :param request: The received request as string, containing the domain.
         :return: The response to answer the client.
         """
+        with tracer.span("dns_server.handle_request", server=self.ip_address):
+            dns_request = DnsMessage.new_dns_request(request)
+            return self.answer(dns_request).build_message()
 
-        match = self._get_match(request)
+    def answer(self, dns_request: DnsMessage) -> DnsMessage:
+        """
+        Returns the response for the request as message,
+        e.g. for a resolver in the same process, which calls it directly.
+        Requests answered this way aren't logged by the server.
+        """
+        match = self._get_match(dns_request)
         dns_resp = self._dns_resp_from_match(match)
-        return dns_resp.build_message()
+        dns_resp.set_id(dns_request.get_id())
+        if self.replicas and dns_resp.get_name_server_name() is not None:
+            replicas = self.replicas.get(dns_resp.get_address())
+            if replicas:
+                dns_resp.set_additional_name_servers(replicas)
+        return dns_resp
+
+    def handle_tcp_request(self, request: str) -> str or Iterator[str]:
+        """
+        Called to handle a request over TCP,
+        zone transfer requests are answered by a stream of frames,
+        all other requests like by handle_request().
+        """
+        if DnsMessage.peek_value(request, DnsMessage.XFR_REQUEST_KEY) is None:
+            return self.handle_request(request)
+        return self._get_transfer_responses(
+            DnsMessage.new_dns_request(request)
+        )
 
-    def _get_match(self, request: str) -> RecordMatch:
-        request = DnsMessage.new_dns_request(request)
+    def update_records(self,
+                       added: [ResourceRecord], removed: [str]) -> int:
+        """
+        Changes the records and notifies the following secondaries.
+        The records are replaced by an updated copy,
+        so requests in progress aren't affected.
+        :param added: The added records, replacing the ones with their name.
+        :param removed: The names of the removed records.
+        :return: The serial of the changed zone.
+        """
+        with self.journal.changed:
+            self.record_manager = self.record_manager.get_updated(
+                added, removed
+            )
+            return self.journal.add_change(
+                [resource_record.to_list() for resource_record in added],
+                list(removed)
+            )
+
+    def reload_zone_file(self) -> int or None:
+        """
+        Loads the zone file again and applies the changes.
+        :return: The serial of the changed zone,
+        or None if the zone file wasn't changed.
+        """
+        reloaded = self._load_record_manager(self.zone_file)
+        added, removed = self.record_manager.get_changes(reloaded)
+        if not added and not removed:
+            return None
+        logger.log(f"Reloaded {self.ip_address}: {len(added)} changed and "
+                   f"{len(removed)} removed records.")
+        return self.update_records(added, removed)
+
+    def _load_record_manager(self,
+                             zone_file: str) -> ResourceRecordManager:
+        return ResourceRecordManager.from_file(zone_file)
+
+    def _get_match(self, request: DnsMessage) -> RecordMatch:
         record = self.record_manager.get_matched_record(request)
         match = RecordMatch(record)
         return match
 
+    def _get_transfer_responses(self,
+                                dns_request: DnsMessage) -> Iterator[str]:
+        """
+        Yields the changes since the serial of the request,
+        or the whole zone if they aren't known.
+        If the changes should be followed, every further change is yielded
+        as soon as it is made, and the serial every TRANSFER_HEARTBEAT
+        seconds if the zone isn't changed, till the server stops.
+        """
+        serial = dns_request.get_transfer_serial()
+        while True:
+            changes = self.journal.get_changes_since(serial)
+            if changes is None:
+                with self.journal.changed:
+                    serial = self.journal.serial
+                    records = [
+                        resource_record.to_list() for resource_record
+                        in self.record_manager.resource_records.values()
+                    ]
+                yield from self._build_transfer_responses(
+                    dns_request, serial, records, [], full=True
+                )
+            elif not changes:
+                yield from self._build_transfer_responses(
+                    dns_request, serial, [], []
+                )
+            for serial, added, removed in changes or ():
+                yield from self._build_transfer_responses(
+                    dns_request, serial, added, removed
+                )
+            if not dns_request.is_follow_desired():
+                return
+            self.journal.wait_for_change(
+                serial, SimpleDnsServer.TRANSFER_HEARTBEAT
+            )
+            if not self.tcp_server.is_running:
+                return
+
     def stop_listening(self) -> None:
         """
-        Stops listening for requests.
-        The socket won't be removed.
+        Stops listening for requests,
+        the requests in progress are still answered.
         """
         self.server.stop_listening()
+        if self.tcp_server is not None:
+            self.tcp_server.stop_listening()
 
     def run_till_interrupt(self) -> None:
         while True:
             try:
                 sleep(60)
             except KeyboardInterrupt:  # Ctrl + C
-                logger.log("\nProcessing stopped, socket will remain blocked.")
+                logger.log("\nProcessing stopped.")
                 break
         self.stop_listening()
+        self.server.wait_till_drained()
+        if self.tcp_server is not None:
+            self.tcp_server.wait_till_drained()
 
     def _ensure_connection_information(self) -> None:
         if type(self.port) == str and self.port.isnumeric():
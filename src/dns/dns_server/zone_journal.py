@@ -0,0 +1,67 @@
+# std libraries
+from collections import deque
+from threading import Condition
+from time import time
+
+
+class ZoneJournal:
+    """
+    The versioned changes of the records of a DNS server,
+    used to send secondaries only the changes since their serial (IXFR)
+    instead of the whole zone (AXFR).
+    Every change increments the serial, the serial starts at the time
+    the zone was loaded, so it grows across restarts of the server
+    and a secondary never mistakes an older zone for the current one.
+    Only the last max_length changes are kept,
+    secondaries with an older serial need a full transfer.
+    """
+
+    MAX_LENGTH = 1000
+
+    def __init__(self, max_length: int = MAX_LENGTH):
+        self.serial = int(time())
+        self.changes: deque = deque(maxlen=max_length)
+        self.changed = Condition()  # also locks the records while changing
+
+    def add_change(self, added: [[str]], removed: [str]) -> int:
+        """
+        Adds a change, should be called while holding the changed condition,
+        together with applying the change.
+        :param added: The added or changed records as lists.
+        :param removed: The names of the removed records.
+        :return: The new serial.
+        """
+        with self.changed:
+            self.serial += 1
+            self.changes.append((self.serial, added, removed))
+            self.changed.notify_all()
+            return self.serial
+
+    def get_changes_since(self,
+                          serial: int or None
+                          ) -> [(int, [[str]], [str])] or None:
+        """
+        Returns the changes after the serial as tuples
+        of the serial, the added records and the removed names,
+        or None if the changes aren't known anymore
+        and the whole zone must be transferred.
+        """
+        with self.changed:
+            if serial is None or serial > self.serial:
+                return None
+            if serial == self.serial:
+                return []
+            if not self.changes or self.changes[0][0] > serial + 1:
+                return None
+            return [change for change in self.changes if change[0] > serial]
+
+    def wait_for_change(self, serial: int, timeout: float) -> bool:
+        """
+        Blocks until the serial differs from the passed one
+        or the timeout expired.
+        :return: True, if the zone was changed.
+        """
+        with self.changed:
+            return self.changed.wait_for(
+                lambda: self.serial != serial, timeout
+            )
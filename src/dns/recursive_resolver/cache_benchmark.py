@@ -0,0 +1,129 @@
+# std libraries
+from datetime import datetime, timedelta
+from random import Random
+from time import monotonic
+from typing import Callable
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.recursive_resolver.dns_message_cache import DnsMessageCache
+from dns.recursive_resolver.response_template import ResponseTemplate
+from memory_usage import get_rss
+
+
+class CacheBenchmark:
+    """
+    Measures the lookups of a DnsMessageCache filled with a count of names,
+    to show that their cost doesn't depend on the count of cached names.
+    The names are h<index>.z<zone>.z<top level zone> with RECORDS_PER_ZONE
+    names per zone, every zone is cached with its NS response as well.
+    Measured are the hits (as DnsMessage and encoded), the misses
+    for names of cached zones and the deepest delegation of these names.
+    With shared_response, all names share one cached response,
+    so the memory mostly contains the index, e.g. to fit 10M names.
+    """
+
+    RECORDS_PER_ZONE = 1000
+    ZONES_PER_TOP_LEVEL_ZONE = 1000
+    DEFAULT_LOOKUPS = 100000
+
+    @classmethod
+    def get_zone_name(cls, index: int) -> str:
+        zone = index // cls.RECORDS_PER_ZONE
+        return f"z{zone % cls.ZONES_PER_TOP_LEVEL_ZONE}." \
+               f"z{zone // cls.ZONES_PER_TOP_LEVEL_ZONE}"
+
+    @classmethod
+    def get_name(cls, index: int) -> str:
+        return f"h{index % cls.RECORDS_PER_ZONE}.{cls.get_zone_name(index)}"
+
+    @staticmethod
+    def _time_lookups(lookup: Callable, names: [str]) -> float:
+        """
+        Returns the mean time of a lookup in nanoseconds.
+        """
+        start_time = monotonic()
+        for name in names:
+            lookup(name)
+        return (monotonic() - start_time) / len(names) * 1e9
+
+    def __init__(self,
+                 entries: int, lookups: int = DEFAULT_LOOKUPS,
+                 shared_response: bool = False, seed: int = 0):
+        """
+        :param entries: The count of cached names, without the zones.
+        :param lookups: The count of lookups per measured operation.
+        :param shared_response: True, if all names should share
+        one response instead of storing a copy per name.
+        """
+        self.entries = entries
+        self.lookups = lookups
+        self.shared_response = shared_response
+        self.random = Random(seed)
+
+    def run(self) -> {str: int or float}:
+        """
+        Fills the cache and returns the measured values.
+        """
+        rss_before = get_rss()
+        start_time = monotonic()
+        cache = self._fill_cache()
+        fill_seconds = monotonic() - start_time
+        rss = get_rss() - rss_before
+        indices = [self.random.randrange(self.entries)
+                   for _ in range(self.lookups)]
+        hit_names = [self.get_name(index) for index in indices]
+        miss_names = [f"miss.{self.get_zone_name(index)}"
+                      for index in indices]
+        results = {
+            "entries": self.entries,
+            "shared_response": self.shared_response,
+            "fill_seconds": fill_seconds,
+            "rss_mb": rss / 2 ** 20,
+            "bytes_per_entry": rss / self.entries,
+            "hit_ns": self._time_lookups(cache.get_dns_message, hit_names),
+            "encoded_hit_ns": self._time_lookups(
+                lambda name: cache.get_encoded_response(name, 0), hit_names
+            ),
+            "miss_ns": self._time_lookups(cache.get_dns_message, miss_names),
+            "delegation_ns": self._time_lookups(
+                cache.get_delegation, miss_names
+            )
+        }
+        assert cache.get_dns_message(hit_names[0]) is not None \
+            and cache.get_dns_message(miss_names[0]) is None \
+            and cache.get_delegation(miss_names[0]) is not None, \
+            "The cache returned wrong results."
+        return results
+
+    def _fill_cache(self) -> DnsMessageCache:
+        cache = DnsMessageCache()
+        expiry_timestamp = datetime.now() + timedelta(days=1)
+        address_resp = DnsMessage.new_dns_response()
+        address_resp.set_resp("10.0.0.1", ttl=86400)
+        address_entry = (
+            expiry_timestamp, address_resp, ResponseTemplate(address_resp)
+        )
+        for index in range(self.entries):
+            if index % CacheBenchmark.RECORDS_PER_ZONE == 0:
+                zone = self.get_zone_name(index)
+                zone_resp = DnsMessage.new_dns_response()
+                zone_resp.set_resp("127.1.0.1", ttl=86400,
+                                   name_server_name=zone)
+                self._add_entry(cache, zone, (
+                    expiry_timestamp, zone_resp, ResponseTemplate(zone_resp)
+                ))
+            self._add_entry(cache, self.get_name(index), address_entry)
+        return cache
+
+    def _add_entry(self,
+                   cache: DnsMessageCache, name: str,
+                   entry: (datetime, DnsMessage, ResponseTemplate)) -> None:
+        """
+        Adds a copy of the response or, with shared_response,
+        the entry itself without copying it.
+        """
+        expiry_timestamp, dns_response, _ = entry
+        if not self.shared_response:
+            cache.add_entry(name, expiry_timestamp, dns_response)
+            return
+        cache.add_prebuilt_entry(name, entry)
@@ -0,0 +1,45 @@
+# std libraries
+from datetime import datetime
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.recursive_resolver.response_template import ResponseTemplate
+
+
+class CacheNode:
+    """
+    A node of the label trie of a CacheShard, representing one name.
+    Contains the nodes of the names one label deeper by their label
+    and the cached entries of the name by their record type,
+    so e.g. the NS and the A response of a name are kept both.
+    Both are created on demand, since most nodes only need one of them.
+    """
+
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children: {str: CacheNode} or None = None
+        self.entries: {
+            str: (datetime, DnsMessage, ResponseTemplate)
+        } or None = None
+
+    def get_child(self, label: str) -> 'CacheNode' or None:
+        return None if self.children is None else self.children.get(label)
+
+    def add_child(self, label: str) -> 'CacheNode':
+        """
+        Returns the child with the label, which is created if needed.
+        """
+        if self.children is None:
+            self.children = {}
+        child = self.children.get(label)
+        if child is None:
+            child = self.children[label] = CacheNode()
+        return child
+
+    def get_entry(self,
+                  record_type: str
+                  ) -> (datetime, DnsMessage, ResponseTemplate) or None:
+        return None if self.entries is None else self.entries.get(record_type)
+
+    def is_empty(self) -> bool:
+        return not self.children and not self.entries
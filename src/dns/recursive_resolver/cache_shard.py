@@ -0,0 +1,161 @@
+# std libraries
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from time import monotonic
+from typing import Iterator
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.recursive_resolver.cache_node import CacheNode
+from dns.recursive_resolver.response_template import ResponseTemplate
+
+
+class CacheShard:
+    """
+    A segment of a DnsMessageCache,
+    containing the entries of some names, which are protected by one lock.
+    The entries are stored in a trie of the labels of their names,
+    starting at the top level label (e.g. fuberlin, pcpools, linux),
+    so a name and all of its parent names are found
+    by one walk with one lookup per label.
+    The entries must only be accessed while holding the lock (see locked()).
+    Counts how often the lock was acquired and how often
+    and how long threads had to wait for it.
+    """
+
+    def __init__(self):
+        self.root = CacheNode()
+        self.entry_count = 0
+        self.lock = Lock()
+        self.acquisitions = 0
+        self.contentions = 0
+        self.wait_time = 0.0
+
+    @contextmanager
+    def locked(self) -> Iterator['CacheShard']:
+        if not self.lock.acquire(blocking=False):
+            wait_start = monotonic()
+            self.lock.acquire()
+            self.contentions += 1
+            self.wait_time += monotonic() - wait_start
+        self.acquisitions += 1
+        try:
+            yield self
+        finally:
+            self.lock.release()
+
+    def add_entry(self,
+                  labels: [str], record_type: str,
+                  entry: (datetime, DnsMessage, ResponseTemplate)) -> None:
+        """
+        Adds the entry, replacing the entry of the name with the same type.
+        :param labels: The labels of the name, starting at the top level.
+        """
+        node = self.root
+        for label in labels:
+            node = node.add_child(label)
+        if node.entries is None:
+            node.entries = {}
+        if record_type not in node.entries:
+            self.entry_count += 1
+        node.entries[record_type] = entry
+
+    def get_entry(self,
+                  labels: [str], record_type: str
+                  ) -> (datetime, DnsMessage, ResponseTemplate) or None:
+        node = self.root
+        for label in labels:
+            node = node.get_child(label)
+            if node is None:
+                return None
+        return node.get_entry(record_type)
+
+    def get_deepest_entry(self,
+                          labels: [str], record_type: str, now: datetime,
+                          min_depth: int = 1
+                          ) -> (datetime, DnsMessage,
+                                ResponseTemplate) or None:
+        """
+        Returns the not expired entry of the type of the name
+        or of its deepest parent name, which has one.
+        :param min_depth: The count of labels of the least deep name,
+        which should be returned.
+        """
+        deepest_entry = None
+        node = self.root
+        for depth, label in enumerate(labels, 1):
+            node = node.get_child(label)
+            if node is None:
+                break
+            entry = node.get_entry(record_type)
+            if entry is not None and depth >= min_depth and entry[0] > now:
+                deepest_entry = entry
+        return deepest_entry
+
+    def remove_entry(self, labels: [str], record_type: str) -> None:
+        """
+        Removes the entry and the nodes, which became empty.
+        """
+        path = [self.root]
+        for label in labels:
+            node = path[-1].get_child(label)
+            if node is None:
+                return
+            path.append(node)
+        node = path[-1]
+        if node.entries is None or record_type not in node.entries:
+            return
+        del node.entries[record_type]
+        self.entry_count -= 1
+        for depth in range(len(labels), 0, -1):
+            if not path[depth].is_empty():
+                break
+            del path[depth - 1].children[labels[depth - 1]]
+
+    def iter_entries(self) -> Iterator[tuple]:
+        """
+        Yields all entries as tuples of the labels of their name,
+        their record type and the entry.
+        """
+        stack = [([], self.root)]
+        while stack:
+            labels, node = stack.pop()
+            for record_type, entry in (node.entries or {}).items():
+                yield labels, record_type, entry
+            for label, child in (node.children or {}).items():
+                stack.append((labels + [label], child))
+
+    def remove_expired(self, now: datetime) -> None:
+        """
+        Removes all expired entries and the nodes, which became empty.
+        """
+        self.entry_count -= self._remove_expired(self.root, now)
+
+    def get_metrics(self) -> {str: int or float}:
+        with self.locked():
+            return {
+                "entries": self.entry_count,
+                "acquisitions": self.acquisitions,
+                "contentions": self.contentions,
+                "wait_time": self.wait_time
+            }
+
+    def _remove_expired(self, node: CacheNode, now: datetime) -> int:
+        """
+        Removes the expired entries of the node and its children.
+        :return: The count of removed entries.
+        """
+        removed = 0
+        if node.entries:
+            expired = [record_type
+                       for record_type, entry in node.entries.items()
+                       if entry[0] <= now]
+            for record_type in expired:
+                del node.entries[record_type]
+            removed += len(expired)
+        if node.children:
+            for label, child in list(node.children.items()):
+                removed += self._remove_expired(child, now)
+                if child.is_empty():
+                    del node.children[label]
+        return removed
@@ -0,0 +1,135 @@
+# std libraries
+import json
+import os
+from datetime import datetime
+from threading import Event, Lock, Thread
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.recursive_resolver.dns_message_cache import DnsMessageCache
+from logger import logger
+
+
+class CacheSnapshotter:
+    """
+    Stores the entries of a DnsMessageCache in a snapshot file,
+    so a restarted resolver can start with a warm cache.
+    The snapshot contains the requested names, the absolute expiry times
+    and the encoded responses as compact JSON.
+    After start() was called, a snapshot is written every interval seconds
+    in a background thread, stop() writes a final snapshot.
+    Snapshots are written to a temporary file, which replaces the old
+    snapshot afterwards, so a crash can't leave a broken snapshot.
+    Expired entries are filtered by the clock of the cache,
+    so e.g. the cache of a simulation keeps its virtual time.
+    """
+
+    SNAPSHOT_VERSION = 1
+    DEFAULT_INTERVAL = 60  # seconds
+
+    def __init__(self,
+                 cache: DnsMessageCache, snapshot_file: str,
+                 interval: float = DEFAULT_INTERVAL,
+                 logger_key: object = None):
+        self.cache = cache
+        self.snapshot_file = snapshot_file
+        self.interval = interval
+        self.logger_key = logger_key
+        self.stopped = Event()
+        self.write_lock = Lock()
+        self.thread = None
+
+    def load(self) -> int:
+        """
+        Adds all entries of the snapshot, which aren't expired yet,
+        to the cache.
+        A broken snapshot is logged and the cache starts cold,
+        since the snapshot only speeds up the start.
+        :return: The count of loaded entries.
+        """
+        if not os.path.exists(self.snapshot_file):
+            return 0
+        try:
+            loaded_entries = self._load_entries()
+        except (OSError, ValueError, KeyError, TypeError,
+                AttributeError) as error:
+            logger.log(f"Cache snapshot {self.snapshot_file} couldn't be "
+                       f"loaded, starting with a cold cache: {error!r}",
+                       self.logger_key)
+            return 0
+        logger.log(f"Loaded {loaded_entries} cache entries "
+                   f"from {self.snapshot_file}", self.logger_key)
+        return loaded_entries
+
+    def save(self) -> None:
+        """
+        Writes all entries of the cache, which aren't expired yet,
+        to the snapshot file.
+        """
+        now = self.cache.clock()
+        entries = [
+            [requested_name, expiry_timestamp.timestamp(),
+             dns_msg.build_message()]
+            for requested_name, expiry_timestamp, dns_msg
+            in self.cache.get_entries()
+            if expiry_timestamp > now
+        ]
+        snapshot = {
+            "version": CacheSnapshotter.SNAPSHOT_VERSION,
+            "entries": entries
+        }
+        with self.write_lock:
+            tmp_filename = f"{self.snapshot_file}.tmp"
+            with open(tmp_filename, "w") as file:
+                json.dump(snapshot, file, separators=(",", ":"))
+            os.replace(tmp_filename, self.snapshot_file)
+
+    def start(self) -> None:
+        """
+        Starts writing snapshots periodically in a background thread.
+        """
+        self.stopped.clear()
+        self.thread = Thread(target=self._save_periodically, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops writing snapshots periodically and writes a final snapshot.
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.save()
+
+    def _load_entries(self) -> int:
+        """
+        Reads the snapshot, before adding its entries to the cache,
+        so a broken snapshot doesn't leave a partly loaded cache.
+        """
+        with open(self.snapshot_file) as file:
+            snapshot = json.load(file)
+        if snapshot.get("version") != CacheSnapshotter.SNAPSHOT_VERSION:
+            return 0
+        now = self.cache.clock().timestamp()
+        entries = []
+        for requested_name, expiry_time, encoded_msg in snapshot["entries"]:
+            if expiry_time > now:
+                dns_response = DnsMessage.new_dns_response(encoded_msg)
+                dns_response.get_ttl()  # decodes the message
+                entries.append((
+                    requested_name, datetime.fromtimestamp(expiry_time),
+                    dns_response
+                ))
+        for requested_name, expiry_timestamp, dns_response in entries:
+            self.cache.add_entry(
+                requested_name, expiry_timestamp, dns_response
+            )
+        return len(entries)
+
+    def _save_periodically(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                self.save()
+            except OSError as error:
+                logger.log(f"Cache snapshot failed: {error}",
+                           self.logger_key)
@@ -0,0 +1,126 @@
+# std libraries
+import os
+import re
+from _thread import start_new_thread
+from time import monotonic
+from typing import Callable, Iterator
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.recursive_resolver.dns_message_cache import DnsMessageCache
+from heavy_hitter_sketch import HeavyHitterSketch
+from logger import logger
+from token_bucket import TokenBucket
+
+
+class CacheWarmer:
+    """
+    Fills a DnsMessageCache with the most frequently requested names
+    of historical query logs.
+    The logs written by the servers (see RequestServer) as well as files
+    containing one name per line are supported.
+    Only the last max_bytes of every file are read
+    and the names are counted by a HeavyHitterSketch,
+    so the memory usage doesn't depend on the size of the logs.
+    The top names, which aren't cached yet, are resolved
+    with at most rate lookups per second.
+    """
+
+    DEFAULT_TOP_N = 1000
+    DEFAULT_RATE = 50  # lookups per second
+    DEFAULT_MAX_BYTES = 16 * 1024 * 1024  # per log file
+    SKETCH_CAPACITY_FACTOR = 4
+    NAME_PATTERNS = (
+        re.compile(r"Req rec: (\S+) \|"),  # log of a RequestServer
+        re.compile(r"^([\w-]+(?:\.[\w-]+)*)$")  # query log
+    )
+
+    @classmethod
+    def _get_name(cls, line: str) -> str or None:
+        for pattern in cls.NAME_PATTERNS:
+            match = pattern.search(line)
+            if match is not None:
+                return match.group(1)
+        return None
+
+    def __init__(self,
+                 cache: DnsMessageCache,
+                 resolve: Callable[[str], DnsMessage],
+                 log_files: [str],
+                 top_n: int = DEFAULT_TOP_N, rate: float = DEFAULT_RATE,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 logger_key: object = None):
+        """
+        :param cache: The cache to fill.
+        :param resolve: The function used to resolve a name,
+        which must add the response to the cache.
+        :param log_files: The logs to read the requested names from.
+        :param top_n: The count of names to resolve.
+        :param rate: The max. count of lookups per second.
+        :param max_bytes: The count of bytes read from the end of each log.
+        """
+        self.cache = cache
+        self.resolve = resolve
+        self.log_files = log_files
+        self.top_n = top_n
+        self.rate_limiter = TokenBucket(rate)
+        self.max_bytes = max_bytes
+        self.logger_key = logger_key
+
+    def warm_up(self, in_background: bool = True) -> None:
+        """
+        Resolves the most frequently requested names of the logs.
+        """
+        if in_background:
+            start_new_thread(self._warm_up, ())
+        else:
+            self._warm_up()
+
+    def find_hot_names(self) -> [str]:
+        """
+        Returns the top_n most frequently requested names of the logs.
+        """
+        sketch = HeavyHitterSketch(
+            self.top_n * CacheWarmer.SKETCH_CAPACITY_FACTOR
+        )
+        for line in self._read_lines():
+            name = self._get_name(line)
+            if name is not None:
+                sketch.add(name)
+        return [name for name, _ in sketch.get_top(self.top_n)]
+
+    def _warm_up(self) -> None:
+        start_time = monotonic()
+        try:
+            hot_names = self.find_hot_names()
+        except Exception as error:  # e.g. an unreadable log
+            logger.log(f"Cache warm up failed: {error!r}", self.logger_key,
+                       flush=True)
+            return
+        resolved_names = 0
+        for name in hot_names:
+            if self.cache.get_dns_message(name) is not None:
+                continue
+            self.rate_limiter.consume()
+            try:
+                self.resolve(name)
+                resolved_names += 1
+            # one failing name shouldn't stop the warm up in background
+            except Exception as error:
+                logger.log(f"Warm up of {name} failed: {error!r}",
+                           self.logger_key)
+        logger.log(f"Cache warm up resolved {resolved_names} of "
+                   f"{len(hot_names)} hot names in "
+                   f"{monotonic() - start_time:.2f}s", self.logger_key)
+        logger.flush(self.logger_key)
+
+    def _read_lines(self) -> Iterator[str]:
+        for log_file in self.log_files:
+            if not os.path.exists(log_file):
+                continue
+            with open(log_file, "rb") as file:
+                file_size = file.seek(0, os.SEEK_END)
+                file.seek(max(file_size - self.max_bytes, 0))
+                if file_size > self.max_bytes:
+                    file.readline()  # skip the partial line
+                for line in file:
+                    yield line.decode(errors="replace").strip()
@@ -0,0 +1,124 @@
+# std libraries
+from bisect import bisect
+from hashlib import blake2b
+from math import ceil
+from threading import Lock
+
+
+class ConsistentHashRing:
+    """
+    Maps keys to nodes by consistent hashing with bounded loads.
+    Every node is placed on the ring at virtual_nodes points,
+    a key belongs to the first node clockwise from the hash of the key,
+    so adding or ejecting a node only moves the keys of this node.
+    To bound the load, a node is skipped, while it has more than
+    load_factor times the average count of acquired keys,
+    so popular keys spill over to the next node on the ring.
+    The hashes don't depend on the process,
+    so every client maps a key to the same node.
+    """
+
+    DEFAULT_VIRTUAL_NODES = 100
+    DEFAULT_LOAD_FACTOR = 1.25
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(
+            blake2b(key.encode(), digest_size=8).digest(), "big"
+        )
+
+    def __init__(self,
+                 nodes: [object],
+                 virtual_nodes: int = DEFAULT_VIRTUAL_NODES,
+                 load_factor: float = DEFAULT_LOAD_FACTOR):
+        """
+        :param nodes: The nodes, their string is hashed.
+        :param virtual_nodes: The count of points per node on the ring.
+        :param load_factor: The max. load of a node
+        relative to the average load, must be greater than 1.
+        """
+        assert nodes, "The ring needs at least one node."
+        assert load_factor > 1, "The load factor must be greater than 1."
+        self.nodes = list(nodes)
+        self.load_factor = load_factor
+        self.loads = {node: 0 for node in self.nodes}
+        self.ejected = set()
+        self.lock = Lock()
+        points = sorted(
+            (self._hash(f"{node}#{index}"), position)
+            for position, node in enumerate(self.nodes)
+            for index in range(virtual_nodes)
+        )
+        self.point_hashes = [point_hash for point_hash, _ in points]
+        self.point_nodes = [self.nodes[position] for _, position in points]
+
+    def get_node(self, key: str) -> object:
+        """
+        Returns the node of the key, ignoring the loads.
+        """
+        with self.lock:
+            return self._find_node(key, (), bounded=False)
+
+    def acquire(self, key: str, skipped: (object,) = ()) -> object:
+        """
+        Returns the node of the key, which isn't overloaded,
+        and counts the key as load, until release() is called.
+        :param skipped: Nodes, which shouldn't be returned,
+        e.g. because they already failed for the key.
+        """
+        with self.lock:
+            node = self._find_node(key, skipped, bounded=True)
+            self.loads[node] += 1
+            return node
+
+    def release(self, node: object, count: int = 1) -> None:
+        """
+        Removes the load of count keys acquired for the node.
+        """
+        with self.lock:
+            self.loads[node] -= count
+
+    def eject(self, node: object) -> None:
+        """
+        Removes the node from the ring,
+        its keys are mapped to the following nodes.
+        """
+        with self.lock:
+            self.ejected.add(node)
+
+    def restore(self, node: object) -> None:
+        """
+        Adds an ejected node again, it gets back the same keys.
+        """
+        with self.lock:
+            self.ejected.discard(node)
+
+    def is_ejected(self, node: object) -> bool:
+        return node in self.ejected
+
+    def _find_node(self,
+                   key: str, skipped: (object,), bounded: bool) -> object:
+        """
+        Walks clockwise from the hash of the key to the first node,
+        which isn't skipped, ejected or, if bounded, overloaded.
+        If all nodes are ejected, the ejected nodes are used,
+        so keys are still mapped while all nodes are unhealthy.
+        """
+        excluded = self.ejected.union(skipped)
+        if len(excluded) >= len(self.nodes):
+            excluded = set(skipped)
+        candidates = len(self.nodes) - len(excluded)
+        capacity = ceil(
+            self.load_factor * (sum(self.loads.values()) + 1)
+            / max(candidates, 1)
+        )
+        start = bisect(self.point_hashes, self._hash(key))
+        point_count = len(self.point_nodes)
+        for offset in range(point_count):
+            node = self.point_nodes[(start + offset) % point_count]
+            if node in excluded:
+                continue
+            if not bounded or self.loads[node] < capacity:
+                return node
+        # every node is skipped
+        return self.point_nodes[start % point_count]
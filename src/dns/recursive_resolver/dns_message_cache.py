@@ -1,8 +1,12 @@
 # std. imports
 from datetime import datetime, timedelta
+from typing import Callable
 # local imports
 from dns.dns_message import DnsMessage
+from dns.recursive_resolver.cache_shard import CacheShard
+from dns.recursive_resolver.response_template import ResponseTemplate
 from logger import logger
+from tracer import tracer
 
 
 class DnsMessageCache:
@@ -14,17 +18,62 @@ class DnsMessageCache:
     by adjusting the object as required.
     DnsMessages can be accessed using the add_dns_message()
     and get_dns_message() method.
-    The ttl can be updated by calling update_dns_messages(),
-    which will be done automatically by calling get_dns_message().
+    Expired messages are ignored and removed by get_dns_message(),
+    update_dns_messages() removes all expired messages
+    and should be called periodically (as the RecursiveResolver does),
+    since names, which aren't requested again, would stay otherwise.
+    All entries can be read and restored with their absolute expiry time
+    by get_entries() and add_entry(), e.g. to store them in a snapshot.
+    The entries are indexed by a trie of the labels of their names
+    and every name keeps one entry per record type,
+    so the NS response of a zone and the A response of a name
+    don't replace each other.
+    get_dns_message() returns the response for the requested name,
+    get_delegation() the NS response of the deepest cached zone
+    containing the name, both with one lookup per label,
+    independent of the count of cached names.
+    The cache can be used by multiple threads,
+    the entries are split into shards by the hash of the two top level
+    labels of their name, each protected by its own lock,
+    so a name and all its parent names below the top level
+    are found in one shard.
+    The cache stores and returns copies of the messages,
+    so changing a returned message won't change the cache.
+    The current time is read from the clock, which can be replaced
+    e.g. by the virtual clock of a simulation.
+    Every entry also keeps its response as ResponseTemplate,
+    so get_encoded_response() answers hits without building a DnsMessage.
     """
 
+    DEFAULT_SHARD_COUNT = 16
+    ANSWER_TYPES = ("A", "NS")  # the preferred type first
+    SHARD_LABELS = 2
+
+    @staticmethod
+    def _get_labels(name: str) -> [str]:
+        return name.split(".")[::-1]
+
     @staticmethod
-    def _get_record_expiry_timestamp(dns_msg: DnsMessage) -> datetime:
-        return datetime.now() + timedelta(0, dns_msg.get_ttl())
+    def _copy_with_ttl(entry: (datetime, DnsMessage, ResponseTemplate),
+                       now: datetime) -> DnsMessage:
+        """
+        Returns a copy of the message of the entry with the remaining ttl.
+        """
+        expiry_timestamp, dns_msg, _ = entry
+        dns_msg = dns_msg.copy()
+        dns_msg.set_updated_ttl((expiry_timestamp - now).seconds)
+        return dns_msg
 
-    def __init__(self, logger_key: object = None):
-        self.dns_messages: {str: (datetime, DnsMessage)} = {}
+    def __init__(self,
+                 logger_key: object = None,
+                 shard_count: int = DEFAULT_SHARD_COUNT,
+                 clock: Callable[[], datetime] = datetime.now):
+        """
+        :param clock: Returns the current time.
+        """
+        self.shards = [CacheShard() for _ in range(shard_count)]
         self.logger_key = logger_key
+        self.clock = clock
 
     def add_dns_message(self,
                         requested_name: str,
@@ -36,23 +85,105 @@ class DnsMessageCache:
         :param dns_response: An object of DnsMessage,
         containing the received response.
         """
-        self.dns_messages[requested_name] = (
+        self.add_entry(
+            requested_name,
             self._get_record_expiry_timestamp(dns_response),
             dns_response
         )
 
-    def get_dns_message(self, req_name: str) -> DnsMessage:
+    def add_entry(self,
+                  requested_name: str, expiry_timestamp: datetime,
+                  dns_response: DnsMessage) -> None:
+        """
+        Adds a response, which expires at the expiry timestamp,
+        instead of calculating it from the ttl.
+        """
+        self.add_prebuilt_entry(requested_name, (
+            expiry_timestamp, dns_response.copy(),
+            ResponseTemplate(dns_response)
+        ))
+
+    def add_prebuilt_entry(self,
+                           requested_name: str,
+                           entry: (datetime, DnsMessage, ResponseTemplate)
+                           ) -> None:
+        """
+        Adds an entry of the expiry timestamp, the response
+        and its ResponseTemplate as it is, without copying the response,
+        so multiple names can share one entry, e.g. to save memory.
+        The response of the entry must not be changed afterwards.
+        """
+        labels = self._get_labels(requested_name)
+        with self._get_shard(labels).locked() as shard:
+            shard.add_entry(labels, entry[1].get_answer_type(), entry)
+
+    def get_entries(self) -> [(str, datetime, DnsMessage)]:
+        """
+        Returns all entries as tuples of the requested name,
+        the expiry timestamp and a copy of the response.
+        """
+        entries = []
+        for shard in self.shards:
+            with shard.locked():
+                shard_entries = list(shard.iter_entries())
+            entries += [
+                (".".join(reversed(labels)), expiry_timestamp, dns_msg.copy())
+                for labels, _, (expiry_timestamp, dns_msg, _)
+                in shard_entries
+            ]
+        return entries
+
+    def get_dns_message(self, req_name: str) -> DnsMessage or None:
         """
-        Searches for a request in the cache by its name.
-        Before looking up the request,
-        the cache will be updated (see update_dns_msg()).
+        Searches for a request in the cache by its name,
+        the A response is preferred over the NS response of the name.
         :param req_name: The name to lookup in the cache.
-        :return: The DnsMessage containing the cached response.
+        :return: A copy of the cached response with the remaining ttl
+        or None if there is no match.
         """
-        logger.log(f"Cache got request for {req_name}", self.logger_key)
-        self.update_dns_messages()
-        dns_msg = self._get_best_record_match(req_name)
-        return dns_msg
+        with tracer.span("cache.get_dns_message", req_name=req_name):
+            logger.log(f"Cache got request for {req_name}", self.logger_key)
+            now = self.clock()
+            entry = self._get_valid_entry(self._get_labels(req_name), now)
+            return None if entry is None \
+                else self._copy_with_ttl(entry, now)
+
+    def get_delegation(self, req_name: str) -> DnsMessage or None:
+        """
+        Searches for the NS response of the deepest cached zone,
+        which contains the name, or of the name itself,
+        so the resolution can start at the name server of that zone.
+        :return: A copy of the cached response with the remaining ttl
+        or None if no zone of the name is cached.
+        """
+        labels = self._get_labels(req_name)
+        now = self.clock()
+        entry = None
+        if len(labels) > 1:
+            with self._get_shard(labels).locked() as shard:
+                entry = shard.get_deepest_entry(
+                    labels, "NS", now, min_depth=2
+                )
+        if entry is None:
+            with self._get_shard(labels[:1]).locked() as shard:
+                entry = shard.get_deepest_entry(labels[:1], "NS", now)
+        return None if entry is None else self._copy_with_ttl(entry, now)
+
+    def get_encoded_response(self,
+                             req_name: str,
+                             msg_id: int or None) -> bytes or None:
+        """
+        Searches for a request in the cache as get_dns_message() does,
+        but returns the encoded, not authoritative response
+        with the remaining ttl and the ID, as sent by the resolver.
+        :return: The encoded response or None if there is no match.
+        """
+        now = self.clock()
+        entry = self._get_valid_entry(self._get_labels(req_name), now)
+        if entry is None:
+            return None
+        expiry_timestamp, _, template = entry
+        return template.render(msg_id, (expiry_timestamp - now).seconds)
 
     def update_dns_messages(self) -> None:
         """
@@ -60,26 +191,40 @@ class DnsMessageCache:
         which got an expired timestamp.
         The timestamp is initially generated from the ttl and system time.
         """
-        now = datetime.now()
-        self.dns_messages = {
-            requested_name: time_msg_tuple
-            for requested_name, time_msg_tuple in self.dns_messages.items()
-            if time_msg_tuple[0] > now
-        }
-
-    def _get_best_record_match(self, req_name: str) -> DnsMessage:
-        best_match_name = ""
-        best_match_msg = None
-        for record_name in self.dns_messages:
-            if len(record_name) > len(best_match_name) \
-                    and req_name.endswith(record_name):
-                best_match_name = record_name
-                best_match_msg = self.dns_messages[record_name][1]  # 0 = timestamp, 1 = DNS message
-        if best_match_msg is not None:
-            self._update_msg_ttl(best_match_name)
-        return best_match_msg
-
-    def _update_msg_ttl(self, best_match_name: str) -> None:
-        expiry_timestamp, dns_msg = self.dns_messages[best_match_name]
-        updated_ttl = expiry_timestamp - datetime.now()
-        dns_msg.set_updated_ttl(updated_ttl.seconds)
+        now = self.clock()
+        for shard in self.shards:
+            with shard.locked():
+                shard.remove_expired(now)
+
+    def get_shard_metrics(self) -> [{str: int or float}]:
+        """
+        Returns the count of entries, lock acquisitions and contentions,
+        as well as the time spent waiting for the lock of each shard.
+        """
+        return [shard.get_metrics() for shard in self.shards]
+
+    def _get_record_expiry_timestamp(self, dns_msg: DnsMessage) -> datetime:
+        return self.clock() + timedelta(0, dns_msg.get_ttl())
+
+    def _get_shard(self, labels: [str]) -> CacheShard:
+        shard_labels = tuple(labels[:DnsMessageCache.SHARD_LABELS])
+        return self.shards[hash(shard_labels) % len(self.shards)]
+
+    def _get_valid_entry(self,
+                         labels: [str], now: datetime
+                         ) -> (datetime, DnsMessage, ResponseTemplate) or None:
+        """
+        Returns the entry of the name of the first answer type,
+        which is cached and not expired.
+        Expired entries will be removed.
+        """
+        with self._get_shard(labels).locked() as shard:
+            for record_type in DnsMessageCache.ANSWER_TYPES:
+                entry = shard.get_entry(labels, record_type)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    shard.remove_entry(labels, record_type)
+                    continue
+                return entry
+        return None
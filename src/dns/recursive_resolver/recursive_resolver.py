@@ -1,9 +1,24 @@
 import socket
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from random import Random
+from threading import Event, Lock, Thread, local
+from time import sleep
+from typing import Generator, Iterator
 
 from dns.dns_message import DnsMessage
+from dns.dns_server.simple_dns_server import SimpleDnsServer
+from dns.recursive_resolver.cache_snapshotter import CacheSnapshotter
+from dns.recursive_resolver.cache_warmer import CacheWarmer
 from dns.recursive_resolver.dns_message_cache import DnsMessageCache
+from dns.recursive_resolver.shared_memory_cache import SharedMemoryCache
 from request_server import RequestServer
+from load_shedder import LoadShedder
 from logger import logger
+from query_capture import QueryCapture
+from rate_limiter import RateLimiter
+from simulation.latency_model import LatencyModel
+from tracer import tracer
+from transport.socket_transport import SocketTransport
 
 
 class RecursiveResolver:
@@ -14,79 +29,483 @@ class RecursiveResolver:
     and clear them after their ttl.
     Can be started by the method run() and stopped by the stop().
     Uses a RequestServer to accept the requests and send the responses.
+    Batch requests, asking for multiple names, are answered
+    by one combined response or by streamed partial responses.
+    Cache hits are answered immediately,
+    while the misses are resolved in parallel.
+    If a snapshot file is set, the cache is loaded from it on run()
+    and stored in it periodically and on stop().
+    Expired entries of the cache are removed every SWEEP_INTERVAL.
+    If warm up logs are set, the most frequently requested names
+    of these logs are resolved in the background on run()
+    or by warm_up_cache(), e.g. after the name servers are started.
+    Multiple resolver processes can share one cache and one address,
+    by passing a SharedMemoryCache and setting reuse_port.
+    The resolution steps are implemented by a generator,
+    which yields the requests for the name servers,
+    so they can be sent over sockets or by a simulated network.
+    Cache hits of single requests are answered by the encoded response
+    of the cache, only the ID and the TTL are replaced.
+    Requests of noisy clients can be limited by a RateLimiter
+    and a LoadShedder can reject requests, when the resolver is saturated.
+    All sockets, of the server and for the requests to the name servers,
+    are created by the transport, e.g. a MemoryTransport.
+    Name servers running in the same process can be added
+    by add_colocated_server(), they are called directly with the messages,
+    without encoding them or sending them over a socket.
+    If a LatencyModel is set, the calls are delayed as set by it.
+    If a QueryCapture is set, the requests are recorded to be replayed.
+    Requests to name servers, which aren't answered within
+    UPSTREAM_TIMEOUT, are answered by SERVFAIL, which isn't cached.
     """
 
+    MAX_PARALLEL_RESOLUTIONS = 16
+    MAX_BATCH_ANSWERS = 100  # per response, to stay below the udp size
+    SWEEP_INTERVAL = 60  # seconds between two removals of expired entries
+    UPSTREAM_TIMEOUT = 3  # seconds to wait for a name server
+
+    @staticmethod
+    def _is_in_zone(name: str, zone: str) -> bool:
+        return name == zone or name.endswith(f".{zone}")
+
+    @staticmethod
+    def _create_request(requested_name: str) -> DnsMessage:
+        dns_request = DnsMessage.new_dns_request()
+        dns_request.set_req(requested_name, recursion_desired=True)
+        return dns_request
+
     def __init__(self,
                  root_dns_server: str, root_dns_server_port: int = 53053,
-                 ip_address: str = "127.0.0.10", port: int = 53053):
+                 ip_address: str = "127.0.0.10", port: int = 53053,
+                 snapshot_file: str or None = None,
+                 snapshot_interval: float = CacheSnapshotter.DEFAULT_INTERVAL,
+                 warm_up_logs: [str] or None = None,
+                 cache: DnsMessageCache or SharedMemoryCache or None = None,
+                 reuse_port: bool = False,
+                 rate_limiter: RateLimiter or None = None,
+                 load_shedder: LoadShedder or None = None,
+                 transport: object or None = None,
+                 latency_model: LatencyModel or None = None,
+                 capture: QueryCapture or None = None):
+        """
+        :param snapshot_file: The file to store the cache in or None.
+        :param snapshot_interval: The seconds between two snapshots.
+        :param warm_up_logs: The query logs used to warm up the cache.
+        :param cache: The cache to use, by default a new DnsMessageCache.
+        :param reuse_port: True, if other processes can bind the address.
+        :param rate_limiter: Limits the requests per client and name.
+        :param load_shedder: Rejects requests, when the resolver
+        is saturated, requests answered by the cache are preferred.
+        :param transport: Creates the sockets, by default kernel sockets.
+        :param latency_model: Delays the calls of colocated name servers
+        or None to call them without delay.
+        :param capture: Records the received requests or None.
+        """
         self.root_dns_server = root_dns_server
-        self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sockets = local()  # one udp socket per thread
         self.root_dns_server_addr = (root_dns_server, root_dns_server_port)
+        self.name_server_port = root_dns_server_port
+        self.transport = transport if transport is not None \
+            else SocketTransport()
+        self.colocated_servers: {(str, int): SimpleDnsServer} = {}
+        self.random = Random()  # chooses between replicated name servers
+        self.latency_model = latency_model
         self.server = RequestServer(
             ip_address, port,
-            self.handle_request
+            self.handle_request, reuse_port=reuse_port,
+            rate_limiter=rate_limiter, load_shedder=load_shedder,
+            transport=self.transport, capture=capture
         )
-        self.cache = DnsMessageCache(logger_key=self.server)
+        self.load_shedder = load_shedder
+        if load_shedder is not None and load_shedder.is_preferred is None:
+            load_shedder.is_preferred = self._is_cache_hit
+        self.cache = cache if cache is not None \
+            else DnsMessageCache(logger_key=self.server)
+        self.snapshotter = CacheSnapshotter(
+            self.cache, snapshot_file, snapshot_interval,
+            logger_key=self.server
+        ) if snapshot_file is not None else None
+        self.cache_warmer = CacheWarmer(
+            self.cache, self.resolve, warm_up_logs, logger_key=self.server
+        ) if warm_up_logs else None
+        self.sweep_stopped = Event()
+        self.referrals_lock = Lock()  # referrals are shared by a batch
 
-    def run(self) -> None:
+    def run(self, warm_up: bool = True) -> None:
         """
         Opens the socket and starts receiving requests in a new thread.
+        :param warm_up: False, if the cache should be warmed up later
+        by warm_up_cache(), e.g. since the name servers aren't started yet.
         """
         logger.log("RecursiveResolver:")
+        if self.snapshotter is not None:
+            self.snapshotter.load()
+            self.snapshotter.start()
         self.server.open_socket()
         self.server.run()  # will be in background
+        self.sweep_stopped.clear()
+        Thread(target=self._sweep_cache_periodically, daemon=True).start()
+        if warm_up:
+            self.warm_up_cache()
         logger.flush()
 
+    def warm_up_cache(self) -> None:
+        """
+        Starts resolving the names of the warm up logs in the background,
+        if warm up logs are set.
+        """
+        if self.cache_warmer is not None:
+            self.cache_warmer.warm_up()
+
     def stop(self) -> None:
         """
         Stop listening for requests,
-        the socket will remain blocked.
+        the requests in progress are still answered.
         """
         self.server.stop_listening()
+        self.sweep_stopped.set()
+        if self.snapshotter is not None:
+            self.snapshotter.stop()
+        if self.load_shedder is not None:
+            logger.log(f"RecResolver load shedding: "
+                       f"{self.load_shedder.get_metrics()}", flush=True)
 
-    def handle_request(self, request: str) -> str:
+    def _sweep_cache_periodically(self) -> None:
+        """
+        Removes the expired entries of the cache every SWEEP_INTERVAL,
+        since lookups only remove the expired entries they find,
+        so names, which aren't requested again, would stay forever.
+        """
+        while not self.sweep_stopped.wait(RecursiveResolver.SWEEP_INTERVAL):
+            self.cache.update_dns_messages()
+
+    def add_colocated_server(self, dns_server: SimpleDnsServer) -> None:
+        """
+        Adds a name server of the same process,
+        requests to its address will call it directly.
+        """
+        self.colocated_servers[
+            (dns_server.ip_address, dns_server.port)
+        ] = dns_server
+
+    def handle_request(self,
+                       request: str) -> str or bytes or Iterator[str]:
         """
         Handles a DNS request, which can be recursive.
         After resolving the possibly recursive request,
         a JSON response is generated and returned as string.
+        Cache hits are returned already encoded.
+        For batch requests the responses are returned as iterator,
+        which is traced while it is iterated.
         :param request: The received request.
         :return: The response.
         """
-        logger.log(f"RecResolver handling: {request}", self.server)
-        dns_request = DnsMessage.new_dns_request(request)
-        requested_name = dns_request.get_requested_name()
+        if DnsMessage.peek_value(request, DnsMessage.BATCH_NAMES_KEY) \
+                is not None:
+            return self._handle_traced_batch_request(request)
+        with tracer.span("resolver.handle_request"):
+            logger.log(f"RecResolver handling: {request}", self.server)
+            encoded_resp = self._get_encoded_cache_hit(request)
+            if encoded_resp is not None:
+                logger.flush(self.server)
+                return encoded_resp
+            dns_request = DnsMessage.new_dns_request(request)
+            requested_name = dns_request.get_requested_name()
+            dns_resp = self._resolve(
+                requested_name, dns_request.is_recursion_desired()
+            )
+            dns_resp.set_authoritative(False)
+            dns_resp.set_id(dns_request.get_id())
+            logger.flush(self.server)
+            return dns_resp.build_message()
+
+    def resolve(self,
+                requested_name: str,
+                recursion_desired: bool = True) -> DnsMessage:
+        """
+        Resolves the name without sending a request to the resolver,
+        the cache will be used as for requests.
+        :return: The response for the name.
+        """
+        dns_resp = self._resolve(requested_name, recursion_desired)
+        logger.flush(self.server)
+        return dns_resp
+
+    def _get_encoded_cache_hit(self, request: str) -> bytes or None:
+        """
+        Returns the encoded response, if the single request is
+        for a cached name, only reading the needed values of the request.
+        """
+        requested_name = DnsMessage.peek_value(request, "dns.qry.name")
+        msg_id = DnsMessage.peek_value(request, "dns.id")
+        if type(requested_name) != str \
+                or not (msg_id is None or type(msg_id) == int):
+            return None
+        return self.cache.get_encoded_response(requested_name, msg_id)
+
+    def _is_cache_hit(self, request: str) -> bool:
+        """
+        Checks if the request can be answered by the cache,
+        only reading the requested name of the encoded request.
+        """
+        requested_name = DnsMessage.peek_value(request, "dns.qry.name")
+        return requested_name is not None \
+            and self.cache.get_dns_message(requested_name) is not None
+
+    def _resolve(self,
+                 requested_name: str, recursion_desired: bool,
+                 referrals: {str: DnsMessage} or None = None) -> DnsMessage:
+        """
+        Looks up the name in the cache and resolves it on a cache miss,
+        by sending the requests of the resolution steps over udp.
+        :param referrals: Name server responses by the name of the
+        name server, which can be used to skip the first steps
+        of the recursion.
+        New referrals will be added.
+        """
+        steps = self.resolution_steps(
+            requested_name, recursion_desired, referrals
+        )
+        try:
+            request, server_addr = next(steps)
+            while True:
+                request, server_addr = steps.send(
+                    self._send_req(request, *server_addr)
+                )
+        except StopIteration as resolved:
+            return resolved.value
+
+    def resolution_steps(self,
+                         requested_name: str, recursion_desired: bool,
+                         referrals: {str: DnsMessage} or None = None
+                         ) -> Generator[tuple, DnsMessage, DnsMessage]:
+        """
+        Looks up the name in the cache and resolves it on a cache miss.
+        Yields the requests (as DnsMessage),
+        which should be sent to the name servers,
+        as tuples of the request and the name server address
+        and expects the response to be sent back into the generator.
+        The resolution starts at the name server of the deepest known zone
+        of the name, the referrals received are cached by their zone.
+        :param referrals: See _resolve().
+        :return: The response for the name, as value of StopIteration.
+        """
         dns_resp = self.cache.get_dns_message(requested_name)
-        if dns_resp is None:
-            logger.log("RecResolver starting resolving...", self.server)
-            dns_resp = self._send_root_req(request)
-            if dns_request.is_recursion_desired():
-                dns_resp = self._resolve_recursion(
-                    request, requested_name, dns_resp
+        if dns_resp is not None:
+            logger.log("Cache hit!", self.server)
+            return dns_resp
+        logger.log("RecResolver starting resolving...", self.server)
+        request = self._create_request(requested_name)
+        if recursion_desired:
+            dns_resp = self._get_best_referral(requested_name, referrals)
+            if dns_resp is None:
+                dns_resp = self.cache.get_delegation(requested_name)
+            if dns_resp is None:
+                dns_resp = yield request, self.root_dns_server_addr
+                self._cache_referral(requested_name, dns_resp)
+            name_server_name = dns_resp.get_name_server_name()
+            while name_server_name is not None \
+                    and name_server_name != requested_name:
+                if referrals is not None:
+                    with self.referrals_lock:
+                        referrals[name_server_name] = dns_resp
+                dns_resp = yield request, (
+                    self._choose_name_server(dns_resp), self.name_server_port
                 )
-            self.cache.add_dns_message(requested_name, dns_resp)
+                self._cache_referral(requested_name, dns_resp)
+                name_server_name = dns_resp.get_name_server_name()
         else:
-            logger.log("Cache hit!", self.server)
-        dns_resp.set_authoritative(False)
-        logger.flush(self.server)
-        return dns_resp.build_message()
+            dns_resp = yield request, self.root_dns_server_addr
+        if dns_resp.get_value("dns.flags.rcode") \
+                != DnsMessage.R_CODES["SERVFAIL"]:
+            self.cache.add_dns_message(requested_name, dns_resp)
+        return dns_resp
 
-    def _resolve_recursion(self,
-                           original_request: str, requested_name: str,
-                           last_dns_resp: DnsMessage) -> DnsMessage:
-        name_server_name = last_dns_resp.get_name_server_name()
-        while name_server_name is not None \
+    def _cache_referral(self,
+                        requested_name: str, dns_resp: DnsMessage) -> None:
+        """
+        Caches a referral to a zone of the requested name by the zone,
+        so later names of the zone start at its name server.
+        """
+        name_server_name = dns_resp.get_name_server_name()
+        if name_server_name is not None \
                 and name_server_name != requested_name:
-            name_server_addr = last_dns_resp.get_address()
-            last_dns_resp = self._send_req(original_request, name_server_addr)
-            name_server_name = last_dns_resp.get_name_server_name()
-        return last_dns_resp
+            self.cache.add_dns_message(name_server_name, dns_resp)
+
+    def _choose_name_server(self, referral: DnsMessage) -> str:
+        """
+        Returns the address of the name server of the referral
+        or of one of its replicas, to spread the requests between them.
+        """
+        addresses = referral.get_name_server_addresses()
+        return addresses[0] if len(addresses) == 1 \
+            else self.random.choice(addresses)
+
+    def _handle_traced_batch_request(self, request: str) -> Iterator[str]:
+        """
+        Handles the batch request within the span of handle_request(),
+        since the names are only resolved while the responses are iterated.
+        """
+        with tracer.span("resolver.handle_request", batch=True):
+            logger.log(f"RecResolver handling: {request}", self.server)
+            dns_request = DnsMessage.new_dns_request(request)
+            yield from self._handle_batch_request(dns_request)
+
+    def _handle_batch_request(self,
+                              dns_request: DnsMessage) -> Iterator[str]:
+        """
+        Answers every name once, even if it is requested multiple times,
+        since the client expects one answer per name.
+        """
+        requested_names = list(
+            dict.fromkeys(dns_request.get_requested_names())
+        )
+        recursion_desired = dns_request.is_recursion_desired()
+        answers = {}
+        misses = []
+        for requested_name in requested_names:
+            dns_resp = self.cache.get_dns_message(requested_name)
+            if dns_resp is None:
+                misses.append(requested_name)
+            else:
+                answers[requested_name] = dns_resp
+        logger.log(f"RecResolver batch of {len(requested_names)} names, "
+                   f"{len(misses)} cache misses", self.server)
+        is_stream = dns_request.is_stream_desired()
+        remaining = len(misses)
+        if is_stream and answers:
+            yield from self._build_batch_responses(
+                dns_request, answers, remaining
+            )
+            answers = {}
+        for requested_name, dns_resp in self._resolve_all(
+                misses, recursion_desired):
+            answers[requested_name] = dns_resp
+            remaining -= 1
+            if is_stream:
+                yield from self._build_batch_responses(
+                    dns_request, answers, remaining
+                )
+                answers = {}
+        if not is_stream or not requested_names:
+            yield from self._build_batch_responses(dns_request, answers)
+        logger.flush(self.server)
+
+    def _resolve_all(self,
+                     requested_names: [str],
+                     recursion_desired: bool
+                     ) -> Iterator[tuple]:
+        """
+        Resolves the names in parallel
+        and yields them in the order they are resolved.
+        The name server responses are shared between the resolutions.
+        """
+        if not requested_names:
+            return
+        referrals = {}
+        with ThreadPoolExecutor(
+                RecursiveResolver.MAX_PARALLEL_RESOLUTIONS) as executor:
+            futures = {
+                executor.submit(
+                    tracer.wrap(self._resolve), requested_name,
+                    recursion_desired, referrals
+                ): requested_name
+                for requested_name in requested_names
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def _build_batch_responses(self,
+                               dns_request: DnsMessage,
+                               answers: {str: DnsMessage},
+                               remaining: int = 0) -> Iterator[str]:
+        """
+        Yields the answers in responses of at most MAX_BATCH_ANSWERS.
+        :param remaining: The count of answers, which will follow.
+        """
+        names = list(answers)
+        chunk_size = RecursiveResolver.MAX_BATCH_ANSWERS
+        # an empty batch is answered by one empty response
+        for start in range(0, max(len(names), 1), chunk_size):
+            chunk_names = names[start:start + chunk_size]
+            dns_resp = DnsMessage.new_dns_response()
+            dns_resp.set_batch_resp(
+                {name: answers[name] for name in chunk_names},
+                remaining + len(names) - start - len(chunk_names)
+            )
+            dns_resp.set_authoritative(False)
+            dns_resp.set_id(dns_request.get_id())
+            yield dns_resp.build_message()
+
+    def _get_best_referral(self,
+                           requested_name: str,
+                           referrals: {str: DnsMessage} or None
+                           ) -> DnsMessage or None:
+        if not referrals:
+            return None
+        with self.referrals_lock:
+            zones = [zone for zone in referrals
+                     if self._is_in_zone(requested_name, zone)]
+            return referrals[max(zones, key=len)] if zones else None
 
-    def _send_root_req(self, request: str) -> DnsMessage:
-        dns_resp = self._send_req(request, *self.root_dns_server_addr)
+    def _send_req(self,
+                  request: DnsMessage,
+                  server_addr: str, server_port: int = 53053) -> DnsMessage:
+        with tracer.span("resolver.send_req", server=server_addr):
+            colocated_server = self.colocated_servers.get(
+                (server_addr, server_port)
+            )
+            if colocated_server is not None:
+                return self._call_colocated_server(
+                    colocated_server, request, server_addr
+                )
+            udp_sock = self._get_udp_socket()
+            udp_sock.sendto(
+                request.build_message().encode(), (server_addr, server_port)
+            )
+            try:
+                resp_data, _ = udp_sock.recvfrom(4096)
+            except socket.timeout:  # e.g. the datagram was lost
+                return self._fail_request(request, server_addr)
+            dns_resp = DnsMessage.new_dns_response(resp_data.decode())
+        return dns_resp
+
+    def _fail_request(self,
+                      request: DnsMessage, server_addr: str) -> DnsMessage:
+        """
+        Returns a SERVFAIL response for the unanswered request.
+        The socket of the thread is replaced,
+        so a late response can't be taken for the next one.
+        """
+        logger.log(f"RecResolver got no response from {server_addr} "
+                   f"within {RecursiveResolver.UPSTREAM_TIMEOUT}s",
+                   self.server)
+        self.sockets.udp_sock.close()
+        del self.sockets.udp_sock
+        dns_resp = DnsMessage.new_dns_response()
+        dns_resp.set_empty_resp(authoritative=False, rcode="SERVFAIL")
+        dns_resp.set_id(request.get_id())
         return dns_resp
 
-    def _send_req(self, request, server_addr: str, server_port: int = 53053):
-        self.udp_sock.sendto(request.encode(), (server_addr, server_port))
-        resp_data, _ = self.udp_sock.recvfrom(4096)
-        dns_resp = DnsMessage.new_dns_response(resp_data.decode())
+    def _call_colocated_server(self,
+                               dns_server: SimpleDnsServer,
+                               request: DnsMessage,
+                               server_addr: str) -> DnsMessage:
+        if self.latency_model is not None:
+            sleep(self.latency_model.get_delay(server_addr))
+        dns_resp = dns_server.answer(request)
+        if self.latency_model is not None:
+            sleep(self.latency_model.get_delay(server_addr))
         return dns_resp
+
+    def _get_udp_socket(self):
+        """
+        Returns the udp socket of the current thread,
+        so responses of parallel requests can't be mixed up.
+        """
+        if not hasattr(self.sockets, "udp_sock"):
+            self.sockets.udp_sock = self.transport.create_socket(True)
+            self.sockets.udp_sock.settimeout(
+                RecursiveResolver.UPSTREAM_TIMEOUT
+            )
+        return self.sockets.udp_sock
@@ -0,0 +1,222 @@
+# std libraries
+from _thread import start_new_thread
+from threading import Event, Lock
+from time import monotonic
+# local libraries
+from dns.dns_message import DnsMessage
+from transport.socket_transport import SocketTransport
+
+
+class ResolverClient:
+    """
+    A client, which sends DNS requests to a recursive resolver.
+    All requests are sent over one UDP socket
+    and the responses are matched to the requests by their ID,
+    so multiple threads can wait for responses at the same time.
+    Resolved addresses are cached, until their TTL expires.
+    Multiple names can be resolved by one batch request (see resolve_all()).
+    """
+
+    DEFAULT_TIMEOUT = 5  # seconds
+    MAX_ID = 65535
+    UDP_BUFF_SIZE = 65535  # max udp size
+
+    def __init__(self,
+                 resolver_address: (str, int),
+                 timeout: float = DEFAULT_TIMEOUT,
+                 use_cache: bool = True,
+                 transport: object or None = None):
+        """
+        :param resolver_address: The ip address and port of the resolver.
+        :param timeout: The seconds to wait for a response.
+        :param use_cache: True, if resolved addresses should be cached.
+        :param transport: Creates the socket, by default a kernel socket.
+        """
+        self.resolver_address = resolver_address
+        self.timeout = timeout
+        self.use_cache = use_cache
+        transport = transport if transport is not None \
+            else SocketTransport()
+        self.sock = transport.create_socket(True)
+        self.lock = Lock()
+        self.next_id = 0
+        # the event is set, when the count of missing answers reaches 0
+        self.pending_requests: {int: [Event, [DnsMessage], int or None]} = {}
+        self.is_receiving = False
+        self.address_cache: {str: (float, str)} = {}
+
+    def resolve(self, name: str) -> str:
+        """
+        Returns the address of the name,
+        which is taken from the cache if possible.
+        Raises TimeoutError, if the resolver doesn't respond in time.
+        :return: The address or an empty string if the name wasn't found.
+        """
+        address = self._get_cached_address(name)
+        if address is None:
+            dns_resp = self.query(name)
+            address = dns_resp.get_address()
+            self._cache_address(name, address, dns_resp.get_ttl())
+        return address
+
+    def resolve_all(self, names: [str]) -> {str: str}:
+        """
+        Returns the addresses of the names,
+        names which aren't cached are resolved by one batch request.
+        Raises TimeoutError, if the resolver doesn't respond in time.
+        :return: The addresses by name,
+        containing an empty string for names which weren't found.
+        """
+        addresses = {}
+        misses = []
+        for name in names:
+            address = self._get_cached_address(name)
+            if address is None:
+                misses.append(name)
+            else:
+                addresses[name] = address
+        if misses:
+            for name, dns_resp in self.query_batch(misses).items():
+                addresses[name] = dns_resp.get_address()
+                self._cache_address(
+                    name, addresses[name], dns_resp.get_ttl()
+                )
+        return addresses
+
+    def query(self, name: str, recursion_desired: bool = True) -> DnsMessage:
+        """
+        Sends a request for the name to the resolver
+        and waits for the response with the same ID.
+        Raises TimeoutError, if the resolver doesn't respond in time.
+        """
+        dns_request = DnsMessage.new_dns_request()
+        dns_request.set_req(name, recursion_desired=recursion_desired)
+        return self._send_request(dns_request)[0]
+
+    def query_batch(self,
+                    names: [str], recursion_desired: bool = True,
+                    stream: bool = True) -> {str: DnsMessage}:
+        """
+        Sends one batch request for all names to the resolver
+        and waits for all answers.
+        Raises TimeoutError, if the resolver doesn't respond in time.
+        :param stream: True, if the resolver should send the answers
+        as soon as they are known.
+        :return: The responses by their requested name.
+        """
+        dns_request = DnsMessage.new_dns_request()
+        dns_request.set_batch_req(
+            names, recursion_desired=recursion_desired, stream=stream
+        )
+        answers = {}
+        for dns_resp in self._send_request(dns_request, len(set(names))):
+            answers.update(dns_resp.get_answers())
+        return answers
+
+    def send_message(self, dns_request: DnsMessage) -> [DnsMessage]:
+        """
+        Sends a prepared request, e.g. a recorded one, with a new ID
+        and waits for all of its responses.
+        Raises TimeoutError, if the resolver doesn't respond in time.
+        """
+        expected_answers = len(set(dns_request.get_requested_names())) \
+            if dns_request.is_batch_request() else None
+        return self._send_request(dns_request, expected_answers)
+
+    def _send_request(self,
+                      dns_request: DnsMessage,
+                      expected_answers: int or None = None) -> [DnsMessage]:
+        """
+        Sends the request and waits for the responses,
+        until the expected count of answers was received
+        or for one response, if expected_answers is None.
+        """
+        msg_id, pending_request = self._register_request(expected_answers)
+        dns_request.set_id(msg_id)
+        self.sock.sendto(
+            dns_request.build_message().encode(), self.resolver_address
+        )
+        self._ensure_receiving()
+        if not pending_request[0].wait(self.timeout):
+            with self.lock:
+                self.pending_requests.pop(msg_id, None)
+            raise TimeoutError(
+                f"No response from resolver for "
+                f"{dns_request.get_requested_names()}."
+            )
+        return pending_request[1]
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def _get_cached_address(self, name: str) -> str or None:
+        if not self.use_cache:
+            return None
+        with self.lock:
+            expiry_time, address = self.address_cache.get(name, (0, None))
+            if expiry_time <= monotonic():
+                self.address_cache.pop(name, None)
+                return None
+        return address
+
+    def _cache_address(self, name: str, address: str, ttl: int) -> None:
+        if self.use_cache and address and ttl > 0:
+            with self.lock:
+                self.address_cache[name] = (monotonic() + ttl, address)
+
+    def _register_request(self,
+                          expected_answers: int or None
+                          ) -> (int, [Event, [DnsMessage], int or None]):
+        pending_request = [Event(), [], expected_answers]
+        with self.lock:
+            msg_id = self.next_id
+            self.next_id = (self.next_id + 1) % (ResolverClient.MAX_ID + 1)
+            self.pending_requests[msg_id] = pending_request
+        return msg_id, pending_request
+
+    def _ensure_receiving(self) -> None:
+        """
+        Starts receiving responses in a new thread,
+        after the socket got bound by sending the first request.
+        """
+        with self.lock:
+            if self.is_receiving:
+                return
+            self.is_receiving = True
+        start_new_thread(self._receive_responses, ())
+
+    def _receive_responses(self) -> None:
+        """
+        Receives the responses, until the socket is closed.
+        Datagrams, which aren't valid responses, are ignored.
+        """
+        try:
+            while True:
+                try:
+                    data, _ = self.sock.recvfrom(ResolverClient.UDP_BUFF_SIZE)
+                except OSError:  # socket closed
+                    break
+                try:
+                    dns_resp = DnsMessage.new_dns_response(data.decode())
+                    msg_id = dns_resp.get_id()
+                    answer_count = len(dns_resp.get_answers())
+                except (ValueError, AttributeError):  # no JSON object
+                    continue
+                self._add_response(msg_id, dns_resp, answer_count)
+        finally:
+            with self.lock:
+                self.is_receiving = False
+
+    def _add_response(self,
+                      msg_id: int, dns_resp: DnsMessage,
+                      answer_count: int) -> None:
+        with self.lock:
+            pending_request = self.pending_requests.get(msg_id)
+            if pending_request is None:  # timed out
+                return
+            pending_request[1].append(dns_resp)
+            if pending_request[2] is not None:
+                pending_request[2] -= answer_count
+            if pending_request[2] is None or pending_request[2] <= 0:
+                del self.pending_requests[msg_id]
+                pending_request[0].set()
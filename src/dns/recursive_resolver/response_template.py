@@ -0,0 +1,55 @@
+# local libraries
+from dns.dns_message import DnsMessage
+
+
+class ResponseTemplate:
+    """
+    A cached response of the recursive resolver, encoded once,
+    so cache hits can be answered without decoding, copying
+    and encoding a DnsMessage.
+    The encoded response is split at the values of the ID and the TTL,
+    the only values which differ between the responses for one entry,
+    and render() joins the parts with the current values.
+    The response isn't authoritative, as all responses of the resolver.
+    """
+
+    # unique values, which are replaced by the ID and the TTL
+    ID_MARKER = -4711000001
+    TTL_MARKER = -4711000002
+
+    @staticmethod
+    def _encode_value(value: int or None) -> bytes:
+        return b"null" if value is None else str(value).encode()
+
+    def __init__(self, dns_response: DnsMessage):
+        dns_response = dns_response.copy()
+        dns_response.set_authoritative(False)
+        dns_response.set_id(ResponseTemplate.ID_MARKER)
+        dns_response.set_updated_ttl(ResponseTemplate.TTL_MARKER)
+        encoded_response = dns_response.build_message().encode()
+        id_marker = self._encode_value(ResponseTemplate.ID_MARKER)
+        ttl_marker = self._encode_value(ResponseTemplate.TTL_MARKER)
+        id_start = encoded_response.index(id_marker)
+        ttl_start = encoded_response.index(ttl_marker)
+        self.is_id_first = id_start < ttl_start
+        (first_start, first_marker), (second_start, second_marker) = sorted(
+            ((id_start, id_marker), (ttl_start, ttl_marker))
+        )
+        first_end = first_start + len(first_marker)
+        self.head = encoded_response[:first_start]
+        self.middle = encoded_response[first_end:second_start]
+        self.tail = encoded_response[second_start + len(second_marker):]
+
+    def render(self, msg_id: int or None, ttl: int) -> bytes:
+        """
+        Returns the encoded response with the ID and the remaining TTL.
+        """
+        encoded_id = self._encode_value(msg_id)
+        encoded_ttl = str(ttl).encode()
+        if self.is_id_first:
+            return b"".join(
+                (self.head, encoded_id, self.middle, encoded_ttl, self.tail)
+            )
+        return b"".join(
+            (self.head, encoded_ttl, self.middle, encoded_id, self.tail)
+        )
@@ -0,0 +1,259 @@
+# std libraries
+from _thread import start_new_thread
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from typing import Callable
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.recursive_resolver.consistent_hash_ring import ConsistentHashRing
+from dns.recursive_resolver.resolver_client import ResolverClient
+from logger import logger
+
+
+class ShardedResolverClient:
+    """
+    A client for a fleet of recursive resolvers,
+    offering the same methods as a ResolverClient.
+    Every name is sent to one resolver chosen by a ConsistentHashRing,
+    so the cache of every resolver holds a different part of the names,
+    instead of every resolver caching all of them.
+    A resolver, which doesn't respond MAX_FAILURES times in a row,
+    is ejected from the ring, so only its names move to other resolvers.
+    The resolvers are probed every health_check_interval seconds
+    by an empty batch request, which they answer without a lookup,
+    and an ejected resolver is restored, as soon as it responds again.
+    A request, which times out, is retried by the next resolver.
+    Batches are split into one batch per resolver,
+    which are sent in parallel and count as load of their resolver.
+    """
+
+    DEFAULT_HEALTH_CHECK_INTERVAL = 5  # seconds
+    MAX_FAILURES = 2
+
+    @staticmethod
+    def _format_address(address: (str, int)) -> str:
+        return f"{address[0]}:{address[1]}"
+
+    def __init__(self,
+                 resolver_addresses: [(str, int)],
+                 timeout: float = ResolverClient.DEFAULT_TIMEOUT,
+                 use_cache: bool = True,
+                 transport: object or None = None,
+                 virtual_nodes: int = ConsistentHashRing.DEFAULT_VIRTUAL_NODES,
+                 load_factor: float = ConsistentHashRing.DEFAULT_LOAD_FACTOR,
+                 health_check_interval: float or None =
+                 DEFAULT_HEALTH_CHECK_INTERVAL):
+        """
+        :param resolver_addresses: The ip addresses and ports
+        of the resolvers.
+        :param virtual_nodes: The count of points per resolver on the ring.
+        :param load_factor: The max. count of requests in progress
+        of a resolver, relative to the average of all resolvers.
+        :param health_check_interval: The seconds between two probes
+        of every resolver or None to not probe them.
+        See ResolverClient for the other arguments.
+        """
+        self.clients = {
+            tuple(address): ResolverClient(
+                tuple(address), timeout, use_cache, transport
+            )
+            for address in resolver_addresses
+        }
+        self.ring = ConsistentHashRing(
+            list(self.clients), virtual_nodes, load_factor
+        )
+        self.lock = Lock()
+        self.failures = {address: 0 for address in self.clients}
+        self.requests = {address: 0 for address in self.clients}
+        self.ejections = 0
+        self.closed = Event()
+        if health_check_interval is not None:
+            start_new_thread(self._check_health, (health_check_interval,))
+
+    def resolve(self, name: str) -> str:
+        """
+        See ResolverClient.resolve().
+        """
+        return self._send(name, lambda client: client.resolve(name))
+
+    def query(self, name: str, recursion_desired: bool = True) -> DnsMessage:
+        """
+        See ResolverClient.query().
+        """
+        return self._send(
+            name, lambda client: client.query(name, recursion_desired)
+        )
+
+    def resolve_all(self, names: [str]) -> {str: str}:
+        """
+        Sends one batch request per resolver,
+        see ResolverClient.resolve_all().
+        """
+        return self._send_batches(
+            names,
+            lambda client, shard_names: client.resolve_all(shard_names),
+            lambda client, name: client.resolve(name)
+        )
+
+    def query_batch(self,
+                    names: [str], recursion_desired: bool = True,
+                    stream: bool = True) -> {str: DnsMessage}:
+        """
+        Sends one batch request per resolver,
+        see ResolverClient.query_batch().
+        """
+        return self._send_batches(
+            names,
+            lambda client, shard_names: client.query_batch(
+                shard_names, recursion_desired, stream
+            ),
+            lambda client, name: client.query(name, recursion_desired)
+        )
+
+    def get_metrics(self) -> {str: {str: int} or [str] or int}:
+        """
+        Returns the count of requests per resolver,
+        the ejected resolvers and the count of ejections.
+        """
+        with self.lock:
+            return {
+                "requests": {
+                    self._format_address(address): count
+                    for address, count in self.requests.items()
+                },
+                "ejected": [
+                    self._format_address(address) for address in self.clients
+                    if self.ring.is_ejected(address)
+                ],
+                "ejections": self.ejections
+            }
+
+    def close(self) -> None:
+        self.closed.set()
+        for client in self.clients.values():
+            client.close()
+
+    def _send(self,
+              name: str, request: Callable,
+              failed: [(str, int)] or None = None) -> object:
+        """
+        Calls the request with the client of the resolver of the name,
+        if it times out, with the client of the next resolver.
+        Raises TimeoutError, if no resolver responded.
+        :param failed: The resolvers, which already failed for the name
+        and are skipped.
+        """
+        failed = list(failed or [])
+        while True:
+            if len(failed) >= len(self.clients):
+                raise TimeoutError(f"No resolver responded for {name}.")
+            address = self.ring.acquire(name, failed)
+            try:
+                result = request(self.clients[address])
+            except TimeoutError:
+                self._record_failure(address)
+                failed.append(address)
+                continue
+            finally:
+                self.ring.release(address)
+            self._record_success(address)
+            return result
+
+    def _send_batches(self,
+                      names: [str],
+                      request: Callable,
+                      request_one: Callable) -> {str: object}:
+        """
+        Sends the batch requests of all resolvers in parallel,
+        so the latency is the one of the slowest resolver.
+        :param request: Sends a batch of names by a client.
+        :param request_one: Sends one name by a client,
+        if the batch timed out.
+        """
+        groups = self._group_by_resolver(names)
+        if not groups:
+            return {}
+        results = {}
+        with ThreadPoolExecutor(len(groups)) as executor:
+            for result in executor.map(
+                    lambda group: self._send_batch(
+                        *group, request, request_one
+                    ),
+                    groups.items()):
+                results.update(result)
+        return results
+
+    def _send_batch(self,
+                    address: (str, int), names: [str],
+                    request: Callable,
+                    request_one: Callable) -> {str: object}:
+        """
+        Sends a batch request to the resolver,
+        if it times out, every name is sent on its own,
+        so it is retried by the next resolver, skipping this one.
+        The load of the names is released, when the batch is answered.
+        """
+        try:
+            result = request(self.clients[address], names)
+        except TimeoutError:
+            result = None
+            self._record_failure(address)
+        finally:
+            self.ring.release(address, len(names))
+        if result is None:
+            return {
+                name: self._send(
+                    name, lambda client: request_one(client, name), [address]
+                )
+                for name in names
+            }
+        self._record_success(address)
+        return result
+
+    def _group_by_resolver(self, names: [str]) -> {(str, int): [str]}:
+        """
+        Acquires a resolver for every name, as single requests do,
+        so overloaded resolvers pass names on to the next resolver.
+        """
+        groups = {}
+        for name in names:
+            groups.setdefault(self.ring.acquire(name), []).append(name)
+        return groups
+
+    def _record_success(self, address: (str, int)) -> None:
+        with self.lock:
+            self.requests[address] += 1
+            self.failures[address] = 0
+        if self.ring.is_ejected(address):
+            self.ring.restore(address)
+            logger.log(f"Resolver {self._format_address(address)} "
+                       f"restored.")
+
+    def _record_failure(self, address: (str, int)) -> None:
+        with self.lock:
+            self.requests[address] += 1
+            self.failures[address] += 1
+            if self.failures[address] < ShardedResolverClient.MAX_FAILURES \
+                    or self.ring.is_ejected(address):
+                return
+            self.ejections += 1
+        self.ring.eject(address)
+        logger.log(f"Resolver {self._format_address(address)} ejected "
+                   f"after {ShardedResolverClient.MAX_FAILURES} failures.")
+
+    def _check_health(self, interval: float) -> None:
+        """
+        Probes every resolver, the probes count like other requests.
+        An empty batch is answered by the resolver itself,
+        so the probes don't cause requests to the name servers.
+        """
+        while not self.closed.wait(interval):
+            for address, client in self.clients.items():
+                try:
+                    client.query_batch([])
+                except TimeoutError:
+                    self._record_failure(address)
+                except OSError:  # closed
+                    return
+                else:
+                    self._record_success(address)
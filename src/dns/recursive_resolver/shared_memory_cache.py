@@ -0,0 +1,409 @@
+# std libraries
+import os
+import struct
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from hashlib import blake2b
+from multiprocessing import shared_memory
+from tempfile import gettempdir
+from threading import Lock
+from time import time
+from typing import Iterator
+# local libraries
+from dns.dns_message import DnsMessage
+from logger import logger
+from tracer import tracer
+
+try:
+    import fcntl
+except ImportError:  # not available on windows
+    fcntl = None
+
+
+class SharedMemoryCache:
+    """
+    A cache for DnsMessages in shared memory,
+    which can be used by multiple resolver processes at the same time.
+    Offers the same methods as the DnsMessageCache.
+    The memory contains a fixed size open addressing hash table,
+    every slot contains the record type and the requested name
+    as key, the absolute expiry time and the encoded response,
+    so the A and the NS response of a name are kept both.
+    A name can be stored in one of MAX_PROBES slots following its hash,
+    if all of them are used, the slot expiring first is replaced.
+    Readers don't lock, instead every slot has a sequence number,
+    which is odd while the slot is written (seqlock).
+    Writers lock the stripes of slots they may write
+    by a lock on a byte of a lock file per stripe,
+    so they are synchronized between processes,
+    and by a thread lock per stripe, so threads writing different
+    stripes don't wait for each other.
+    On systems without fcntl, writers are only synchronized
+    within the current process.
+    The cache is created by create() and other processes use attach().
+    """
+
+    MAGIC = b"DNSC"
+    TABLE_HEADER = struct.Struct("<4sII")  # magic, slot count, slot size
+    # sequence, state, name hash, expiry time, name length, value length
+    SLOT_HEADER = struct.Struct("<IB3xQdHH4x")
+    SEQUENCE = struct.Struct("<I")
+    EMPTY = 0
+    USED = 1
+    MAX_PROBES = 8
+    MAX_READ_RETRIES = 4
+    LOCK_STRIPES = 1024
+    DEFAULT_SLOT_COUNT = 65536
+    DEFAULT_SLOT_SIZE = 1024
+
+    @staticmethod
+    def _get_key(name: str, record_type: str) -> bytes:
+        return f"{record_type} {name}".encode()
+
+    @staticmethod
+    def _hash_name(name: bytes) -> int:
+        # hash() differs between processes, so a stable hash is used
+        return int.from_bytes(blake2b(name, digest_size=8).digest(), "little")
+
+    @staticmethod
+    def _get_lock_filename(name: str) -> str:
+        return os.path.join(gettempdir(), f"{name}.lock")
+
+    @classmethod
+    def create(cls,
+               name: str,
+               slot_count: int = DEFAULT_SLOT_COUNT,
+               slot_size: int = DEFAULT_SLOT_SIZE,
+               logger_key: object = None) -> 'SharedMemoryCache':
+        """
+        Creates the shared memory of the cache.
+        The creating process should call unlink() after all processes
+        stopped using the cache.
+        :param name: The name, used by other processes to attach.
+        :param slot_count: The max. count of cached names.
+        :param slot_size: The max. size of the name and encoded response
+        plus SLOT_HEADER.size.
+        """
+        memory = shared_memory.SharedMemory(
+            name=name, create=True,
+            size=cls.TABLE_HEADER.size + slot_count * slot_size
+        )
+        memory.buf[:memory.size] = bytes(memory.size)
+        cls.TABLE_HEADER.pack_into(
+            memory.buf, 0, cls.MAGIC, slot_count, slot_size
+        )
+        return cls(memory, logger_key)
+
+    @classmethod
+    def attach(cls,
+               name: str, logger_key: object = None) -> 'SharedMemoryCache':
+        """
+        Attaches to a cache created by another process.
+        """
+        return cls(shared_memory.SharedMemory(name=name), logger_key)
+
+    def __init__(self,
+                 memory: shared_memory.SharedMemory,
+                 logger_key: object = None):
+        magic, self.slot_count, self.slot_size = \
+            SharedMemoryCache.TABLE_HEADER.unpack_from(memory.buf, 0)
+        assert magic == SharedMemoryCache.MAGIC, \
+            "The shared memory doesn't contain a cache."
+        self.memory = memory
+        self.buf = memory.buf
+        self.logger_key = logger_key
+        self.clock = datetime.now  # the expiry times are wall clock times
+        self.lock_file = open(self._get_lock_filename(memory.name), "a+b") \
+            if fcntl is not None else None
+        self.stripe_locks = [
+            Lock() for _ in range(SharedMemoryCache.LOCK_STRIPES)
+        ]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.read_retries = 0
+
+    def add_dns_message(self,
+                        requested_name: str,
+                        dns_response: DnsMessage) -> None:
+        """
+        Adds a response by it's name, the expiry time is calculated
+        from the ttl of the response.
+        """
+        self.add_entry(
+            requested_name,
+            datetime.now() + timedelta(0, dns_response.get_ttl()),
+            dns_response
+        )
+
+    def add_entry(self,
+                  requested_name: str, expiry_timestamp: datetime,
+                  dns_response: DnsMessage) -> None:
+        """
+        Adds a response, which expires at the expiry timestamp.
+        Responses, which don't fit into a slot, won't be cached.
+        """
+        name = self._get_key(requested_name, dns_response.get_answer_type())
+        value = dns_response.build_message().encode()
+        if SharedMemoryCache.SLOT_HEADER.size + len(name) + len(value) \
+                > self.slot_size:
+            return
+        name_hash = self._hash_name(name)
+        with self._lock_slots(self._get_probe_slots(name_hash)):
+            slot = self._find_slot_for_writing(name, name_hash)
+            self._write_slot(
+                slot, name, name_hash, expiry_timestamp.timestamp(), value
+            )
+
+    def get_dns_message(self, req_name: str) -> DnsMessage or None:
+        """
+        Searches for a request in the cache by its name,
+        the A response is preferred over the NS response of the name.
+        :return: The cached response with the remaining ttl
+        or None if there is no match.
+        """
+        with tracer.span("cache.get_dns_message", req_name=req_name):
+            logger.log(f"Cache got request for {req_name}", self.logger_key)
+            for record_type in ("A", "NS"):
+                dns_msg = self._get_valid_message(req_name, record_type)
+                if dns_msg is not None:
+                    self.hits += 1
+                    return dns_msg
+            self.misses += 1
+            return None
+
+    def get_delegation(self, req_name: str) -> DnsMessage or None:
+        """
+        Searches for the NS response of the deepest cached zone,
+        which contains the name, or of the name itself,
+        see DnsMessageCache.get_delegation().
+        """
+        labels = req_name.split(".")
+        for start in range(len(labels)):
+            dns_msg = self._get_valid_message(
+                ".".join(labels[start:]), "NS"
+            )
+            if dns_msg is not None:
+                return dns_msg
+        return None
+
+    def get_encoded_response(self,
+                             req_name: str,
+                             msg_id: int or None) -> bytes or None:
+        """
+        Returns the encoded, not authoritative response with the remaining
+        ttl and the ID, see DnsMessageCache.get_encoded_response().
+        Since the slots contain the responses as received,
+        the response is decoded and encoded again.
+        """
+        dns_msg = self.get_dns_message(req_name)
+        if dns_msg is None:
+            return None
+        dns_msg.set_authoritative(False)
+        dns_msg.set_id(msg_id)
+        return dns_msg.build_message().encode()
+
+    def get_entries(self) -> [(str, datetime, DnsMessage)]:
+        """
+        Returns all entries, which aren't expired,
+        as tuples of the requested name, the expiry timestamp
+        and the response.
+        """
+        now = time()
+        entries = []
+        for slot in range(self.slot_count):
+            entry = self._read_slot(slot)
+            if entry is not None and entry[2] > now:
+                name, _, expiry_time, value = entry
+                entries.append((
+                    name.decode().split(" ", 1)[1],
+                    datetime.fromtimestamp(expiry_time),
+                    DnsMessage.new_dns_response(value.decode())
+                ))
+        return entries
+
+    def update_dns_messages(self) -> None:
+        """
+        Removes all expired messages.
+        """
+        now = time()
+        for slot in range(self.slot_count):
+            entry = self._read_slot(slot)
+            if entry is not None and entry[2] <= now:
+                with self._lock_slots([slot]):
+                    self._clear_slot_if_expired(slot, now)
+
+    def get_metrics(self) -> {str: int}:
+        """
+        Returns the hits, misses, evictions and read retries
+        of the current process.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "read_retries": self.read_retries
+        }
+
+    def close(self) -> None:
+        """
+        Detaches from the shared memory.
+        """
+        self.buf = None
+        self.memory.close()
+        if self.lock_file is not None:
+            self.lock_file.close()
+
+    def unlink(self) -> None:
+        """
+        Removes the shared memory, should be called by the creating process.
+        """
+        self.memory.unlink()
+        if fcntl is not None and os.path.exists(
+                self._get_lock_filename(self.memory.name)):
+            os.remove(self._get_lock_filename(self.memory.name))
+
+    def _get_valid_message(self,
+                           name: str, record_type: str) -> DnsMessage or None:
+        """
+        Returns the response of the type for the name with the remaining ttl,
+        if it is cached and not expired.
+        """
+        now = time()
+        key = self._get_key(name, record_type)
+        entry = self._read_entry(key, self._hash_name(key), now)
+        if entry is None:
+            return None
+        expiry_time, value = entry
+        dns_msg = DnsMessage.new_dns_response(value.decode())
+        dns_msg.set_updated_ttl(int(expiry_time - now))
+        return dns_msg
+
+    def _get_slot_offset(self, slot: int) -> int:
+        return SharedMemoryCache.TABLE_HEADER.size + slot * self.slot_size
+
+    def _get_probe_slots(self, name_hash: int) -> [int]:
+        return [(name_hash + probe) % self.slot_count
+                for probe in range(SharedMemoryCache.MAX_PROBES)]
+
+    def _read_entry(self,
+                    name: bytes, name_hash: int,
+                    now: float) -> (float, bytes) or None:
+        for slot in self._get_probe_slots(name_hash):
+            entry = self._read_slot(slot, name_hash)
+            if entry is not None and entry[0] == name and entry[2] > now:
+                return entry[2], entry[3]
+        return None
+
+    def _read_slot(self,
+                   slot: int,
+                   name_hash: int or None = None
+                   ) -> (bytes, int, float, bytes) or None:
+        """
+        Reads the slot without locking,
+        retrying while it is written by another process.
+        :param name_hash: If set, slots with other hashes are skipped
+        without reading the name and value.
+        :return: The name, name hash, expiry time and value
+        or None if the slot is empty.
+        """
+        offset = self._get_slot_offset(slot)
+        for _ in range(SharedMemoryCache.MAX_READ_RETRIES):
+            sequence, state, slot_hash, expiry_time, name_len, value_len = \
+                SharedMemoryCache.SLOT_HEADER.unpack_from(self.buf, offset)
+            if sequence % 2 == 0:
+                if state != SharedMemoryCache.USED \
+                        or name_hash is not None and slot_hash != name_hash:
+                    entry = None
+                else:
+                    data_start = offset + SharedMemoryCache.SLOT_HEADER.size
+                    data_end = data_start + name_len + value_len
+                    data = bytes(self.buf[data_start:data_end])
+                    entry = (data[:name_len], slot_hash, expiry_time,
+                             data[name_len:])
+                if SharedMemoryCache.SEQUENCE.unpack_from(
+                        self.buf, offset)[0] == sequence:
+                    return entry
+            self.read_retries += 1
+        return None  # the slot is busy, treat it as a miss
+
+    def _find_slot_for_writing(self, name: bytes, name_hash: int) -> int:
+        """
+        Returns the slot already containing the name, an empty or expired
+        slot or the slot expiring first.
+        Must be called while holding the lock of the stripe.
+        """
+        now = time()
+        replaced_slot = None
+        replaced_expiry_time = None
+        for slot in self._get_probe_slots(name_hash):
+            entry = self._read_slot(slot)
+            if entry is None or entry[2] <= now \
+                    or entry[0] == name and entry[1] == name_hash:
+                return slot
+            if replaced_slot is None or entry[2] < replaced_expiry_time:
+                replaced_slot, replaced_expiry_time = slot, entry[2]
+        self.evictions += 1
+        return replaced_slot
+
+    def _write_slot(self,
+                    slot: int, name: bytes, name_hash: int,
+                    expiry_time: float, value: bytes) -> None:
+        offset = self._get_slot_offset(slot)
+        sequence = SharedMemoryCache.SEQUENCE.unpack_from(self.buf, offset)[0]
+        SharedMemoryCache.SEQUENCE.pack_into(
+            self.buf, offset, (sequence + 1) % 2 ** 32
+        )  # odd: readers retry
+        data_offset = offset + SharedMemoryCache.SLOT_HEADER.size
+        self.buf[data_offset:data_offset + len(name) + len(value)] = \
+            name + value
+        SharedMemoryCache.SLOT_HEADER.pack_into(
+            self.buf, offset, (sequence + 2) % 2 ** 32,
+            SharedMemoryCache.USED, name_hash, expiry_time,
+            len(name), len(value)
+        )
+
+    def _clear_slot_if_expired(self, slot: int, now: float) -> None:
+        offset = self._get_slot_offset(slot)
+        sequence, state, _, expiry_time, _, _ = \
+            SharedMemoryCache.SLOT_HEADER.unpack_from(self.buf, offset)
+        if state == SharedMemoryCache.USED and expiry_time <= now:
+            SharedMemoryCache.SEQUENCE.pack_into(
+                self.buf, offset, (sequence + 1) % 2 ** 32
+            )
+            SharedMemoryCache.SLOT_HEADER.pack_into(
+                self.buf, offset, (sequence + 2) % 2 ** 32,
+                SharedMemoryCache.EMPTY, 0, 0.0, 0, 0
+            )
+
+    @contextmanager
+    def _lock_slots(self, slots: [int]) -> Iterator[None]:
+        """
+        Locks the stripes of the slots for other processes,
+        by locking one byte of the lock file per stripe,
+        as well as for the other threads of the current process,
+        by the thread lock of every stripe.
+        Every MAX_PROBES following slots share a stripe,
+        the stripes are locked in ascending order to prevent deadlocks.
+        """
+        stripes = sorted({
+            slot // SharedMemoryCache.MAX_PROBES
+            % SharedMemoryCache.LOCK_STRIPES
+            for slot in slots
+        })
+        for stripe in stripes:
+            self.stripe_locks[stripe].acquire()
+        try:
+            if self.lock_file is None:
+                yield
+                return
+            for stripe in stripes:
+                fcntl.lockf(self.lock_file, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                for stripe in reversed(stripes):
+                    fcntl.lockf(self.lock_file, fcntl.LOCK_UN, 1, stripe)
+        finally:
+            for stripe in reversed(stripes):
+                self.stripe_locks[stripe].release()
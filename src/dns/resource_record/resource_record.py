@@ -88,6 +88,15 @@ class ResourceRecord:
     def get_type(self) -> str:
         return self.rr_type
 
+    def to_list(self) -> [str]:
+        """
+        Returns the name, ttl, class, type and value of the record,
+        which can be loaded again by load_data_from_list().
+        """
+        return [
+            self.name, str(self.ttl), self.rr_class, self.rr_type, self.value
+        ]
+
     def _update_data_from_csv(self, values: [str]) -> None:
         ttl = self._get_first_numeric(values)
         if ttl is not None:
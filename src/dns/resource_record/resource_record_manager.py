@@ -39,6 +39,45 @@ class ResourceRecordManager:
         for resource_record in resource_records:
             self.resource_records[resource_record.get_name()] = resource_record
 
+    def get_updated(self,
+                    added: [ResourceRecord],
+                    removed: [str]) -> 'ResourceRecordManager':
+        """
+        Returns a new manager with the changed records,
+        this manager isn't changed, so it can still be read
+        by other threads while the new one is created.
+        :param added: The added records, replacing the ones with their name.
+        :param removed: The names of the removed records.
+        """
+        updated = ResourceRecordManager([])
+        updated.resource_records = dict(self.resource_records)
+        for name in removed:
+            updated.resource_records.pop(name, None)
+        for resource_record in added:
+            updated.resource_records[resource_record.get_name()] = \
+                resource_record
+        return updated
+
+    def get_changes(self,
+                    other: 'ResourceRecordManager'
+                    ) -> ([ResourceRecord], [str]):
+        """
+        Returns the records, which are added or changed in the other manager,
+        and the names of the records, which are removed in it.
+        """
+        added = [
+            resource_record
+            for name, resource_record in other.resource_records.items()
+            if name not in self.resource_records
+            or self.resource_records[name].to_list()
+            != resource_record.to_list()
+        ]
+        removed = [
+            name for name in self.resource_records
+            if name not in other.resource_records
+        ]
+        return added, removed
+
     def get_matched_record(self,
                            request: DnsMessage or str
                            ) -> ResourceRecord or None:
@@ -57,6 +96,24 @@ class ResourceRecordManager:
                 closest_match_value = self.resource_records[key]
         return closest_match_value
 
+    def get_deepest_record(self,
+                           request: DnsMessage or str
+                           ) -> ResourceRecord or None:
+        """
+        Returns the record for the requested name or,
+        if there is none, for its closest parent name.
+        Unlike get_matched_record(), the names are compared by labels
+        and only one lookup per label is needed,
+        so the count of records doesn't slow down the lookup.
+        If no match is found, None is returned.
+        """
+        labels = self._get_requested_name(request).split(".")
+        for first_label in range(len(labels)):
+            record = self.resource_records.get(".".join(labels[first_label:]))
+            if record is not None:
+                return record
+        return None
+
     def log_entries(self, logger_key: object = None) -> None:
         for record in self.resource_records.values():
             logger.log(" ".join([
@@ -0,0 +1,18 @@
+class FileReply:
+    """
+    A reply, consisting of an already encoded header
+    followed by the content of a file.
+    Can be returned by the process_request function of a RequestServer
+    instead of a string, so the file content is sent by socket.sendfile()
+    without copying it into memory.
+    """
+
+    def __init__(self, header: bytes, filename: str, send_content: bool = True):
+        """
+        :param header: The encoded header, sent before the file content.
+        :param filename: The name of the file, containing the content.
+        :param send_content: False, if only the header should be sent.
+        """
+        self.header = header
+        self.filename = filename
+        self.send_content = send_content
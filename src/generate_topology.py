@@ -0,0 +1,45 @@
+# Generates a synthetic DNS hierarchy as zone files and a config, e.g.:
+# python generate_topology.py --depth 2 --fan-out 100 --records 100
+
+# std libraries
+import sys
+from argparse import ArgumentParser, Namespace
+# local libraries
+from topology.topology_generator import TopologyGenerator
+
+
+def started_as_main() -> bool:
+    return __name__ == "__main__"
+
+
+def parse_arguments(argv: [str]) -> Namespace:
+    parser = ArgumentParser(
+        description="Generates zone files and a config "
+                    "for a synthetic DNS hierarchy."
+    )
+    parser.add_argument("-d", "--depth", type=int, default=2,
+                        help="Count of zone levels below the root.")
+    parser.add_argument("-f", "--fan-out", type=int, default=10,
+                        help="Count of child zones per zone.")
+    parser.add_argument("-r", "--records", type=int, default=100,
+                        help="Count of A records per leaf zone.")
+    parser.add_argument("--ttl", type=int,
+                        default=TopologyGenerator.DEFAULT_TTL)
+    parser.add_argument("-o", "--output-dir", default="../log/topology",
+                        help="Directory for the zone files and the config.")
+    return parser.parse_args(argv)
+
+
+def main(argv: [str]) -> None:
+    arguments = parse_arguments(argv)
+    generator = TopologyGenerator(
+        arguments.depth, arguments.fan_out, arguments.records, arguments.ttl
+    )
+    print(f"Generating {generator.get_zone_count()} zones "
+          f"with {generator.get_record_count()} records.")
+    config_file = generator.generate(arguments.output_dir)
+    print(f"Config written to {config_file}.")
+
+
+if started_as_main():
+    main(sys.argv[1:])
@@ -0,0 +1,58 @@
+class HeavyHitterSketch:
+    """
+    Finds the most frequent items of a stream with bounded memory,
+    using the Misra-Gries algorithm.
+    At most capacity items are counted, if a new item doesn't fit,
+    all counters are decreased and the ones reaching 0 are removed.
+    Every item occurring more than count / (capacity + 1) times
+    is guaranteed to be kept, the counts are lower bounds.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        # the counters are stored increased by the offset,
+        # so decreasing all counters only increases the offset
+        self.counters: {str: int} = {}
+        self.items_by_counter: {int: {str}} = {}
+        self.offset = 0
+        self.count = 0
+
+    def add(self, item: str) -> None:
+        self.count += 1
+        counter = self.counters.get(item)
+        if counter is not None:
+            self._set_counter(item, counter + 1)
+        elif len(self.counters) < self.capacity:
+            self._set_counter(item, self.offset + 1)
+        else:
+            self._decrease_all()
+
+    def get_top(self, top_n: int) -> [(str, int)]:
+        """
+        Returns the top_n most frequent items with their estimated counts,
+        starting with the most frequent one.
+        """
+        return sorted(
+            ((item, counter - self.offset)
+             for item, counter in self.counters.items()),
+            key=lambda item: item[1], reverse=True
+        )[:top_n]
+
+    def _set_counter(self, item: str, counter: int) -> None:
+        old_counter = self.counters.get(item)
+        if old_counter is not None:
+            self.items_by_counter[old_counter].discard(item)
+            if not self.items_by_counter[old_counter]:
+                del self.items_by_counter[old_counter]
+        self.counters[item] = counter
+        self.items_by_counter.setdefault(counter, set()).add(item)
+
+    def _decrease_all(self) -> None:
+        """
+        Decreases all counters by increasing the offset
+        and removes the items, whose counter reached 0,
+        so only the removed items are touched.
+        """
+        self.offset += 1
+        for item in self.items_by_counter.pop(self.offset, ()):
+            del self.counters[item]
@@ -0,0 +1,175 @@
+# std libraries
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+from urllib.parse import urlsplit
+# third party libraries
+import requests
+from requests.adapters import HTTPAdapter
+# local libraries
+from transport.transport_http_adapter import TransportHttpAdapter
+
+
+class HttpConnectionPool:
+    """
+    Fetches HTTP resources over pooled keep-alive connections.
+    Uses a shared requests.Session, which keeps a pool of connections
+    for each origin (scheme, host and port).
+    At most pool_size requests per origin are sent at the same time,
+    further requests wait for a free connection.
+    Pools of origins, which weren't used for max_idle_time seconds
+    and have no requests in progress, will be closed.
+    The metrics of the pools can be accessed by calling get_metrics().
+    If a transport is set, the connections use its sockets,
+    e.g. to reach the HTTP servers of a MemoryTransport.
+    """
+
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_MAX_IDLE_TIME = 30  # seconds
+    DEFAULT_CONNECT_TIMEOUT = 1  # seconds
+    DEFAULT_READ_TIMEOUT = 5  # seconds
+    MAX_ORIGINS = 100
+
+    @staticmethod
+    def _get_origin(url: str) -> (str, str, int):
+        split_url = urlsplit(url)
+        default_port = 443 if split_url.scheme == "https" else 80
+        return (split_url.scheme, split_url.hostname,
+                split_url.port or default_port)
+
+    def __init__(self,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 max_idle_time: float = DEFAULT_MAX_IDLE_TIME,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 transport: object or None = None):
+        """
+        :param pool_size: The max. count of connections per origin.
+        :param max_idle_time: The seconds after which the connections
+        of an unused origin will be closed.
+        :param connect_timeout: The seconds to wait for a new connection.
+        :param read_timeout: The seconds to wait for the response.
+        :param transport: Creates the sockets of the connections,
+        by default kernel sockets.
+        """
+        self.pool_size = pool_size
+        self.max_idle_time = max_idle_time
+        self.timeout = (connect_timeout, read_timeout)
+        adapter_arguments = {
+            "pool_connections": HttpConnectionPool.MAX_ORIGINS,
+            "pool_maxsize": pool_size, "pool_block": True
+        }
+        self.adapter = HTTPAdapter(**adapter_arguments) if transport is None \
+            else TransportHttpAdapter(transport, **adapter_arguments)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.origin_slots: {(str, str, int): BoundedSemaphore} = {}
+        self.last_used: {(str, str, int): float} = {}
+        # requests in progress or waiting for a slot per origin
+        self.in_flight: {(str, str, int): int} = {}
+        self.lock = Lock()
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.evicted_requests = 0
+        self.evicted_connections = 0
+
+    def get(self, url: str) -> requests.Response:
+        """
+        Sends a GET request over a pooled connection.
+        Blocks until a connection for the origin is free.
+        """
+        origin = self._get_origin(url)
+        self.evict_idle_origins()
+        slots = self._get_origin_slots(origin)
+        try:
+            self._acquire_slot(slots)
+            try:
+                return self.session.get(url, timeout=self.timeout)
+            finally:
+                slots.release()
+        finally:
+            with self.lock:
+                self.in_flight[origin] -= 1
+                if origin in self.origin_slots:  # not evicted meanwhile
+                    self.last_used[origin] = monotonic()
+
+    def evict_idle_origins(self) -> None:
+        """
+        Closes the connections of all origins,
+        which weren't used for max_idle_time seconds
+        and have no requests in progress.
+        """
+        now = monotonic()
+        with self.lock:
+            idle_origins = [
+                origin for origin, last_used in self.last_used.items()
+                if now - last_used > self.max_idle_time
+                and not self.in_flight.get(origin)
+            ]
+            for origin in idle_origins:
+                self.last_used.pop(origin, None)
+                self.origin_slots.pop(origin, None)
+                self.in_flight.pop(origin, None)
+                self._close_origin_pools(origin)
+
+    def get_metrics(self) -> {str: int or float}:
+        """
+        Returns the count of requests and new connections,
+        the count of requests, which reused a pooled connection (hits),
+        as well as the count of and seconds spent waiting for a connection.
+        """
+        with self.lock:
+            pool_container = self.adapter.poolmanager.pools
+            pools = [pool_container.get(pool_key)
+                     for pool_key in pool_container.keys()]
+            pools = [pool for pool in pools if pool is not None]
+            pool_requests = self.evicted_requests \
+                + sum(pool.num_requests for pool in pools)
+            connections = self.evicted_connections \
+                + sum(pool.num_connections for pool in pools)
+            return {
+                "requests": self.requests,
+                "connections": connections,
+                "pool_hits": max(pool_requests - connections, 0),
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+                "origins": len(self.origin_slots)
+            }
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _get_origin_slots(self,
+                          origin: (str, str, int)) -> BoundedSemaphore:
+        with self.lock:
+            self.requests += 1
+            self.last_used[origin] = monotonic()
+            self.in_flight[origin] = self.in_flight.get(origin, 0) + 1
+            if origin not in self.origin_slots:
+                self.origin_slots[origin] = BoundedSemaphore(self.pool_size)
+            return self.origin_slots[origin]
+
+    def _acquire_slot(self, slots: BoundedSemaphore) -> None:
+        if slots.acquire(blocking=False):
+            return
+        wait_start = monotonic()
+        slots.acquire()
+        with self.lock:
+            self.waits += 1
+            self.wait_time += monotonic() - wait_start
+
+    def _close_origin_pools(self, origin: (str, str, int)) -> None:
+        """
+        Removes the pools of the origin from the pool manager,
+        which will close their connections.
+        Must be called while holding the lock.
+        """
+        pools = self.adapter.poolmanager.pools
+        for pool_key in list(pools.keys()):
+            if (pool_key.key_scheme, pool_key.key_host, pool_key.key_port) \
+                    == origin:
+                pool = pools.pop(pool_key)
+                self.evicted_requests += pool.num_requests
+                self.evicted_connections += pool.num_connections
+                pool.close()
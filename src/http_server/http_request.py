@@ -0,0 +1,46 @@
+# std libraries
+from urllib.parse import unquote
+
+
+class HttpRequest:
+    """
+    A parsed HTTP request, containing the request line, headers and body.
+    The header names are stored in lower case,
+    so they can be accessed case insensitive using get_header().
+    """
+
+    LINE_SEPARATOR = "\r\n"
+    HEADER_END = "\r\n\r\n"
+
+    @classmethod
+    def from_str(cls, request: str) -> 'HttpRequest':
+        """
+        Parses the request line and headers of a HTTP request.
+        Missing parts of the request line are set to empty strings.
+        """
+        head, _, body = request.partition(HttpRequest.HEADER_END)
+        lines = head.split(HttpRequest.LINE_SEPARATOR)
+        method, target, version = (lines[0].split(" ") + ["", ""])[:3]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return cls(method, target, version, headers, body)
+
+    def __init__(self,
+                 method: str, target: str, version: str,
+                 headers: {str: str}, body: str = ""):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    def get_header(self, name: str, default: str or None = None) -> str:
+        return self.headers.get(name.lower(), default)
+
+    def get_path(self) -> str:
+        """
+        Returns the decoded path of the target, without the query.
+        """
+        return unquote(self.target.split("?", 1)[0])
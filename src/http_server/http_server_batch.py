@@ -8,9 +8,17 @@ class HttpServerBatch:
     witch can be used to create, run and stop multiple HTTP servers.
     """
 
-    def __init__(self, ip_msg_map: {str: str}, port: int = 80):
+    def __init__(self,
+                 ip_msg_map: {str: str}, port: int = 80,
+                 production_mode: bool = False,
+                 static_dir: str or None = None,
+                 transport: object or None = None):
         self.http_servers = [
-            SimpleHttpServer(msg, ip_address, port)
+            SimpleHttpServer(
+                msg, ip_address, port,
+                production_mode=production_mode, static_dir=static_dir,
+                transport=transport
+            )
             for ip_address, msg in ip_msg_map.items()
         ]
 
@@ -1,4 +1,9 @@
+# std libraries
+import os
+from mimetypes import guess_type
 # local libraries
+from file_reply import FileReply
+from http_server.http_request import HttpRequest
 from logger import logger
 from request_server import RequestServer
 
@@ -7,25 +12,143 @@ class SimpleHttpServer:
     """
     A simplified HTTP server, which takes all incoming request
     and will return the request as well as a constant req_domain.
-    The HTTP response header is constant.
+    The HTTP response header is constant, except of the content length.
+    Connections are kept alive between requests.
+    In production mode the request line and headers are parsed
+    and the constant msg is returned without the request,
+    so the response can be encoded once when the server is created.
+    If a static directory is set, its files are served using sendfile.
     """
 
-    DEFAULT_MSG_PATTERN = "HTTP/1.1 200 OK\r\n\r\nRequest\n{}\n\nMsg:\n{}"
+    DEFAULT_HEADER_PATTERN = "HTTP/1.1 200 OK\r\n" \
+                             "Content-Length: {}\r\n" \
+                             "Connection: keep-alive\r\n\r\n"
+    DEFAULT_MSG_PATTERN = "Request\n{}\n\nMsg:\n{}"
+    HEADER_PATTERN = "HTTP/1.1 {}\r\n" \
+                     "Content-Type: {}\r\n" \
+                     "Content-Length: {}\r\n" \
+                     "Connection: keep-alive\r\n\r\n"
+    TEXT_CONTENT_TYPE = "text/plain; charset=utf-8"
+    DEFAULT_CONTENT_TYPE = "application/octet-stream"
+    INDEX_FILE = "index.html"
+    HEADER_ONLY_METHODS = ("HEAD",)
+    ALLOWED_METHODS = ("GET", "HEAD")
 
-    def __init__(self, msg: str, ip_address: str, port: int = 80):
+    @classmethod
+    def _encode_response(cls,
+                         status: str, body: str,
+                         content_type: str = TEXT_CONTENT_TYPE
+                         ) -> (bytes, bytes):
+        """
+        Encodes a response once, so it can be sent for multiple requests.
+        :return: A tuple of the encoded header and the encoded response.
+        """
+        encoded_body = body.encode()
+        header = cls.HEADER_PATTERN.format(
+            status, content_type, len(encoded_body)
+        ).encode()
+        return header, header + encoded_body
+
+    def __init__(self,
+                 msg: str, ip_address: str, port: int = 80,
+                 production_mode: bool = False,
+                 static_dir: str or None = None,
+                 transport: object or None = None):
+        """
+        :param production_mode: True, if the request should be parsed
+        and only the msg should be returned.
+        :param static_dir: The directory containing files to serve,
+        implies production_mode.
+        :param transport: Creates the socket, by default a kernel socket.
+        """
         self.msg = msg
+        self.production_mode = production_mode or static_dir is not None
+        self.static_dir = os.path.realpath(static_dir) \
+            if static_dir is not None else None
+        self.page_response = self._encode_response("200 OK", msg)
+        self.not_found_response = self._encode_response(
+            "404 Not Found", "Not found"
+        )
+        self.not_allowed_response = self._encode_response(
+            "405 Method Not Allowed", "Method not allowed"
+        )
+        self.file_headers: {str: (float, int, bytes)} = {}
         self.server = RequestServer(
-            ip_address, port, self.handle_request, use_udp=False
+            ip_address, port, self.handle_request,
+            use_udp=False, keep_alive=True, transport=transport
         )
 
-    def handle_request(self, request: str) -> str:
+    def handle_request(self, request: str) -> str or bytes or FileReply:
         """
         Used to handle an incoming HTTP request.
         """
+        if self.production_mode:
+            return self._create_production_answer(
+                HttpRequest.from_str(request)
+            )
         return self._create_answer(request)
 
     def _create_answer(self, request: str) -> str:
-        return SimpleHttpServer.DEFAULT_MSG_PATTERN.format(request, self.msg)
+        body = SimpleHttpServer.DEFAULT_MSG_PATTERN.format(request, self.msg)
+        header = SimpleHttpServer.DEFAULT_HEADER_PATTERN.format(
+            len(body.encode())
+        )
+        return header + body
+
+    def _create_production_answer(self,
+                                  request: HttpRequest) -> bytes or FileReply:
+        header_only = request.method in SimpleHttpServer.HEADER_ONLY_METHODS
+        if request.method not in SimpleHttpServer.ALLOWED_METHODS:
+            response = self.not_allowed_response
+        elif self.static_dir is None or request.get_path() == "/" \
+                and self._get_static_file("/") is None:
+            response = self.page_response
+        else:
+            filename = self._get_static_file(request.get_path())
+            if filename is not None:
+                return FileReply(
+                    self._get_file_header(filename), filename,
+                    send_content=not header_only
+                )
+            response = self.not_found_response
+        return response[0] if header_only else response[1]
+
+    def _get_static_file(self, path: str) -> str or None:
+        """
+        Returns the filename of the file in the static directory,
+        the path refers to or None if there is no such file.
+        Paths outside the static directory are ignored.
+        """
+        if path.endswith("/"):
+            path += SimpleHttpServer.INDEX_FILE
+        filename = os.path.realpath(
+            os.path.join(self.static_dir, path.lstrip("/"))
+        )
+        if os.path.commonpath((self.static_dir, filename)) \
+                != self.static_dir or not os.path.isfile(filename):
+            return None
+        return filename
+
+    def _get_file_header(self, filename: str) -> bytes:
+        """
+        Returns the encoded header for the file,
+        which is only encoded again if the file changed.
+        """
+        file_stat = os.stat(filename)
+        cached_header = self.file_headers.get(filename)
+        if cached_header is not None \
+                and cached_header[:2] == (file_stat.st_mtime,
+                                          file_stat.st_size):
+            return cached_header[2]
+        content_type = guess_type(filename)[0] \
+            or SimpleHttpServer.DEFAULT_CONTENT_TYPE
+        header = SimpleHttpServer.HEADER_PATTERN.format(
+            "200 OK", content_type, file_stat.st_size
+        ).encode()
+        self.file_headers[filename] = (
+            file_stat.st_mtime, file_stat.st_size, header
+        )
+        return header
 
     def run(self, logger_key: object = None) -> None:
         """
@@ -38,7 +161,7 @@ class SimpleHttpServer:
 
     def stop_listening(self) -> None:
         """
-        Stops listening for requests.
-        The socket won't be removed.
+        Stops listening for requests,
+        the requests in progress are still answered.
         """
         self.server.stop_listening()
@@ -0,0 +1,74 @@
+# std libraries
+from math import ceil, log
+from threading import Lock
+
+
+class LatencyHistogram:
+    """
+    A histogram of latencies in seconds with logarithmic buckets,
+    so the memory usage doesn't depend on the count of added latencies.
+    Percentiles are approximated by the upper bound of their bucket,
+    which is at most BUCKET_GROWTH times the real value.
+    Latencies can be added from multiple threads.
+    """
+
+    MIN_LATENCY = 1e-6  # seconds
+    BUCKET_GROWTH = 1.05
+    BUCKET_COUNT = 500  # up to ~11 hours
+
+    @classmethod
+    def _get_bucket(cls, latency: float) -> int:
+        if latency <= cls.MIN_LATENCY:
+            return 0
+        bucket = ceil(log(latency / cls.MIN_LATENCY, cls.BUCKET_GROWTH))
+        return min(bucket, cls.BUCKET_COUNT - 1)
+
+    @classmethod
+    def _get_bucket_limit(cls, bucket: int) -> float:
+        return cls.MIN_LATENCY * cls.BUCKET_GROWTH ** bucket
+
+    def __init__(self):
+        self.buckets = [0] * LatencyHistogram.BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = Lock()
+
+    def add(self, latency: float) -> None:
+        bucket = self._get_bucket(latency)
+        with self.lock:
+            self.buckets[bucket] += 1
+            self.count += 1
+            self.total += latency
+            self.max = max(self.max, latency)
+
+    def get_percentile(self, percentile: float) -> float:
+        """
+        Returns the approximated latency,
+        which is greater than percentile percent of all latencies.
+        :param percentile: The percentile between 0 and 100.
+        """
+        with self.lock:
+            if self.count == 0:
+                return 0.0
+            rank = max(ceil(self.count * percentile / 100), 1)
+            seen = 0
+            for bucket, bucket_count in enumerate(self.buckets):
+                seen += bucket_count
+                if seen >= rank:
+                    return min(self._get_bucket_limit(bucket), self.max)
+            return self.max
+
+    def get_summary(self) -> {str: int or float}:
+        """
+        Returns the count, mean, max and the 50th, 90th and 99th percentile
+        of the latencies in seconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.get_percentile(50),
+            "p90": self.get_percentile(90),
+            "p99": self.get_percentile(99),
+            "max": self.max
+        }
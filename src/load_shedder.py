@@ -0,0 +1,131 @@
+# std libraries
+from threading import Lock
+from time import monotonic
+from typing import Callable
+# local libraries
+from dns.dns_message import DnsMessage
+
+
+class LoadShedder:
+    """
+    An admission controller for a RequestServer,
+    which rejects requests as soon as the server is saturated,
+    so most clients are answered quickly instead of all clients slowly.
+    The server is saturated, if max_in_flight requests are in progress
+    or the queue delay (the time between receiving a request
+    and starting to handle it) stayed above target_delay
+    for a whole interval.
+    Rejected requests are answered by an empty response
+    with the set response code, only their id is read.
+    Requests, for which is_preferred returns True (e.g. cache hits),
+    are still admitted up to PREFERRED_HEADROOM times max_in_flight,
+    since they are cheap to answer.
+    """
+
+    DEFAULT_MAX_IN_FLIGHT = 64
+    DEFAULT_TARGET_DELAY = 0.05  # seconds
+    DEFAULT_INTERVAL = 0.1  # seconds
+    PREFERRED_HEADROOM = 2
+
+    def __init__(self,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 target_delay: float = DEFAULT_TARGET_DELAY,
+                 interval: float = DEFAULT_INTERVAL,
+                 rcode: str = "SERVFAIL",
+                 is_preferred: Callable[[str], bool] or None = None):
+        """
+        :param max_in_flight: The max. count of requests in progress.
+        :param target_delay: The max. seconds, a request should wait
+        before it is handled.
+        :param interval: The seconds, the queue delay must stay above
+        the target delay, before requests are rejected.
+        :param rcode: The response code of rejected requests,
+        SERVFAIL or REFUSED.
+        :param is_preferred: Returns for an encoded request,
+        if it should be preferred, can be set later.
+        """
+        self.max_in_flight = max_in_flight
+        self.target_delay = target_delay
+        self.interval = interval
+        self.rcode = rcode
+        self.is_preferred = is_preferred
+        self.lock = Lock()
+        self.interval_end = monotonic() + interval
+        self.min_delay = None  # of the current interval
+        self.is_delayed = False
+        self.admitted = 0
+        self.preferred = 0
+        self.shed = 0
+
+    def should_shed(self,
+                    request: str, in_flight: int, queue_delay: float) -> bool:
+        """
+        Decides, if the request should be rejected.
+        :param in_flight: The count of requests in progress.
+        :param queue_delay: The seconds the request waited.
+        :return: True, if the request should be rejected.
+        """
+        is_saturated = self._update_delay(queue_delay) \
+            or in_flight >= self.max_in_flight
+        is_preferred = is_saturated and self.is_preferred is not None \
+            and in_flight < self.max_in_flight \
+            * LoadShedder.PREFERRED_HEADROOM \
+            and self.is_preferred(request)
+        with self.lock:
+            if not is_saturated:
+                self.admitted += 1
+            elif is_preferred:
+                self.preferred += 1
+            else:
+                self.shed += 1
+        return is_saturated and not is_preferred
+
+    def get_shed_reply(self, request: str) -> str or None:
+        """
+        Returns the reply for a rejected request,
+        or None if the request isn't a DNS message.
+        The ID is peeked, only if the request doesn't contain it,
+        the request is decoded to check if it is a DNS message at all,
+        so every DNS request gets a reply.
+        """
+        msg_id = DnsMessage.peek_value(request, "dns.id")
+        if msg_id is None:
+            try:
+                msg_id = DnsMessage.from_str(request).get_id()
+            except (ValueError, AttributeError):  # e.g. an HTTP request
+                return None
+        dns_resp = DnsMessage.new_dns_response()
+        dns_resp.set_empty_resp(authoritative=False, rcode=self.rcode)
+        dns_resp.set_id(msg_id)
+        return dns_resp.build_message()
+
+    def get_metrics(self) -> {str: int or float}:
+        """
+        Returns the count of admitted, preferred and rejected requests
+        and the share of rejected requests.
+        """
+        with self.lock:
+            total = self.admitted + self.preferred + self.shed
+            return {
+                "admitted": self.admitted,
+                "preferred": self.preferred,
+                "shed": self.shed,
+                "shed_rate": self.shed / total if total else 0.0
+            }
+
+    def _update_delay(self, queue_delay: float) -> bool:
+        """
+        Tracks the minimal queue delay of the current interval,
+        at the end of each interval the server is marked as delayed,
+        if even the minimal delay exceeded the target delay.
+        :return: True, if the server is delayed.
+        """
+        with self.lock:
+            if self.min_delay is None or queue_delay < self.min_delay:
+                self.min_delay = queue_delay
+            now = monotonic()
+            if now >= self.interval_end:
+                self.is_delayed = self.min_delay > self.target_delay
+                self.min_delay = None
+                self.interval_end = now + self.interval
+            return self.is_delayed
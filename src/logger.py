@@ -1,3 +1,7 @@
+# std libraries
+from threading import RLock
+
+
 class Logger:
     """
     A logger, used to log text to stdout or a file.
@@ -9,12 +13,17 @@ class Logger:
     with the object and the filename of the log file as arguments.
     Using None as object or setting the filename to an empty string
     will result in using stdout as file.
+    The methods can be called from multiple threads.
+    Logging can be disabled by set_enabled(), e.g. for simulations
+    with millions of requests.
     """
 
     def __init__(self):
         # None uses print()
         self.log_files: {object: str} = {None: ""}
         self.log_buffer: {object: str} = {None: ""}
+        self.lock = RLock()
+        self.is_enabled = True
 
     def register_logger(self,
                         key_obj: object = None,
@@ -28,8 +37,15 @@ class Logger:
         to identify the corresponding logfile.
         :param log_file_name: The filename of the logfile.
         """
-        self.log_files[key_obj] = log_file_name
-        self.log_buffer[key_obj] = ""
+        with self.lock:
+            self.log_files[key_obj] = log_file_name
+            self.log_buffer[key_obj] = ""
+
+    def set_enabled(self, enabled: bool) -> None:
+        """
+        Enables or disables logging, while disabled log() is ignored.
+        """
+        self.is_enabled = enabled
 
     def log(self, text: str, key_obj: object = None, flush=False) -> None:
         """
@@ -39,22 +55,28 @@ class Logger:
         :param flush: True, if the current buffer should be flushed,
         after adding the text.
         """
-        self.log_buffer[key_obj] += f"\n{text}"
-        if flush:
-            self.flush(key_obj)
+        if not self.is_enabled:
+            return
+        with self.lock:
+            self.log_buffer[key_obj] += f"\n{text}"
+            if flush:
+                self.flush(key_obj)
 
     def flush(self, key_obj: object = None):
         """
         Flushed the buffered text for the key object.
         """
-        log_filename = self.log_files[key_obj]
-        log_text = self.log_buffer[key_obj]
-        self.log_buffer[key_obj] = ""
-        if log_filename == "":
-            print(log_text)
-        else:
-            with open(log_filename, "a") as log_file:
-                log_file.write(log_text)
+        with self.lock:
+            log_filename = self.log_files[key_obj]
+            log_text = self.log_buffer[key_obj]
+            self.log_buffer[key_obj] = ""
+            if not log_text and not self.is_enabled:
+                return
+            if log_filename == "":
+                print(log_text)
+            else:
+                with open(log_filename, "a") as log_file:
+                    log_file.write(log_text)
 
     def flush_all(self):
         """
@@ -62,8 +84,9 @@ class Logger:
         Should be called before stopping the program,
         to ensure every log is logged.
         """
-        for key_name in self.log_files:
-            self.flush(key_name)
+        with self.lock:
+            for key_name in list(self.log_files):
+                self.flush(key_name)
 
 
 logger = Logger()
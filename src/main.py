@@ -1,29 +1,103 @@
 # Should be run, to start all DNS server etc.
 
 # std libraries
-from time import sleep
-from json import loads as load_json
+import atexit
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from time import monotonic, sleep
+from json import dumps as dump_json, loads as load_json
+from random import Random
 from typing import Callable
 # local libraries
 from dns.dns_server.dns_server_batch import DnsServerBatch
 from dns.recursive_resolver.recursive_resolver import RecursiveResolver
+from dns.recursive_resolver.shared_memory_cache import SharedMemoryCache
 from http_server.http_server_batch import HttpServerBatch
+from load_shedder import LoadShedder
 from logger import logger
 from proxy import Proxy
+from query_capture import QueryCapture
+from rate_limiter import RateLimiter
+from request_server import RequestServer
+from simulation.latency_model import LatencyModel
+from stack_sampler import StackSampler
+from tracer import tracer
+
+DRAIN_TIMEOUT = 5  # seconds to finish the requests in progress on shutdown
+TRACE_DUMP_FILE = "../log/traces.jsonl"
 
 
 def started_as_main() -> bool:
     return __name__ == "__main__"
 
 
-def main(in_background: bool = False) -> None:
+def main(in_background: bool = False,
+         transport: object or None = None) -> list:
+    """
+    Starts all servers in parallel and returns,
+    after every server loaded its data and is listening.
+    Afterwards the ready file of the config is written, if one is set.
+    If the config contains a TraceConfig, requests are traced.
+    If the RecResConfig contains colocated, the resolver calls
+    the DNS servers of this process directly.
+    If the config contains DnsReplicas, secondary DNS servers
+    transfer the zones of their primaries and follow their changes,
+    SIGHUP reloads the zone files.
+    If the RecResConfig contains addresses, one resolver is started
+    per address and the proxy shards the names between them.
+    :param transport: Creates the sockets of all servers,
+    e.g. a MemoryTransport runs the whole topology in this process
+    without kernel sockets. By default kernel sockets are used.
+    :return: The started servers, to stop them.
+    """
+    start_time = monotonic()
     dns_config, http_config, rec_res_config = load_config()
-    dns_servers = run_server_batch(DnsServerBatch, dns_config)
-    http_servers = run_server_batch(HttpServerBatch, http_config)
-    recursive_resolver = run_recursive_resolver(rec_res_config)
-    proxy = run_proxy()
+    ready_file = load_ready_file()
+    replica_config = load_replica_config()
+    resolver_addresses = get_resolver_addresses(rec_res_config)
+    trace_config = load_trace_config()
+    if trace_config is not None:
+        tracer.configure(**trace_config)
+    _install_diagnostic_signal_handlers()
+    with ThreadPoolExecutor() as executor:
+        futures = [
+            executor.submit(
+                run_server_batch, DnsServerBatch, dns_config, transport,
+                replicas=replica_config
+            ),
+            executor.submit(
+                run_server_batch, HttpServerBatch, http_config, transport
+            ),
+            executor.submit(
+                run_recursive_resolver, rec_res_config, transport,
+                warm_up=False
+            ),
+            *(
+                executor.submit(
+                    run_resolver_shard, rec_res_config, ip_address, transport
+                )
+                for ip_address, _ in resolver_addresses[1:]
+            ),
+            executor.submit(run_proxy, transport, resolver_addresses)
+        ]
+        servers = [future.result() for future in futures]  # barrier
+    if rec_res_config.get("colocated"):
+        for rec_resolver in servers[2:-1]:
+            for dns_server in servers[0].dns_servers:
+                rec_resolver.add_colocated_server(dns_server)
+    # the name servers must be listening, before names can be resolved
+    servers[2].warm_up_cache()
+    _install_reload_signal_handler(servers[0])
+    startup_time = monotonic() - start_time
+    logger.log(f"All servers started in {startup_time:.3f}s", flush=True)
+    if ready_file is not None:
+        _signal_readiness(ready_file, startup_time)
+        atexit.register(_remove_file, ready_file)
     if not in_background:
-        run_till_interrupt(dns_servers, http_servers, recursive_resolver, proxy)
+        run_till_interrupt(*servers)
+    return servers
 
 
 def load_config(
@@ -35,6 +109,85 @@ def load_config(
     return dns_config, http_config, rec_res_config
 
 
+def load_ready_file(
+        config_file: str = "../rsrc/config.json") -> str or None:
+    """
+    Returns the file, which is written when all servers are started,
+    or None if it isn't set in the config.
+    """
+    return _load_dict_from_json(config_file).get("ReadyFile")
+
+
+def load_replica_config(
+        config_file: str = "../rsrc/config.json") -> {str: str}:
+    """
+    Returns the addresses of the primary DNS servers
+    by the address of their secondary, empty if no replicas are set.
+    """
+    return _load_dict_from_json(config_file).get("DnsReplicas", {})
+
+
+def get_resolver_addresses(rec_res_config: {str: str}) -> [(str, int)]:
+    """
+    Returns the addresses of the recursive resolvers,
+    by default only the one of Proxy.REC_RES_ADDRESS.
+    """
+    ip_addresses = rec_res_config.get(
+        "addresses", [Proxy.REC_RES_ADDRESS[0]]
+    )
+    return [(ip_address, Proxy.REC_RES_ADDRESS[1])
+            for ip_address in ip_addresses]
+
+
+def load_trace_config(
+        config_file: str = "../rsrc/config.json") -> {str: float} or None:
+    """
+    Returns the arguments for Tracer.configure()
+    or None if tracing isn't configured.
+    """
+    return _load_dict_from_json(config_file).get("TraceConfig")
+
+
+def _install_diagnostic_signal_handlers() -> None:
+    """
+    SIGUSR1 captures stack samples of all threads for a flame graph,
+    SIGUSR2 writes the kept traces to TRACE_DUMP_FILE.
+    The signals aren't available on windows.
+    """
+    if not hasattr(signal, "SIGUSR2"):
+        return
+    StackSampler().install_signal_handler(signal.SIGUSR1)
+    signal.signal(signal.SIGUSR2, lambda *_: tracer.dump(TRACE_DUMP_FILE))
+
+
+def _install_reload_signal_handler(dns_servers: DnsServerBatch) -> None:
+    """
+    SIGHUP reloads the zone files, the changes are applied
+    without a restart and transferred to the secondaries.
+    """
+    if not hasattr(signal, "SIGHUP"):
+        return
+    signal.signal(signal.SIGHUP, lambda *_: dns_servers.reload_zone_files())
+
+
+def _signal_readiness(ready_file: str, startup_time: float) -> None:
+    """
+    Atomically writes the ready file,
+    so other processes can wait for the servers by polling for it.
+    """
+    tmp_filename = f"{ready_file}.tmp"
+    with open(tmp_filename, "w") as file:
+        file.write(dump_json({
+            "pid": os.getpid(), "startup_seconds": round(startup_time, 3)
+        }))
+    os.replace(tmp_filename, ready_file)
+
+
+def _remove_file(filename: str) -> None:
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
 def _load_dict_from_json(filename: str) -> {}:
     with open(filename) as file:
         json_str = file.read()
@@ -43,28 +196,143 @@ def _load_dict_from_json(filename: str) -> {}:
 
 
 def run_server_batch(
-        batch_class: Callable, config: {str: str}
+        batch_class: Callable, config: {str: str},
+        transport: object or None = None, **batch_arguments
 ) -> DnsServerBatch or HttpServerBatch:
-    server_batch = batch_class(config)
+    server_batch = batch_class(config, transport=transport, **batch_arguments)
     server_batch.run_all()
     return server_batch
 
 
-def run_recursive_resolver(rec_res_config: {str: str}) -> RecursiveResolver:
+def run_recursive_resolver(rec_res_config: {str: str},
+                           transport: object or None = None,
+                           warm_up: bool = True) -> RecursiveResolver:
+    """
+    Runs the recursive resolver.
+    If the config contains more than one worker,
+    additional resolver processes are started,
+    which share the address and a cache in shared memory.
+    If the config contains rate_limit, the requests are rate limited
+    by the arguments for the RateLimiter.
+    If the config contains load_shedding, requests are rejected
+    when the resolver is saturated, see LoadShedder.
+    Worker processes can't share an in-memory transport,
+    so only one resolver is started, if a transport is passed.
+    If the config contains colocated_latency, the calls of colocated
+    DNS servers are delayed by a LatencyModel with these arguments.
+    If the config contains addresses, this resolver uses the first one.
+    If the config contains capture, the requests of this resolver
+    are recorded by a QueryCapture with these arguments.
+    :param warm_up: False, if the cache is warmed up later,
+    see RecursiveResolver.warm_up_cache().
+    """
     root_name_server_addr = rec_res_config["root"]
-    rec_resolver = RecursiveResolver(root_name_server_addr)
+    worker_count = rec_res_config.get("workers", 1) \
+        if transport is None else 1
+    shared_cache = None
+    if worker_count > 1:
+        shared_cache = SharedMemoryCache.create(rec_res_config["shared_cache"])
+        atexit.register(shared_cache.unlink)
+        _run_resolver_workers(rec_res_config, worker_count - 1)
+    rec_resolver = RecursiveResolver(
+        root_name_server_addr,
+        ip_address=get_resolver_addresses(rec_res_config)[0][0],
+        snapshot_file=rec_res_config.get("cache_snapshot"),
+        warm_up_logs=rec_res_config.get("warm_up_logs"),
+        cache=shared_cache, reuse_port=shared_cache is not None,
+        rate_limiter=_create_rate_limiter(rec_res_config),
+        load_shedder=_create_load_shedder(rec_res_config),
+        transport=transport,
+        latency_model=_create_latency_model(rec_res_config),
+        capture=_create_query_capture(rec_res_config)
+    )
+    rec_resolver.run(warm_up)
+    return rec_resolver
+
+
+def run_resolver_shard(rec_res_config: {str: str}, ip_address: str,
+                       transport: object or None = None
+                       ) -> RecursiveResolver:
+    """
+    Runs an additional recursive resolver of the addresses,
+    with its own cache, which isn't snapshotted or warmed up,
+    since it only caches the names sharded to it.
+    """
+    rec_resolver = RecursiveResolver(
+        rec_res_config["root"], ip_address=ip_address,
+        rate_limiter=_create_rate_limiter(rec_res_config),
+        load_shedder=_create_load_shedder(rec_res_config),
+        transport=transport,
+        latency_model=_create_latency_model(rec_res_config)
+    )
     rec_resolver.run()
     return rec_resolver
 
 
-def run_proxy() -> Proxy:
-    proxy = Proxy()
+def _create_rate_limiter(rec_res_config: {str: str}) -> RateLimiter or None:
+    rate_limit_config = rec_res_config.get("rate_limit")
+    return RateLimiter(**rate_limit_config) \
+        if rate_limit_config is not None else None
+
+
+def _create_load_shedder(rec_res_config: {str: str}) -> LoadShedder or None:
+    load_shedding_config = rec_res_config.get("load_shedding")
+    return LoadShedder(**load_shedding_config) \
+        if load_shedding_config is not None else None
+
+
+def _create_latency_model(rec_res_config: {str: str}) -> LatencyModel or None:
+    latency_config = rec_res_config.get("colocated_latency")
+    return LatencyModel(Random(), **latency_config) \
+        if latency_config is not None else None
+
+
+def _create_query_capture(rec_res_config: {str: str}
+                          ) -> QueryCapture or None:
+    capture_config = rec_res_config.get("capture")
+    if capture_config is None:
+        return None
+    query_capture = QueryCapture(**capture_config)
+    atexit.register(query_capture.close)
+    return query_capture
+
+
+def _run_resolver_workers(rec_res_config: {str: str},
+                          worker_count: int) -> None:
+    context = get_context("spawn")  # don't fork the running threads
+    for _ in range(worker_count):
+        context.Process(
+            target=_run_resolver_worker, args=(rec_res_config,), daemon=True
+        ).start()
+
+
+def _run_resolver_worker(rec_res_config: {str: str}) -> None:
+    shared_cache = SharedMemoryCache.attach(rec_res_config["shared_cache"])
+    rec_resolver = RecursiveResolver(
+        rec_res_config["root"],
+        ip_address=get_resolver_addresses(rec_res_config)[0][0],
+        cache=shared_cache, reuse_port=True,
+        rate_limiter=_create_rate_limiter(rec_res_config),
+        load_shedder=_create_load_shedder(rec_res_config)
+    )
+    rec_resolver.run()
+    _sleep_forever()
+
+
+def run_proxy(transport: object or None = None,
+              resolver_addresses: [(str, int)] or None = None) -> Proxy:
+    proxy = Proxy(transport=transport, resolver_addresses=resolver_addresses)
     proxy.run()
     return proxy
 
 
 def run_till_interrupt(
         *stop_after_interrupt: (DnsServerBatch or HttpServerBatch)) -> None:
+    """
+    Sleeps until Ctrl + C is pressed or SIGTERM is received
+    and stops the servers gracefully afterwards.
+    """
+    signal.signal(signal.SIGTERM, _interrupt)
     try:
         _sleep_forever()
     except KeyboardInterrupt:  # Ctrl + C
@@ -72,15 +340,30 @@ def run_till_interrupt(
         logger.flush_all()
 
 
+def _interrupt(signal_number: int, _) -> None:
+    raise KeyboardInterrupt(f"Received signal {signal_number}")
+
+
 def _sleep_forever() -> None:
     while True:
         sleep(60)
 
 
-def _stop_servers(servers: (DnsServerBatch or HttpServerBatch)) -> None:
-    for server_batch in servers:
+def _stop_servers(servers: (DnsServerBatch or HttpServerBatch),
+                  drain_timeout: float = DRAIN_TIMEOUT) -> None:
+    """
+    Stops accepting requests and waits at most drain_timeout seconds
+    for the requests in progress, before the sockets are closed.
+    The servers are stopped in reverse order,
+    so the proxy drains before the servers it depends on.
+    """
+    start_time = monotonic()
+    for server_batch in reversed(servers):
         server_batch.stop()
-    logger.log("Processing stopped, sockets will remain blocked until program exits.", flush=True)
+    not_drained = RequestServer.wait_till_all_drained(drain_timeout)
+    logger.log(f"Processing stopped in {monotonic() - start_time:.3f}s, "
+               f"{not_drained} servers didn't finish their requests in time.",
+               flush=True)
 
 
 if started_as_main():
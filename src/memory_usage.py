@@ -0,0 +1,17 @@
+# std libraries
+import os
+import resource
+
+
+def get_rss() -> int:
+    """
+    Returns the resident memory of the process in bytes,
+    or the max. resident memory, if the current one is unknown.
+    Since the memory is measured for the whole process,
+    every benchmark using it should run in a new process.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGESIZE")
+    except OSError:  # not on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
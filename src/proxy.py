@@ -1,8 +1,8 @@
-# std imports
-import requests
-import socket
 # local imports
-from dns.dns_message import DnsMessage
+from dns.recursive_resolver.resolver_client import ResolverClient
+from dns.recursive_resolver.sharded_resolver_client import \
+    ShardedResolverClient
+from http_connection_pool import HttpConnectionPool
 from logger import logger
 from request_server import RequestServer
 
@@ -12,35 +12,50 @@ class Proxy:
     A Proxy which uses the local recursive resolver,
     if the requested name end with a KNOWN_ENDING.
     For unknown name endings a normal DNS lookup will be used.
+    The HTTP requests are sent over pooled keep-alive connections,
+    the pool metrics can be accessed by calling get_metrics().
+    Resolved addresses are cached until their TTL expires
+    and at most max_parallel_requests clients are handled at the same time.
+    The transport creates the sockets for the clients, the resolver
+    and the upstream HTTP connections.
+    If multiple resolvers are passed, the names are sharded between them
+    by a ShardedResolverClient.
     """
 
     KNOWN_ENDINGS = ("fuberlin", "telematik")
     REC_RES_ADDRESS = ("127.0.0.10", 53053)
+    DEFAULT_MAX_PARALLEL_REQUESTS = 32
+    DEFAULT_DRAIN_TIMEOUT = 5  # seconds
 
-    @classmethod
-    def _resolve_locally(cls, requested_server: str) -> str:
-        request = cls._create_rec_res_request(requested_server)
-        data = cls._send_rec_res_request(request)
-        resp = DnsMessage.new_dns_response(data.decode())
-        return resp.get_address()
-
-    @classmethod
-    def _send_rec_res_request(cls, request):
-        client_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        client_sock.sendto(request.encode(), Proxy.REC_RES_ADDRESS)
-        data, _ = client_sock.recvfrom(4096)
-        return data
-
-    @classmethod
-    def _create_rec_res_request(cls, requested_server):
-        dns_msg = DnsMessage.new_dns_request()
-        dns_msg.set_req(requested_server, recursion_desired=True)
-        request = dns_msg.build_message()
-        return request
-
-    def __init__(self, ip_address: str = "127.0.0.100", port: int = 80):
+    def __init__(self,
+                 ip_address: str = "127.0.0.100", port: int = 80,
+                 pool_size: int = HttpConnectionPool.DEFAULT_POOL_SIZE,
+                 max_idle_time: float =
+                 HttpConnectionPool.DEFAULT_MAX_IDLE_TIME,
+                 connect_timeout: float =
+                 HttpConnectionPool.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float =
+                 HttpConnectionPool.DEFAULT_READ_TIMEOUT,
+                 max_parallel_requests: int = DEFAULT_MAX_PARALLEL_REQUESTS,
+                 transport: object or None = None,
+                 resolver_addresses: [(str, int)] or None = None):
+        """
+        :param resolver_addresses: The addresses of the recursive resolvers,
+        by default REC_RES_ADDRESS.
+        """
+        resolver_addresses = resolver_addresses or [Proxy.REC_RES_ADDRESS]
         self.server = RequestServer(
-            ip_address, port, self.handle_request, use_udp=False
+            ip_address, port, self.handle_request, use_udp=False,
+            max_parallel_requests=max_parallel_requests, transport=transport
+        )
+        self.resolver_client = ResolverClient(
+            resolver_addresses[0], transport=transport
+        ) if len(resolver_addresses) == 1 else ShardedResolverClient(
+            resolver_addresses, transport=transport
+        )
+        self.http_pool = HttpConnectionPool(
+            pool_size, max_idle_time, connect_timeout, read_timeout,
+            transport
         )
 
     def handle_request(self, request: str) -> str:
@@ -52,19 +67,35 @@ class Proxy:
         requested_server = header.split(" ")[1][1:]
         logger.log(f"Proxy got request for {requested_server}.", flush=True)
         if requested_server.split(".")[-1] in Proxy.KNOWN_ENDINGS:
-            requested_server = Proxy._resolve_locally(requested_server)
-        resp = requests.get(f"http://{requested_server}")
+            requested_server = self._resolve_locally(requested_server)
+        resp = self.http_pool.get(f"http://{requested_server}")
         return resp.text
 
+    def _resolve_locally(self, requested_server: str) -> str:
+        return self.resolver_client.resolve(requested_server)
+
+    def get_metrics(self) -> {str: int or float}:
+        """
+        Returns the metrics of the upstream connection pool,
+        see HttpConnectionPool.get_metrics().
+        """
+        return self.http_pool.get_metrics()
+
     def run(self) -> None:
         logger.log("Proxy:")
         self.server.open_socket()
         self.server.run()
         logger.flush()
 
-    def stop(self) -> None:
+    def stop(self, drain_timeout: float = DEFAULT_DRAIN_TIMEOUT) -> None:
         """
-        Stops listening for requests.
-        The socket won't be removed.
+        Stops listening for requests,
+        the requests in progress are answered before the upstream
+        connections are closed.
+        :param drain_timeout: The max. seconds to wait for the requests.
         """
         self.server.stop_listening()
+        self.server.wait_till_drained(drain_timeout)
+        logger.log(f"Proxy upstream pool: {self.get_metrics()}", flush=True)
+        self.http_pool.close()
+        self.resolver_client.close()
@@ -0,0 +1,183 @@
+# std libraries
+import struct
+import zlib
+from _thread import start_new_thread
+from threading import Condition, Lock
+from time import monotonic, time
+from typing import BinaryIO, Iterator
+# local libraries
+from logger import logger
+
+
+class QueryCapture:
+    """
+    Records the incoming requests of a RequestServer to a binary file,
+    to replay them later (see replay_queries.py).
+    The file starts with MAGIC and the start time of the capture,
+    followed by a zlib stream of records.
+    Every record is a RECORD header with the microseconds since the start,
+    the protocol, the port of the client and the lengths of the ip address
+    and the request, followed by the ip address and the request.
+    Since requests of one server mostly differ in their name and ID,
+    a compressed record takes only a few bytes.
+    record() only appends the record to a buffer,
+    which is compressed and written by a background thread
+    every FLUSH_INTERVAL or as soon as it is half full,
+    so the request handlers don't wait for the file.
+    If the buffer exceeds max_buffer_size, because the file can't keep up,
+    further records are dropped and counted instead of growing the memory.
+    Recording stops after max_records, to bound the size of the file.
+    """
+
+    MAGIC = b"QRYCAP1\n"
+    HEADER = struct.Struct("<d")  # start time
+    # offset, protocol, client port, ip length, request length
+    RECORD = struct.Struct("<QBHBI")
+    UDP = 0
+    TCP = 1
+    DEFAULT_MAX_BUFFER_SIZE = 4 * 2 ** 20  # bytes
+    FLUSH_INTERVAL = 0.5  # seconds
+    COMPRESSION_LEVEL = 1  # fast, the records are repetitive anyway
+    READ_SIZE = 2 ** 16
+
+    @staticmethod
+    def read(filename: str) -> Iterator[tuple]:
+        """
+        Yields the recorded requests in the order they were received.
+        :return: The seconds since the start of the capture,
+        the protocol ('udp' or 'tcp'), the address of the client
+        and the request.
+        """
+        with open(filename, "rb") as file:
+            if file.read(len(QueryCapture.MAGIC)) != QueryCapture.MAGIC:
+                raise ValueError(f"{filename} isn't a query capture.")
+            file.read(QueryCapture.HEADER.size)
+            for record in QueryCapture._read_records(file):
+                yield record
+
+    @staticmethod
+    def _read_records(file: BinaryIO
+                      ) -> Iterator[tuple]:
+        decompressor = zlib.decompressobj()
+        data = b""
+        position = 0
+        for chunk in iter(lambda: file.read(QueryCapture.READ_SIZE), b""):
+            data = data[position:] + decompressor.decompress(chunk)
+            position = 0
+            while len(data) - position >= QueryCapture.RECORD.size:
+                offset, protocol, port, ip_length, request_length = \
+                    QueryCapture.RECORD.unpack_from(data, position)
+                ip_start = position + QueryCapture.RECORD.size
+                request_start = ip_start + ip_length
+                record_end = request_start + request_length
+                if record_end > len(data):  # the rest is in the next chunk
+                    break
+                yield (
+                    offset / 1e6,
+                    "udp" if protocol == QueryCapture.UDP else "tcp",
+                    (data[ip_start:request_start].decode(), port),
+                    data[request_start:record_end].decode()
+                )
+                position = record_end
+
+    def __init__(self,
+                 filename: str,
+                 max_buffer_size: int = DEFAULT_MAX_BUFFER_SIZE,
+                 max_records: int or None = None):
+        """
+        :param filename: The file to write the capture to,
+        an existing file is overwritten.
+        :param max_buffer_size: The max. bytes of records,
+        which aren't written yet.
+        :param max_records: The max. count of recorded requests or None.
+        """
+        self.filename = filename
+        self.max_buffer_size = max_buffer_size
+        self.max_records = max_records
+        self.start_time = time()
+        self.started_at = monotonic()  # offsets don't follow clock changes
+        self.buffer: [bytes] = []
+        self.buffer_size = 0
+        self.records = 0
+        self.dropped = 0
+        self.is_closed = False
+        self.buffer_changed = Condition()
+        self.write_lock = Lock()  # the compressor isn't thread safe
+        self.file = open(filename, "wb")
+        self.file.write(
+            QueryCapture.MAGIC + QueryCapture.HEADER.pack(self.start_time)
+        )
+        self.compressor = zlib.compressobj(
+            QueryCapture.COMPRESSION_LEVEL
+        )
+        start_new_thread(self._write_records, ())
+
+    def record(self,
+               request: str, client: (str, int), use_udp: bool) -> None:
+        """
+        Adds the request, which was received now from the client.
+        """
+        offset = int((monotonic() - self.started_at) * 1e6)
+        ip_address = str(client[0]).encode()
+        encoded_request = request.encode()
+        record = b"".join((
+            QueryCapture.RECORD.pack(
+                offset, QueryCapture.UDP if use_udp else QueryCapture.TCP,
+                client[1], len(ip_address), len(encoded_request)
+            ),
+            ip_address, encoded_request
+        ))
+        with self.buffer_changed:
+            if self.is_closed or (self.max_records is not None
+                                  and self.records >= self.max_records):
+                return
+            if self.buffer_size + len(record) > self.max_buffer_size:
+                self.dropped += 1
+                return
+            self.buffer.append(record)
+            self.buffer_size += len(record)
+            self.records += 1
+            if self.buffer_size > self.max_buffer_size // 2:
+                self.buffer_changed.notify_all()  # write before it's full
+
+    def get_metrics(self) -> {str: int}:
+        with self.buffer_changed:
+            return {"records": self.records, "dropped": self.dropped}
+
+    def close(self) -> None:
+        """
+        Writes the buffered records and closes the file.
+        """
+        with self.buffer_changed:
+            if self.is_closed:
+                return
+            self.is_closed = True
+            self.buffer_changed.notify_all()
+        with self.write_lock:
+            self._flush()
+            self.file.write(self.compressor.flush())
+            self.file.close()
+        logger.log(f"Captured {self.records} requests to {self.filename}, "
+                   f"{self.dropped} dropped.")
+
+    def _write_records(self) -> None:
+        while True:
+            with self.buffer_changed:
+                self.buffer_changed.wait(QueryCapture.FLUSH_INTERVAL)
+                if self.is_closed:
+                    return
+            with self.write_lock:
+                if not self.file.closed:
+                    self._flush()
+
+    def _flush(self) -> None:
+        """
+        Compresses and writes the buffered records,
+        must be called while holding the write lock.
+        """
+        with self.buffer_changed:
+            records, self.buffer = self.buffer, []
+            self.buffer_size = 0
+        if records:
+            self.file.write(self.compressor.compress(b"".join(records)))
+            self.file.flush()
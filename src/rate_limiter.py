@@ -0,0 +1,186 @@
+# std libraries
+from collections import Counter, OrderedDict
+from threading import Lock
+# local libraries
+from dns.dns_message import DnsMessage
+from token_bucket import TokenBucket
+
+
+class RateLimiter:
+    """
+    Limits the rate of DNS requests per client ip address
+    and per requested name, using one TokenBucket for each of them.
+    The buckets are stored in a table of at most max_buckets entries,
+    ordered by their last use, so the least recently used bucket
+    is evicted if the table is full
+    and buckets idle for longer than idle_timeout are removed.
+    Limited requests are either dropped, answered by an empty
+    truncated response (the client should retry over TCP)
+    or answered by a REFUSED response.
+    """
+
+    DROP = "drop"
+    TRUNCATE = "truncate"
+    REFUSE = "refuse"
+    ACTIONS = (DROP, TRUNCATE, REFUSE)
+    DEFAULT_MAX_BUCKETS = 10000
+    DEFAULT_IDLE_TIMEOUT = 60  # seconds
+    EVICTION_INTERVAL = 100  # checks between two removals of idle buckets
+    MAX_REPORTED_CLIENTS = 10
+
+    def __init__(self,
+                 client_rate: float or None = None,
+                 client_burst: float or None = None,
+                 name_rate: float or None = None,
+                 name_burst: float or None = None,
+                 action: str = REFUSE,
+                 max_buckets: int = DEFAULT_MAX_BUCKETS,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        """
+        :param client_rate: The requests per second of a client ip address
+        or None for no limit.
+        :param client_burst: The max. requests of a client at once,
+        defaults to the client_rate.
+        :param name_rate: The requests per second for a requested name
+        or None for no limit.
+        :param name_burst: The max. requests for a name at once,
+        defaults to the name_rate.
+        :param action: One of ACTIONS, used for limited requests.
+        :param max_buckets: The max. count of stored buckets.
+        :param idle_timeout: The seconds after which an unused bucket
+        is removed.
+        """
+        assert action in RateLimiter.ACTIONS, f"Unknown action {action}."
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.name_rate = name_rate
+        self.name_burst = name_burst
+        self.action = action
+        self.max_buckets = max_buckets
+        self.idle_timeout = idle_timeout
+        self.buckets: {(str, str): TokenBucket} = OrderedDict()
+        self.lock = Lock()
+        self.checks = 0
+        self.allowed = 0
+        self.limited = 0
+        self.evicted_buckets = 0
+        self.limited_by_client = Counter()
+
+    def is_allowed(self, client_ip: str, request: str) -> bool:
+        """
+        Consumes a token of the client and of the requested name.
+        Requests, which aren't DNS messages, are only limited by client.
+        :return: True, if the request should be processed.
+        """
+        allowed = self.client_rate is None or self._try_consume(
+            ("client", client_ip), self.client_rate, self.client_burst
+        )
+        if allowed and self.name_rate is not None:
+            requested_name = self._get_requested_name(request)
+            allowed = requested_name is None or self._try_consume(
+                ("name", requested_name), self.name_rate, self.name_burst
+            )
+        with self.lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self._count_limited(client_ip)
+        return allowed
+
+    def get_limited_reply(self,
+                          request: str, is_udp: bool = True) -> str or None:
+        """
+        Returns the reply for a limited request
+        or None if it should be dropped.
+        Truncated responses are only sent over UDP,
+        TCP requests are refused instead.
+        """
+        if self.action == RateLimiter.DROP:
+            return None
+        try:
+            request_id = DnsMessage.new_dns_request(request).get_id()
+        except (ValueError, AttributeError):  # not a dns message
+            return None
+        dns_resp = DnsMessage.new_dns_response()
+        if self.action == RateLimiter.TRUNCATE and is_udp:
+            dns_resp.set_empty_resp(authoritative=False, rcode="NOERROR")
+            dns_resp.set_truncated()
+        else:
+            dns_resp.set_empty_resp(authoritative=False, rcode="REFUSED")
+        dns_resp.set_id(request_id)
+        return dns_resp.build_message()
+
+    def get_metrics(self) -> {str: int or {str: int}}:
+        """
+        Returns the count of allowed and limited requests,
+        the stored and evicted buckets
+        and the clients with the most limited requests.
+        """
+        with self.lock:
+            return {
+                "allowed": self.allowed,
+                "limited": self.limited,
+                "buckets": len(self.buckets),
+                "evicted_buckets": self.evicted_buckets,
+                "limited_by_client": dict(self.limited_by_client.most_common(
+                    RateLimiter.MAX_REPORTED_CLIENTS
+                ))
+            }
+
+    def _count_limited(self, client_ip: str) -> None:
+        """
+        Counts the limited request of the client,
+        only the clients with the most limited requests are kept,
+        so the counters are bounded by max_buckets.
+        Must be called while holding the lock.
+        """
+        self.limited += 1
+        if client_ip not in self.limited_by_client \
+                and len(self.limited_by_client) >= self.max_buckets:
+            self.limited_by_client = Counter(dict(
+                self.limited_by_client.most_common(self.max_buckets // 2)
+            ))
+        self.limited_by_client[client_ip] += 1
+
+    def _get_requested_name(self, request: str) -> str or None:
+        """
+        Returns the requested name or None for batch requests
+        and requests, which aren't DNS messages.
+        """
+        try:
+            dns_request = DnsMessage.from_str(request)
+            if dns_request.is_batch_request():
+                return None
+            return dns_request.get_requested_name()
+        except (ValueError, AttributeError):  # not a dns message
+            return None
+
+    def _try_consume(self,
+                     key: (str, str),
+                     rate: float, burst: float or None) -> bool:
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(rate, burst)
+                if len(self.buckets) > self.max_buckets:
+                    self.buckets.popitem(last=False)
+                    self.evicted_buckets += 1
+            else:
+                self.buckets.move_to_end(key)
+            self.checks += 1
+            if self.checks % RateLimiter.EVICTION_INTERVAL == 0:
+                self._remove_idle_buckets()
+        return bucket.try_consume()
+
+    def _remove_idle_buckets(self) -> None:
+        """
+        Removes the idle buckets from the start of the table,
+        which contains the least recently used buckets.
+        Must be called while holding the lock.
+        """
+        while self.buckets:
+            key, bucket = next(iter(self.buckets.items()))
+            if bucket.get_idle_time() < self.idle_timeout:
+                break
+            del self.buckets[key]
+            self.evicted_buckets += 1
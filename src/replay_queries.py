@@ -0,0 +1,229 @@
+# Replays recorded requests against a server, e.g. twice as fast
+# and compared with the answers of another server:
+# python replay_queries.py queries.capture -s 2 --baseline 127.0.0.20:53053
+
+# std libraries
+import json
+import sys
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from time import monotonic, sleep
+from typing import Callable, Iterable
+# local libraries
+from dns.dns_message import DnsMessage
+from latency_histogram import LatencyHistogram
+from query_capture import QueryCapture
+
+
+class QueryReplayer:
+    """
+    Resends recorded requests (see QueryCapture) to a server,
+    with the recorded gaps between them divided by the speed
+    or as fast as possible, if the speed is None.
+    Every request gets a new ID,
+    requests recorded over TCP are sent over UDP as well.
+    The latencies are measured, as well as the lag of the requests
+    behind their schedule, which shows if the replay kept the timing.
+    If a baseline server is set, every request is sent to it as well
+    and the response codes and answers per requested name are compared,
+    so e.g. a changed server can be checked against real traffic.
+    At most a window of requests is in flight,
+    so the memory usage doesn't depend on the length of the capture.
+    """
+
+    WINDOW_PER_WORKER = 4
+    MAX_DIVERGENCE_EXAMPLES = 10
+
+    @staticmethod
+    def get_answers(dns_request: DnsMessage,
+                    dns_responses: [DnsMessage]) -> {str: [str or int]}:
+        """
+        Returns the response code, address and name server
+        per requested name of the responses, without IDs and TTLs.
+        """
+        answers = {}
+        for dns_resp in dns_responses:
+            batch_answers = dns_resp.get_answers()
+            for name, answer in (batch_answers.items() if batch_answers
+                                 else [(dns_request.get_requested_name(),
+                                        dns_resp)]):
+                answers[name] = [
+                    answer.get_value("dns.flags.rcode"),
+                    answer.get_address(), answer.get_name_server_name()
+                ]
+        return answers
+
+    @staticmethod
+    def _send(send: Callable[[DnsMessage], [DnsMessage]],
+              request: str,
+              latencies: LatencyHistogram) -> [DnsMessage] or None:
+        """
+        Sends a new copy of the request, since its ID is replaced.
+        :return: The responses or None, if the request failed.
+        """
+        start_time = monotonic()
+        try:
+            dns_responses = send(DnsMessage.new_dns_request(request))
+        except Exception:  # one failing request shouldn't stop the replay
+            return None
+        latencies.add(monotonic() - start_time)
+        return dns_responses
+
+    def __init__(self,
+                 send: Callable[[DnsMessage], [DnsMessage]],
+                 speed: float or None = 1.0,
+                 send_baseline: Callable[[DnsMessage], [DnsMessage]]
+                 or None = None,
+                 concurrency: int = 64):
+        """
+        :param send: Sends a request to the server
+        and returns its responses.
+        :param speed: The factor to speed up the recorded timing,
+        e.g. 1 for the original timing, or None for max. speed.
+        :param send_baseline: Sends a request to the server
+        to compare with or None.
+        :param concurrency: The max. count of parallel requests.
+        """
+        self.send = send
+        self.speed = speed
+        self.send_baseline = send_baseline
+        self.concurrency = concurrency
+        self.window = BoundedSemaphore(
+            concurrency * QueryReplayer.WINDOW_PER_WORKER
+        )
+        self.lock = Lock()
+        self.errors = 0
+        self.baseline_errors = 0
+        self.divergences = 0
+        self.divergence_examples: [{str: object}] = []
+        self.latencies = LatencyHistogram()
+        self.baseline_latencies = LatencyHistogram()
+        self.lags = LatencyHistogram()
+
+    def run(self, records: Iterable[tuple]) -> None:
+        """
+        Replays the records, the first one is sent immediately.
+        """
+        start_time = None
+        first_offset = 0.0
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            for offset, _, _, request in records:
+                if start_time is None:
+                    start_time, first_offset = monotonic(), offset
+                scheduled_at = monotonic() if self.speed is None \
+                    else start_time + (offset - first_offset) / self.speed
+                delay = scheduled_at - monotonic()
+                if delay > 0:
+                    sleep(delay)
+                self.window.acquire()
+                executor.submit(self._replay, request, scheduled_at)
+
+    def get_summary(self, elapsed_time: float) -> {str: int or float}:
+        summary = {
+            "replayed": self.latencies.count + self.errors,
+            "errors": self.errors,
+            "seconds": elapsed_time,
+            "queries_per_second":
+                self.latencies.count / elapsed_time if elapsed_time else 0.0
+        }
+        histograms = {"latency": self.latencies, "lag": self.lags}
+        if self.send_baseline is not None:
+            summary.update(baseline_errors=self.baseline_errors,
+                           divergences=self.divergences,
+                           divergence_examples=self.divergence_examples)
+            histograms["baseline_latency"] = self.baseline_latencies
+        for prefix, histogram in histograms.items():
+            for key, latency in histogram.get_summary().items():
+                if key != "count":
+                    summary[f"{prefix}_{key}_ms"] = latency * 1000
+        return summary
+
+    def _replay(self, request: str, scheduled_at: float) -> None:
+        try:
+            self.lags.add(max(monotonic() - scheduled_at, 0.0))
+            dns_responses = self._send(self.send, request, self.latencies)
+            if dns_responses is None:
+                with self.lock:
+                    self.errors += 1
+            elif self.send_baseline is not None:
+                self._compare(request, dns_responses)
+        finally:
+            self.window.release()
+
+    def _compare(self, request: str, dns_responses: [DnsMessage]) -> None:
+        baseline_responses = self._send(
+            self.send_baseline, request, self.baseline_latencies
+        )
+        with self.lock:
+            if baseline_responses is None:
+                self.baseline_errors += 1
+                return
+            dns_request = DnsMessage.new_dns_request(request)
+            answers = self.get_answers(dns_request, dns_responses)
+            baseline_answers = self.get_answers(
+                dns_request, baseline_responses
+            )
+            if answers == baseline_answers:
+                return
+            self.divergences += 1
+            if len(self.divergence_examples) \
+                    < QueryReplayer.MAX_DIVERGENCE_EXAMPLES:
+                self.divergence_examples.append({
+                    "names": dns_request.get_requested_names(),
+                    "answers": answers, "baseline": baseline_answers
+                })
+
+
+def started_as_main() -> bool:
+    return __name__ == "__main__"
+
+
+def parse_arguments(argv: [str]) -> Namespace:
+    parser = ArgumentParser(
+        description="Replays the requests of a query capture "
+                    "and prints a summary as JSON."
+    )
+    parser.add_argument("capture", help="File written by a QueryCapture.")
+    parser.add_argument("--server", default="127.0.0.10:53053",
+                        help="Address of the server to replay against.")
+    parser.add_argument("--baseline", default=None,
+                        help="Address of a server to compare the answers "
+                             "with, e.g. the current version.")
+    speed_group = parser.add_mutually_exclusive_group()
+    speed_group.add_argument("-s", "--speed", type=float, default=1.0,
+                             help="Factor to speed up the recorded timing.")
+    speed_group.add_argument("--max-speed", action="store_true",
+                             help="Send the requests as fast as possible.")
+    parser.add_argument("-c", "--concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=5)
+    return parser.parse_args(argv)
+
+
+def create_send_function(address: str, timeout: float) -> Callable:
+    from dns.recursive_resolver.resolver_client import ResolverClient
+    ip_address, port = address.split(":")
+    client = ResolverClient((ip_address, int(port)), timeout, use_cache=False)
+    return client.send_message
+
+
+def main(argv: [str]) -> None:
+    arguments = parse_arguments(argv)
+    send_baseline = create_send_function(
+        arguments.baseline, arguments.timeout
+    ) if arguments.baseline is not None else None
+    replayer = QueryReplayer(
+        create_send_function(arguments.server, arguments.timeout),
+        None if arguments.max_speed else arguments.speed,
+        send_baseline, arguments.concurrency
+    )
+    start_time = monotonic()
+    try:
+        replayer.run(QueryCapture.read(arguments.capture))
+    finally:
+        summary = replayer.get_summary(monotonic() - start_time)
+        print(json.dumps(summary))
+
+
+if started_as_main():
+    main(sys.argv[1:])
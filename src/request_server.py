@@ -2,13 +2,20 @@
 import socket
 from _thread import start_new_thread
 from datetime import datetime
-from time import sleep
-from typing import Callable
+from threading import BoundedSemaphore, Condition, Event
+from time import monotonic, sleep
+from typing import Callable, Iterator
 
 # local imports
 from logger import logger
 from dns.dns_message import DnsMessage
-
+from file_reply import FileReply
+from load_shedder import LoadShedder
+from query_capture import QueryCapture
+from rate_limiter import RateLimiter
+from tcp_connection import TcpConnection
+from tracer import tracer
+from transport.socket_transport import SocketTransport
 
 
 def simulate_network_delay():
@@ -20,12 +27,37 @@ class RequestServer:
     A simple TCP or UDP server, which will accept all requests,
     processes them with the initially set process_request function
     and sends the return of this function as response.
-    The server will close the connection after responding once,
+    By default the server will close the connection after responding once,
     so TCP and UDP can be used.
+    TCP connections can be kept open instead,
+    either by framing the messages with a 2 byte length prefix
+    (DNS over TCP, pipelined requests are answered as soon as processed)
+    or by reading HTTP messages (keep_alive, answered in order).
+    Idle connections will be closed after the idle timeout.
+    If max_parallel_requests is set, at most this count of requests
+    (or connections for TCP) are handled at the same time,
+    further requests wait in the socket buffer or backlog.
+    If a RateLimiter is set, requests exceeding the rate of their client
+    or requested name aren't passed to process_request,
+    but answered as set by the action of the RateLimiter.
+    If a LoadShedder is set, it decides by the count of requests
+    in progress and the queue delay, if requests are rejected quickly,
+    before they are processed (only for UDP and length prefixed TCP).
+    If a QueryCapture is set, all requests are recorded with their client,
+    e.g. to replay them against another server.
+    Calling stop_listening() unblocks the waiting socket,
+    so no further requests are accepted,
+    while wait_till_drained() waits for the requests in progress
+    and closes the socket afterwards.
+    The socket is created by the transport, by default a kernel socket,
+    but e.g. a MemoryTransport runs the server without kernel sockets.
     """
 
     TCP_BUFF_SIZE = 1024
     UDP_BUFF_SIZE = 65535  # max udp size
+    TCP_BACKLOG = 16
+    TCP_IDLE_TIMEOUT = 10  # seconds
+    running_servers: {'RequestServer'} = set()
 
     @staticmethod
     def read_tcp_data(tcp_conn: socket) -> str:
@@ -36,24 +68,122 @@ class RequestServer:
         """
         recv_data = []
         tmp_data = tcp_conn.recv(RequestServer.TCP_BUFF_SIZE)
-        while len(recv_data) == RequestServer.TCP_BUFF_SIZE:
+        while len(tmp_data) == RequestServer.TCP_BUFF_SIZE:
             recv_data.append(tmp_data)
             tmp_data = tcp_conn.recv(RequestServer.TCP_BUFF_SIZE)
         recv_data.append(tmp_data)
         all_bin_data = b"".join(recv_data)
         return all_bin_data.decode()
 
+    @classmethod
+    def wait_till_all_drained(cls, timeout: float) -> int:
+        """
+        Waits for all stopped servers to finish their requests,
+        at most for the timeout in seconds.
+        :return: The count of servers, which weren't drained in time.
+        """
+        deadline = monotonic() + timeout
+        not_drained = 0
+        for server in list(cls.running_servers):
+            if not server.is_running \
+                    and not server.wait_till_drained(deadline - monotonic()):
+                not_drained += 1
+        return not_drained
+
+    @classmethod
+    def wait_till_all_listening(cls, timeout: float) -> int:
+        """
+        Waits for the listener threads of all running servers to start,
+        at most for the timeout in seconds.
+        :return: The count of servers, which didn't start listening in time.
+        """
+        deadline = monotonic() + timeout
+        not_listening = 0
+        for server in list(cls.running_servers):
+            if not server.is_listening.wait(max(deadline - monotonic(), 0)):
+                not_listening += 1
+        return not_listening
+
+    @staticmethod
+    def _is_http_keep_alive(http_msg: str) -> bool:
+        """
+        HTTP/1.1 connections are kept alive,
+        unless the client sends 'Connection: close'.
+        """
+        header = http_msg.split("\r\n\r\n", 1)[0].lower()
+        if "connection: close" in header:
+            return False
+        return header.split("\r\n", 1)[0].endswith("http/1.1") \
+            or "connection: keep-alive" in header
+
+    @staticmethod
+    def _get_oversized_reply(request: str) -> bytes:
+        """
+        Returns a SERVFAIL response to the request, which is sent
+        instead of a reply, which doesn't fit into one frame.
+        """
+        dns_resp = DnsMessage.new_dns_response()
+        dns_resp.set_empty_resp(authoritative=False, rcode="SERVFAIL")
+        dns_resp.set_id(DnsMessage.peek_value(request, "dns.id"))
+        return dns_resp.build_message().encode()
+
     def __init__(self,
                  ip_address: str, port: int,
                  process_request: Callable,
-                 use_udp: bool = True, log_requests: bool = False
+                 use_udp: bool = True, log_requests: bool = False,
+                 use_length_prefix: bool = False, keep_alive: bool = False,
+                 backlog: int = TCP_BACKLOG,
+                 idle_timeout: float = TCP_IDLE_TIMEOUT,
+                 max_parallel_requests: int or None = None,
+                 reuse_port: bool = False,
+                 rate_limiter: RateLimiter or None = None,
+                 load_shedder: LoadShedder or None = None,
+                 transport: object or None = None,
+                 capture: QueryCapture or None = None
                  ):
+        """
+        :param use_length_prefix: True, if TCP messages are prefixed
+        by their length and the connection should be kept open.
+        :param keep_alive: True, if TCP messages are HTTP messages
+        and the connection should be kept open.
+        :param backlog: The count of not accepted TCP connections,
+        before new connections are refused.
+        :param idle_timeout: The seconds after which a persistent
+        TCP connection without requests will be closed.
+        :param max_parallel_requests: The max. count of requests
+        handled at the same time or None for no limit.
+        :param reuse_port: True, if multiple processes should be able
+        to bind the same address, the requests are distributed among them.
+        :param rate_limiter: The RateLimiter for the requests or None.
+        :param load_shedder: The LoadShedder, used to reject requests
+        when the server is saturated, or None.
+        :param transport: Creates the socket,
+        by default a SocketTransport is used.
+        :param capture: Records the requests or None,
+        it is closed, when the server is drained.
+        """
         self.sock_information = (ip_address, port)
         self.process_request = process_request
         self.used_udp = use_udp
         self.log_requests = log_requests
+        self.use_length_prefix = use_length_prefix
+        self.keep_alive = keep_alive
+        self.backlog = backlog
+        self.idle_timeout = idle_timeout
+        self.handler_slots = BoundedSemaphore(max_parallel_requests) \
+            if max_parallel_requests else None
+        self.reuse_port = reuse_port
+        self.rate_limiter = rate_limiter
+        self.load_shedder = load_shedder
+        self.capture = capture
+        self.transport = transport if transport is not None \
+            else SocketTransport()
         self.socket = None
         self.is_running = False
+        self.is_listening = Event()  # set by the listener thread
+        self.in_flight = 0
+        self.in_flight_changed = Condition()
+        self.connections: {TcpConnection} = set()
         logger.register_logger(
             key_obj=self, log_file_name=f"../log/{ip_address}.log"
         )
@@ -62,12 +192,12 @@ class RequestServer:
         """
         Opens the socket and starts listening, but won't handle requests.
         """
-        socket_type = socket.SOCK_DGRAM if self.used_udp \
-            else socket.SOCK_STREAM
-        self.socket = socket.socket(socket.AF_INET, socket_type)
+        self.socket = self.transport.create_socket(self.used_udp)
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind(self.sock_information)
         if not self.used_udp:
-            self.socket.listen(1)
+            self.socket.listen(self.backlog)
         logger.log(f"Listening on {self._get_binding_info()} for "
                    f"{'UDP' if self.used_udp else 'TCP'}")
 
@@ -79,6 +209,8 @@ class RequestServer:
         will get the requests as argument and returns the response.
         The method open_socket() must be called before run().
         """
+        self.is_running = True
+        RequestServer.running_servers.add(self)
         if in_thread:
             start_new_thread(self._process_incoming_requests, ())
         else:
@@ -86,25 +218,113 @@ class RequestServer:
 
     def stop_listening(self) -> None:
         """
-        Stops listening for requests, but the socket won't be removed.
+        Stops accepting requests, by shutting down the receiving side
+        of the socket, which unblocks the waiting recvfrom() or accept().
+        Persistent connections stop reading further requests,
+        but requests in progress are still answered.
         """
         self.is_running = False
+        if self.socket is None:
+            return
+        try:
+            self.socket.shutdown(socket.SHUT_RD)
+        except OSError:  # udp sockets are woken up, but raise ENOTCONN
+            pass
+        with self.in_flight_changed:
+            connections = list(self.connections)
+        for tcp_conn in connections:
+            tcp_conn.stop_reading()
+
+    def wait_till_drained(self, timeout: float or None = None) -> bool:
+        """
+        Waits until all requests in progress are answered
+        and closes the socket afterwards, even if the timeout was reached.
+        Should be called after stop_listening().
+        :param timeout: The max. seconds to wait or None to wait forever.
+        :return: True, if all requests were answered in time.
+        """
+        with self.in_flight_changed:
+            is_drained = self.in_flight_changed.wait_for(
+                lambda: self.in_flight == 0,
+                None if timeout is None else max(timeout, 0)
+            )
+        if self.socket is not None:
+            self.socket.close()
+        if self.capture is not None:
+            self.capture.close()
+        RequestServer.running_servers.discard(self)
+        return is_drained
 
     def _process_incoming_requests(self) -> None:
-        self.is_running = True
+        self.is_listening.set()
         while self.is_running:
-            conn_information = self._accept_request()
-            start_new_thread(self._handle_new_client, conn_information)
+            if self.handler_slots is not None:
+                self.handler_slots.acquire()
+            try:
+                conn_information = self._accept_request()
+            except OSError:  # the socket was shut down or closed
+                conn_information = None
+            if not self.is_running or conn_information is None:
+                if conn_information is not None and not self.used_udp:
+                    conn_information[0].close()
+                if self.handler_slots is not None:
+                    self.handler_slots.release()
+                break
+            self._request_started()
+            start_new_thread(
+                self._handle_new_client, (*conn_information, monotonic())
+            )
 
     def _accept_request(self) -> str or (socket, (str, str)):
         return self.socket.recvfrom(RequestServer.UDP_BUFF_SIZE) \
             if self.used_udp else self.socket.accept()
 
     def _handle_new_client(self,
-                           conn: str or socket, client: (str, str)) -> None:
+                           conn: str or socket, client: (str, str),
+                           received_at: float) -> None:
+        """
+        :param received_at: The monotonic time, the request was received
+        or the connection was accepted.
+        """
         # self._print_client_information(client)
         try:
-            self._handle_request(conn, client)
+            if not self.used_udp \
+                    and (self.use_length_prefix or self.keep_alive):
+                self._handle_persistent_connection(conn, client)
+            else:
+                is_shed = self.used_udp \
+                    and self._should_shed(conn.decode(), received_at)
+                self._handle_single_request(conn, client, is_shed)
+        finally:
+            if self.handler_slots is not None:
+                self.handler_slots.release()
+            self._request_finished()
+
+    def _should_shed(self, recv_msg: str, received_at: float) -> bool:
+        """
+        Asks the LoadShedder, if the request should be rejected,
+        before it is processed.
+        """
+        return self.load_shedder is not None \
+            and self.load_shedder.should_shed(
+                recv_msg, self.in_flight, monotonic() - received_at
+            )
+
+    def _request_started(self) -> None:
+        with self.in_flight_changed:
+            self.in_flight += 1
+
+    def _request_finished(self) -> None:
+        with self.in_flight_changed:
+            self.in_flight -= 1
+            self.in_flight_changed.notify_all()
+
+    def _handle_single_request(self,
+                               conn: str or socket,
+                               client: (str, str),
+                               is_shed: bool = False) -> None:
+        try:
+            self._handle_request(conn, client, is_shed)
         # ignore exceptions, since the server doesn't care
         finally:
             if not self.used_udp:
@@ -113,24 +333,134 @@ class RequestServer:
 
     def _handle_request(self,
                         conn: str or socket,
-                        client: None or (str, str)) -> None:
+                        client: None or (str, str),
+                        is_shed: bool = False) -> None:
         """
         Handles an incoming connection request and processes it.
         Arguments should either be a string and None for UDO,
         or a socket object and the client information (str, str) for TCP.
         """
-        simulate_network_delay()  # sending request
-        recv_msg = conn.decode() if self.used_udp else self.read_tcp_data(conn)
-        reply = self.process_request(recv_msg).encode()
+        with tracer.span("request_server.handle_request",
+                         server=self._get_binding_info()):
+            simulate_network_delay()  # sending request
+            recv_msg = conn.decode() if self.used_udp \
+                else self.read_tcp_data(conn)
+            for reply in self._process(recv_msg, client, is_shed):
+                self.socket.sendto(reply, client) if self.used_udp \
+                    else conn.sendall(reply)
+            simulate_network_delay()  # sending response
+
+    def _process(self,
+                 recv_msg: str, client: (str, str),
+                 is_shed: bool = False) -> Iterator[bytes]:
+        """
+        Processes the request and yields the encoded replies.
+        The reply of process_request can be a string,
+        already encoded bytes, a FileReply (only for keep_alive)
+        or an iterable of strings or bytes, to stream multiple replies.
+        Rate limited requests get the reply of the RateLimiter or none,
+        rejected requests the reply of the LoadShedder or none.
+        :param is_shed: True, if the LoadShedder rejected the request.
+        """
+        if self.capture is not None:
+            self.capture.record(recv_msg, client, self.used_udp)
+        if is_shed:
+            reply = self.load_shedder.get_shed_reply(recv_msg)
+            if reply is not None:
+                yield reply.encode()
+            return
+        if self.rate_limiter is not None \
+                and not self.rate_limiter.is_allowed(client[0], recv_msg):
+            reply = self.rate_limiter.get_limited_reply(
+                recv_msg, self.used_udp
+            )
+            if reply is not None:
+                yield reply.encode()
+            return
+        replies = self.process_request(recv_msg)
+        if type(replies) in (str, bytes, FileReply):
+            replies = (replies,)
+        sent_replies = 0
+        for reply in replies:
+            sent_replies += 1
+            yield reply.encode() if type(reply) == str else reply
         if self.log_requests:
             logger.log(f"{datetime.now().strftime('%m/%d/%Y, %H:%M:%S')} |"
                        f" {client[0]}:{client[1]} |"
                        f" Req rec: {DnsMessage.from_str(recv_msg).get_requested_name()} |"
-                       f" #resp snd: 1"
+                       f" #resp snd: {sent_replies}"
                        , key_obj=self)
-        self.socket.sendto(reply, client) if self.used_udp \
-            else conn.sendall(reply)
-        simulate_network_delay()  # sending response
+
+    def _handle_persistent_connection(self,
+                                      conn: socket,
+                                      client: (str, str)) -> None:
+        """
+        Handles all requests of a connection,
+        until the client closes it or the idle timeout is reached.
+        Length prefixed requests are processed in parallel,
+        HTTP requests one after another.
+        """
+        tcp_conn = TcpConnection(conn, self.idle_timeout)
+        with self.in_flight_changed:
+            self.connections.add(tcp_conn)
+        if not self.is_running:  # stopped before the connection was added
+            tcp_conn.stop_reading()
+        try:
+            if self.use_length_prefix:
+                self._handle_framed_requests(tcp_conn, client)
+            else:
+                self._handle_http_requests(tcp_conn, client)
+        finally:
+            tcp_conn.wait_till_idle()
+            tcp_conn.close()
+            with self.in_flight_changed:
+                self.connections.discard(tcp_conn)
+        logger.flush(self)
+
+    def _handle_framed_requests(self,
+                                tcp_conn: TcpConnection,
+                                client: (str, str)) -> None:
+        recv_msg = tcp_conn.read_frame()
+        while recv_msg is not None and self.is_running:
+            tcp_conn.request_started()
+            start_new_thread(
+                self._handle_framed_request,
+                (tcp_conn, recv_msg, client, monotonic())
+            )
+            recv_msg = tcp_conn.read_frame()
+
+    def _handle_framed_request(self,
+                               tcp_conn: TcpConnection, recv_msg: str,
+                               client: (str, str),
+                               received_at: float) -> None:
+        is_shed = self._should_shed(recv_msg, received_at)
+        try:
+            with tracer.span("request_server.handle_request",
+                             server=self._get_binding_info()):
+                simulate_network_delay()  # sending request
+                for reply in self._process(recv_msg, client, is_shed):
+                    if len(reply) > TcpConnection.MAX_FRAME_SIZE:
+                        reply = self._get_oversized_reply(recv_msg)
+                    tcp_conn.send_frame(reply)
+                simulate_network_delay()  # sending response
+        except OSError:  # the client closed the connection, e.g. a stream
+            pass
+        # ignore exceptions, since the server doesn't care
+        finally:
+            tcp_conn.request_finished()
+
+    def _handle_http_requests(self,
+                              tcp_conn: TcpConnection,
+                              client: (str, str)) -> None:
+        recv_msg = tcp_conn.read_http_message()
+        while recv_msg is not None and self.is_running:
+            simulate_network_delay()  # sending request
+            for reply in self._process(recv_msg, client):
+                tcp_conn.send(reply)
+            simulate_network_delay()  # sending response
+            if not self._is_http_keep_alive(recv_msg):
+                break
+            recv_msg = tcp_conn.read_http_message()
 
     def _get_binding_info(self) -> str:
         return ":".join(map(str, self.sock_information))
@@ -1,29 +1,32 @@
 # std libraries
-import socket
 from sys import argv
 from datetime import datetime
 # local
 from dns.dns_message import DnsMessage
-from main import main as run_all_server
+from dns.recursive_resolver.sharded_resolver_client import \
+    ShardedResolverClient
+from main import get_resolver_addresses, load_config, \
+    main as run_all_server
 
 
 run_all_server(in_background=True)
 
 
-rec_res_address = ("127.0.0.10", 53053)  # recursive resolver
-req_domain = "windows.pcpools.fuberlin"
+# the recursive resolvers, the name is sent to the one it is sharded to
+rec_res_client = ShardedResolverClient(
+    get_resolver_addresses(load_config()[2]),
+    use_cache=False, health_check_interval=None
+)
+req_name = "windows.pcpools.fuberlin"
 
 dns_msg = DnsMessage.new_dns_request()
-dns_msg.set_req(req_domain, recursion_desired=True)
+dns_msg.set_req(req_name, recursion_desired=True)
 req_domain = dns_msg.build_message()
 
 
 def send_req(info: str) -> None:
-    client_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
     start_time = datetime.now()
-    client_sock.sendto(req_domain.encode(), rec_res_address)
-    data, _ = client_sock.recvfrom(4096)
+    data = rec_res_client.query(req_name).build_message()
     end_time = datetime.now()
 
     delta_time = end_time - start_time
@@ -33,7 +36,7 @@ def send_req(info: str) -> None:
         "", info,
         "Time:", delta_time, sep,
         "Request:", req_domain, sep,
-        "Response:", data.decode(), sep,
+        "Response:", data, sep,
         sep="\n"
     )
 
@@ -0,0 +1,73 @@
+# Simulates the DNS hierarchy of the config on a virtual clock, e.g.:
+# python simulate.py --duration 3600 --rate 100 --seed 1
+
+# std libraries
+import json
+import sys
+from argparse import ArgumentParser, Namespace
+from time import monotonic
+# local libraries
+from logger import logger
+from main import load_config
+from simulation.latency_model import LatencyModel
+from simulation.simulation import Simulation
+
+
+def started_as_main() -> bool:
+    return __name__ == "__main__"
+
+
+def parse_arguments(argv: [str]) -> Namespace:
+    parser = ArgumentParser(
+        description="Simulates queries to the recursive resolver "
+                    "on a virtual clock and prints a summary."
+    )
+    parser.add_argument("-d", "--duration", type=float, default=3600,
+                        help="Simulated seconds of queries.")
+    parser.add_argument("-r", "--rate", type=float, default=10,
+                        help="Queries per simulated second.")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-n", "--names", default=None,
+                        help="File containing the queried names, "
+                             "one name per line, by default the names "
+                             "of the http servers of the config.")
+    parser.add_argument("--base-delay", type=float,
+                        default=LatencyModel.DEFAULT_BASE_DELAY,
+                        help="Min. one way delay in seconds.")
+    parser.add_argument("--jitter", type=float,
+                        default=LatencyModel.DEFAULT_JITTER,
+                        help="Max. additional one way delay in seconds.")
+    parser.add_argument("--log", action="store_true",
+                        help="Log the requests as the servers would.")
+    return parser.parse_args(argv)
+
+
+def read_names(arguments: Namespace, http_config: {str: str}) -> [str]:
+    if arguments.names is None:
+        return list(http_config.values())
+    with open(arguments.names) as names_file:
+        return [line.strip() for line in names_file if line.strip()]
+
+
+def main(argv: [str]) -> None:
+    arguments = parse_arguments(argv)
+    logger.set_enabled(arguments.log)
+    dns_config, http_config, rec_res_config = load_config()
+    simulation = Simulation(
+        dns_config, rec_res_config, arguments.seed,
+        arguments.base_delay, arguments.jitter
+    )
+    simulation.add_clients(
+        read_names(arguments, http_config),
+        arguments.rate, arguments.duration
+    )
+    start_time = monotonic()
+    simulation.run()
+    summary = simulation.get_summary()
+    summary["wall_seconds"] = monotonic() - start_time
+    print(json.dumps(summary))
+    logger.flush_all()
+
+
+if started_as_main():
+    main(sys.argv[1:])
@@ -0,0 +1,56 @@
+# std libraries
+from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from itertools import count
+from random import Random
+from typing import Callable
+
+
+class EventScheduler:
+    """
+    A discrete event scheduler with a virtual clock.
+    Events are callbacks scheduled for a virtual time,
+    run() executes them in the order of their time
+    and sets the clock to the time of the executed event,
+    so no real time passes while waiting.
+    Events of the same time are executed in the order they were scheduled,
+    so together with the seeded random generator,
+    every run with the same seed has the same result.
+    """
+
+    START_TIME = datetime(2000, 1, 1)  # the datetime of virtual time 0
+
+    def __init__(self, seed: int = 0):
+        self.now = 0.0  # virtual seconds since the start
+        self.random = Random(seed)
+        self.events: [(float, int, Callable, tuple)] = []
+        self.sequence = count()
+        self.processed_events = 0
+
+    def schedule(self, delay: float, callback: Callable, *args) -> None:
+        """
+        Schedules the callback to be called with the arguments
+        after the delay in virtual seconds.
+        """
+        heappush(
+            self.events,
+            (self.now + delay, next(self.sequence), callback, args)
+        )
+
+    def run(self, until: float or None = None) -> None:
+        """
+        Executes the events, until there are no more events
+        or the next event is after the virtual time until.
+        """
+        while self.events and (until is None or self.events[0][0] <= until):
+            self.now, _, callback, args = heappop(self.events)
+            callback(*args)
+            self.processed_events += 1
+        if until is not None and until > self.now:
+            self.now = until
+
+    def get_datetime(self) -> datetime:
+        """
+        Returns the virtual time as datetime, e.g. as clock of a cache.
+        """
+        return EventScheduler.START_TIME + timedelta(seconds=self.now)
@@ -0,0 +1,41 @@
+# std libraries
+from random import Random
+
+
+class LatencyModel:
+    """
+    Models the one way delay of messages to an address,
+    as base delay plus a uniformly distributed jitter.
+    The base delay can be set per address, e.g. for distant servers.
+    The default delays correspond to simulate_network_delay()
+    of the RequestServer, which delays every request by 0.1 seconds.
+    """
+
+    DEFAULT_BASE_DELAY = 0.05  # seconds, per direction
+    DEFAULT_JITTER = 0.0
+
+    def __init__(self,
+                 random: Random,
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 jitter: float = DEFAULT_JITTER,
+                 address_delays: {str: float} or None = None):
+        """
+        :param random: The seeded random generator used for the jitter.
+        :param base_delay: The min. seconds to deliver a message.
+        :param jitter: The max. additional seconds.
+        :param address_delays: Base delays by address,
+        replacing the default base delay.
+        """
+        self.random = random
+        self.base_delay = base_delay
+        self.jitter = jitter
+        self.address_delays = address_delays or {}
+
+    def get_delay(self, address: str) -> float:
+        """
+        Returns the seconds to deliver a message to or from the address.
+        """
+        delay = self.address_delays.get(address, self.base_delay)
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        return delay
@@ -0,0 +1,51 @@
+# std libraries
+from typing import Callable
+# local libraries
+from simulation.event_scheduler import EventScheduler
+from simulation.latency_model import LatencyModel
+
+
+class SimulatedNetwork:
+    """
+    A network on a virtual clock, which delivers requests
+    to the request handlers registered by address,
+    instead of sending them over sockets.
+    The request handlers are the same functions
+    a RequestServer would call, e.g. SimpleDnsServer.handle_request().
+    Requests and responses are delayed as set by the LatencyModel.
+    """
+
+    def __init__(self, scheduler: EventScheduler, latency_model: LatencyModel):
+        self.scheduler = scheduler
+        self.latency_model = latency_model
+        self.handlers: {str: Callable[[str], str]} = {}
+        self.sent_requests = 0
+
+    def register(self,
+                 address: str, handle_request: Callable[[str], str]) -> None:
+        """
+        Sets the function handling the requests sent to the address.
+        """
+        self.handlers[address] = handle_request
+
+    def send(self,
+             address: str, request: str,
+             on_response: Callable[[str], None]) -> None:
+        """
+        Delivers the request to the handler of the address after the delay
+        and calls on_response with the response after another delay.
+        """
+        assert address in self.handlers, f"No server for {address}."
+        self.sent_requests += 1
+        self.scheduler.schedule(
+            self.latency_model.get_delay(address),
+            self._deliver, address, request, on_response
+        )
+
+    def _deliver(self,
+                 address: str, request: str,
+                 on_response: Callable[[str], None]) -> None:
+        response = self.handlers[address](request)
+        self.scheduler.schedule(
+            self.latency_model.get_delay(address), on_response, response
+        )
@@ -0,0 +1,164 @@
+# std libraries
+from itertools import accumulate
+from typing import Generator
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.dns_server.dns_server_batch import DnsServerBatch
+from dns.recursive_resolver.dns_message_cache import DnsMessageCache
+from dns.recursive_resolver.recursive_resolver import RecursiveResolver
+from latency_histogram import LatencyHistogram
+from simulation.event_scheduler import EventScheduler
+from simulation.latency_model import LatencyModel
+from simulation.simulated_network import SimulatedNetwork
+
+
+class Simulation:
+    """
+    Runs the DNS servers and the recursive resolver of a config
+    on a virtual clock, without sockets and without waiting,
+    so e.g. hours of TTL expiry can be simulated in seconds.
+    The servers are the normal SimpleDnsServers and RecursiveResolver,
+    but their sockets are never opened:
+    The requests of the resolution steps of the resolver
+    are delivered by a SimulatedNetwork
+    and the cache of the resolver uses the virtual clock.
+    Clients send queries for random names at exponentially distributed
+    intervals, all random values are drawn from the seeded generator
+    of the scheduler, so a simulation is deterministic.
+    """
+
+    def __init__(self,
+                 dns_config: {str: str}, rec_res_config: {str: str},
+                 seed: int = 0,
+                 base_delay: float = LatencyModel.DEFAULT_BASE_DELAY,
+                 jitter: float = LatencyModel.DEFAULT_JITTER,
+                 zone_file_pattern: str = DnsServerBatch.GENERIC_ZONE_LOC):
+        """
+        :param dns_config: The zone files by the ip address of the server.
+        :param rec_res_config: The config of the recursive resolver.
+        :param seed: The seed for all random values.
+        :param base_delay: The min. one way delay in seconds.
+        :param jitter: The max. additional one way delay in seconds.
+        :param zone_file_pattern: The location of the zone files,
+        see DnsServerBatch.
+        """
+        self.scheduler = EventScheduler(seed)
+        self.network = SimulatedNetwork(
+            self.scheduler,
+            LatencyModel(self.scheduler.random, base_delay, jitter)
+        )
+        self.dns_servers = DnsServerBatch(
+            dns_config, zone_file_pattern=zone_file_pattern
+        )
+        for dns_server in self.dns_servers.dns_servers:
+            self.network.register(
+                dns_server.ip_address, dns_server.handle_request
+            )
+        self.resolver = RecursiveResolver(
+            rec_res_config["root"],
+            cache=DnsMessageCache(clock=self.scheduler.get_datetime)
+        )
+        self.resolver_address = self.resolver.server.sock_information[0]
+        self.latencies = LatencyHistogram()
+        self.queries = 0
+        self.cache_hits = 0
+        self.not_found = 0
+
+    def add_clients(self,
+                    names: [str], rate: float, duration: float,
+                    weights: [float] or None = None) -> None:
+        """
+        Adds clients, which send queries for the names
+        with rate queries per second for the duration in seconds.
+        :param weights: The relative frequencies of the names,
+        by default all names are equally frequent.
+        """
+        cum_weights = list(accumulate(weights)) if weights else None
+        end_time = self.scheduler.now + duration
+        self.scheduler.schedule(
+            self.scheduler.random.expovariate(rate),
+            self._send_next_query, names, cum_weights, rate, end_time
+        )
+
+    def query(self, requested_name: str) -> None:
+        """
+        Sends a query for the name at the current virtual time.
+        """
+        self.queries += 1
+        steps = self.resolver.resolution_steps(requested_name, True)
+        self.scheduler.schedule(
+            self.network.latency_model.get_delay(self.resolver_address),
+            self._resume, steps, None, self.scheduler.now, True
+        )
+
+    def run(self, until: float or None = None) -> None:
+        """
+        Runs the simulation until the virtual time until
+        or until all queries are answered.
+        """
+        self.scheduler.run(until)
+
+    def get_summary(self) -> {str: int or float}:
+        summary = {
+            "simulated_seconds": self.scheduler.now,
+            "events": self.scheduler.processed_events,
+            "queries": self.queries,
+            "answered": self.latencies.count,
+            "cache_hits": self.cache_hits,
+            "hit_rate":
+                self.cache_hits / self.latencies.count
+                if self.latencies.count else 0.0,
+            "not_found": self.not_found,
+            "upstream_requests": self.network.sent_requests
+        }
+        for key, latency in self.latencies.get_summary().items():
+            if key != "count":
+                summary[f"latency_{key}_ms"] = latency * 1000
+        return summary
+
+    def _send_next_query(self,
+                         names: [str], cum_weights: [float] or None,
+                         rate: float, end_time: float) -> None:
+        random = self.scheduler.random
+        self.query(random.choices(names, cum_weights=cum_weights)[0])
+        next_delay = random.expovariate(rate)
+        if self.scheduler.now + next_delay <= end_time:
+            self.scheduler.schedule(
+                next_delay,
+                self._send_next_query, names, cum_weights, rate, end_time
+            )
+
+    def _resume(self,
+                steps: Generator[tuple, DnsMessage, DnsMessage],
+                response: str or None, start_time: float,
+                is_first_step: bool = False) -> None:
+        """
+        Continues the resolution with the response of a name server,
+        until the next request is sent or the name is resolved.
+        """
+        try:
+            request, server_addr = steps.send(
+                None if response is None
+                else DnsMessage.new_dns_response(response)
+            )
+        except StopIteration as resolved:
+            self.scheduler.schedule(
+                self.network.latency_model.get_delay(self.resolver_address),
+                self._answer, resolved.value, start_time, is_first_step
+            )
+            return
+        self.network.send(
+            server_addr[0], request.build_message(),
+            lambda name_server_response: self._resume(
+                steps, name_server_response, start_time
+            )
+        )
+
+    def _answer(self,
+                dns_resp: DnsMessage, start_time: float,
+                is_cache_hit: bool) -> None:
+        self.latencies.add(self.scheduler.now - start_time)
+        if is_cache_hit:
+            self.cache_hits += 1
+        if not dns_resp.get_address():
+            self.not_found += 1
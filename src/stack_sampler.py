@@ -0,0 +1,106 @@
+# std libraries
+import os
+import signal
+import sys
+from _thread import get_ident, start_new_thread
+from collections import Counter
+from datetime import datetime
+from threading import Lock
+from time import monotonic, sleep
+from types import FrameType
+# local libraries
+from logger import logger
+
+
+class StackSampler:
+    """
+    A sampling profiler, which periodically records the stacks
+    of all threads for a fixed duration.
+    In contrast to cProfile, which only profiles the calling thread,
+    this covers the request handler threads as well.
+    The samples are written as collapsed stacks,
+    one line per stack with its frames separated by ';' and its count,
+    which can be turned into a flame graph, e.g. by flamegraph.pl.
+    A capture is started by capture() or by the signal
+    set by install_signal_handler(), so a running server can be profiled.
+    """
+
+    DEFAULT_INTERVAL = 0.005  # seconds between two samples
+    DEFAULT_DURATION = 10  # seconds
+    OUTPUT_PATTERN = "../log/profile_{}.folded"
+
+    @staticmethod
+    def _collapse_stack(frame: FrameType) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(
+                f"{os.path.basename(code.co_filename)}:{code.co_name}"
+            )
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def __init__(self,
+                 interval: float = DEFAULT_INTERVAL,
+                 duration: float = DEFAULT_DURATION,
+                 output_pattern: str = OUTPUT_PATTERN):
+        """
+        :param output_pattern: The filename of the collapsed stacks,
+        containing {} for the start time of the capture.
+        """
+        self.interval = interval
+        self.duration = duration
+        self.output_pattern = output_pattern
+        self.lock = Lock()
+        self.is_capturing = False
+
+    def install_signal_handler(self,
+                               signal_number: int = getattr(
+                                   signal, "SIGUSR1", None)) -> None:
+        """
+        Starts a capture in background, whenever the signal is received.
+        Must be called by the main thread.
+        """
+        if signal_number is not None:  # SIGUSR1 isn't available on windows
+            signal.signal(signal_number, lambda *_: self.capture())
+
+    def capture(self, in_background: bool = True) -> str or None:
+        """
+        Samples the stacks for the set duration.
+        :return: The filename the stacks are written to
+        or None if another capture is running.
+        """
+        with self.lock:
+            if self.is_capturing:
+                return None
+            self.is_capturing = True
+        filename = self.output_pattern.format(
+            datetime.now().strftime("%Y%m%d_%H%M%S")
+        )
+        if in_background:
+            start_new_thread(self._capture, (filename,))
+        else:
+            self._capture(filename)
+        return filename
+
+    def _capture(self, filename: str) -> None:
+        try:
+            stacks = self._sample()
+            with open(filename, "w") as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+            logger.log(f"Wrote {sum(stacks.values())} stack samples "
+                       f"to {filename}", flush=True)
+        finally:
+            self.is_capturing = False
+
+    def _sample(self) -> Counter:
+        own_thread = get_ident()
+        stacks = Counter()
+        end_time = monotonic() + self.duration
+        while monotonic() < end_time:
+            for thread, frame in sys._current_frames().items():
+                if thread != own_thread:
+                    stacks[self._collapse_stack(frame)] += 1
+            sleep(self.interval)
+        return stacks
@@ -0,0 +1,149 @@
+# std libraries
+import socket
+from threading import Condition, Lock
+# local libraries
+from file_reply import FileReply
+
+
+class TcpConnection:
+    """
+    A persistent TCP connection, accepted by a RequestServer.
+    Requests can be read either as DNS messages framed by a
+    2 byte length prefix (see read_frame()),
+    or as HTTP messages delimited by their header and Content-Length
+    (see read_http_message()).
+    Reading returns None, if the client closed the connection
+    or it was idle for longer than the idle timeout.
+    Replies can be sent from multiple threads,
+    so pipelined requests can be answered in any order.
+    The connection should only be closed after wait_till_idle() returned,
+    to ensure every reply was sent.
+    """
+
+    LENGTH_PREFIX_SIZE = 2
+    MAX_FRAME_SIZE = 2 ** (8 * LENGTH_PREFIX_SIZE) - 1
+    HEADER_END = b"\r\n"
+    CONTENT_LENGTH_HEADER = b"content-length:"
+
+    @staticmethod
+    def _parse_content_length(header_line: bytes) -> int or None:
+        try:
+            content_length = int(header_line.split(b":", 1)[1])
+        except ValueError:
+            return None
+        return content_length if content_length >= 0 else None
+
+    def __init__(self, conn: socket.socket, idle_timeout: float):
+        self.conn = conn
+        self.conn.settimeout(idle_timeout)
+        self.reader = conn.makefile("rb")
+        self.send_lock = Lock()
+        self.in_flight = 0
+        self.in_flight_changed = Condition()
+
+    def read_frame(self) -> str or None:
+        """
+        Reads a message, which is prefixed by its length
+        as 2 byte unsigned integer in network byte order.
+        :return: The read message or None if the connection ended.
+        """
+        prefix = self._read_exactly(TcpConnection.LENGTH_PREFIX_SIZE)
+        if prefix is None:
+            return None
+        data = self._read_exactly(int.from_bytes(prefix, "big"))
+        return None if data is None else data.decode()
+
+    def read_http_message(self) -> str or None:
+        """
+        Reads a HTTP message, consisting of the request line, the headers
+        and a body of the length set by the Content-Length header.
+        :return: The read message or None if the connection ended
+        or the Content-Length is invalid, so the connection is closed.
+        """
+        lines = []
+        content_length = 0
+        line = self._read_line()
+        while line not in (None, TcpConnection.HEADER_END, b"\n"):
+            lines.append(line)
+            if line.lower().startswith(TcpConnection.CONTENT_LENGTH_HEADER):
+                content_length = self._parse_content_length(line)
+                if content_length is None:
+                    return None
+            line = self._read_line()
+        if line is None:
+            return None
+        lines.append(line)
+        body = self._read_exactly(content_length)
+        if body is None:
+            return None
+        lines.append(body)
+        return b"".join(lines).decode()
+
+    def send_frame(self, reply: bytes) -> None:
+        """
+        Sends the reply prefixed by its length.
+        Raises ValueError, if the reply is longer than MAX_FRAME_SIZE.
+        """
+        if len(reply) > TcpConnection.MAX_FRAME_SIZE:
+            raise ValueError(f"The reply of {len(reply)} bytes exceeds "
+                             f"the max. frame size.")
+        prefix = len(reply).to_bytes(TcpConnection.LENGTH_PREFIX_SIZE, "big")
+        self.send(prefix + reply)
+
+    def send(self, reply: bytes or FileReply) -> None:
+        """
+        Sends the reply, the content of a FileReply
+        is sent using socket.sendfile().
+        """
+        with self.send_lock:
+            if type(reply) != FileReply:
+                self.conn.sendall(reply)
+                return
+            self.conn.sendall(reply.header)
+            if reply.send_content:
+                with open(reply.filename, "rb") as file:
+                    self.conn.sendfile(file)
+
+    def request_started(self) -> None:
+        with self.in_flight_changed:
+            self.in_flight += 1
+
+    def request_finished(self) -> None:
+        with self.in_flight_changed:
+            self.in_flight -= 1
+            self.in_flight_changed.notify_all()
+
+    def wait_till_idle(self) -> None:
+        """
+        Blocks until all started requests are finished.
+        """
+        with self.in_flight_changed:
+            self.in_flight_changed.wait_for(lambda: self.in_flight == 0)
+
+    def stop_reading(self) -> None:
+        """
+        Shuts down the receiving side, so the next read returns None,
+        while replies can still be sent.
+        """
+        try:
+            self.conn.shutdown(socket.SHUT_RD)
+        except OSError:  # already closed by the client
+            pass
+
+    def close(self) -> None:
+        self.reader.close()
+        self.conn.close()
+
+    def _read_line(self) -> bytes or None:
+        try:
+            line = self.reader.readline()
+        except (socket.timeout, OSError):
+            return None
+        return line or None
+
+    def _read_exactly(self, size: int) -> bytes or None:
+        try:
+            data = self.reader.read(size)
+        except (socket.timeout, OSError):
+            return None
+        return data if len(data) == size else None
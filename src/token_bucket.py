@@ -0,0 +1,58 @@
+# std libraries
+from threading import Lock
+from time import monotonic, sleep
+
+
+class TokenBucket:
+    """
+    A token bucket, used to limit the rate of events.
+    The bucket is refilled with rate tokens per second,
+    up to a maximum of burst tokens.
+    Tokens can be consumed by try_consume(), which won't block,
+    or by consume(), which waits until enough tokens are available.
+    """
+
+    def __init__(self, rate: float, burst: float or None = None):
+        """
+        :param rate: The tokens added per second.
+        :param burst: The max. count of tokens, defaults to the rate.
+        """
+        self.rate = rate
+        self.burst = max(burst if burst is not None else rate, 1)
+        self.tokens = self.burst
+        self.last_update = monotonic()
+        self.lock = Lock()
+
+    def try_consume(self, tokens: float = 1) -> bool:
+        """
+        Consumes the tokens, if there are enough.
+        :return: True, if the tokens were consumed.
+        """
+        return self._consume_or_get_wait_time(tokens) == 0
+
+    def consume(self, tokens: float = 1) -> None:
+        """
+        Waits until there are enough tokens and consumes them.
+        """
+        wait_time = self._consume_or_get_wait_time(tokens)
+        while wait_time > 0:
+            sleep(wait_time)
+            wait_time = self._consume_or_get_wait_time(tokens)
+
+    def get_idle_time(self) -> float:
+        """
+        Returns the seconds since the bucket was used the last time.
+        """
+        return monotonic() - self.last_update
+
+    def _consume_or_get_wait_time(self, tokens: float) -> float:
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(
+                self.tokens + (now - self.last_update) * self.rate, self.burst
+            )
+            self.last_update = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
@@ -0,0 +1,154 @@
+# std libraries
+import sys
+from json import loads as load_json
+from random import Random
+from time import monotonic
+# local libraries
+from dns.dns_message import DnsMessage
+from dns.dns_server.dns_server_batch import DnsServerBatch
+from latency_histogram import LatencyHistogram
+from memory_usage import get_rss
+from request_server import RequestServer
+from simulation.simulation import Simulation
+from topology.topology_generator import TopologyGenerator
+
+
+class ScaleBenchmark:
+    """
+    Measures how the servers behave for a generated topology:
+    The time to generate it, the time to start a DnsServerBatch for it,
+    the additional memory (RSS) per server, the latency of
+    authoritative lookups for random leaf names
+    and the hit rate of the recursive resolver.
+    The lookups call handle_request() of the leaf zone servers directly,
+    so the latency doesn't include the simulated network delay.
+    The resolver is measured by a Simulation on a virtual clock,
+    with clients querying a set of random leaf names.
+    """
+
+    DEFAULT_LOOKUPS = 1000
+    DEFAULT_QUERY_RATE = 100  # queries per simulated second
+    DEFAULT_QUERY_DURATION = 600  # simulated seconds
+    DEFAULT_DISTINCT_NAMES = 1000
+    DRAIN_TIMEOUT = 5  # seconds
+    LISTEN_TIMEOUT = 5  # seconds
+
+    def __init__(self,
+                 generator: TopologyGenerator, output_dir: str,
+                 lookups: int = DEFAULT_LOOKUPS,
+                 query_rate: float = DEFAULT_QUERY_RATE,
+                 query_duration: float = DEFAULT_QUERY_DURATION,
+                 distinct_names: int = DEFAULT_DISTINCT_NAMES,
+                 seed: int = 0, transport: object or None = None):
+        """
+        :param output_dir: The directory to generate the topology in.
+        :param lookups: The count of authoritative lookups.
+        :param query_rate: The queries per simulated second to the resolver.
+        :param query_duration: The simulated seconds of queries.
+        :param distinct_names: The count of different names queried.
+        :param transport: Creates the sockets of the servers,
+        by default kernel sockets.
+        """
+        self.generator = generator
+        self.output_dir = output_dir
+        self.lookups = lookups
+        self.query_rate = query_rate
+        self.query_duration = query_duration
+        self.distinct_names = distinct_names
+        self.random = Random(seed)
+        self.seed = seed
+        self.transport = transport
+        self.zone_file_pattern = \
+            TopologyGenerator.get_zone_file_pattern(output_dir)
+
+    def run(self) -> {str: int or float}:
+        """
+        Generates the topology and returns the measured values.
+        """
+        results = {
+            "depth": self.generator.depth,
+            "fan_out": self.generator.fan_out,
+            "records_per_zone": self.generator.records_per_zone,
+            "zones": self.generator.get_zone_count(),
+            "records": self.generator.get_record_count()
+        }
+        start_time = monotonic()
+        config_file = self.generator.generate(self.output_dir)
+        results["generate_seconds"] = monotonic() - start_time
+        with open(config_file) as file:
+            config = load_json(file.read())
+        results.update(self._measure_servers(config["DnsConfig"]))
+        results.update(self._measure_resolver(
+            config["DnsConfig"], config["RecResConfig"]
+        ))
+        return results
+
+    def _measure_servers(self,
+                         dns_config: {str: str}) -> {str: int or float}:
+        rss_before = get_rss()
+        threads_before = len(sys._current_frames())
+        start_time = monotonic()
+        dns_servers = DnsServerBatch(
+            dns_config, transport=self.transport,
+            zone_file_pattern=self.zone_file_pattern
+        )
+        dns_servers.run_all(log_separator=False)
+        # the listener threads may not be running yet after run_all()
+        RequestServer.wait_till_all_listening(ScaleBenchmark.LISTEN_TIMEOUT)
+        startup_seconds = monotonic() - start_time
+        rss = get_rss() - rss_before
+        results = {
+            "startup_seconds": startup_seconds,
+            "rss_mb": rss / 2 ** 20,
+            "rss_per_server_kb": rss / len(dns_servers.dns_servers) / 2 ** 10,
+            "threads": len(sys._current_frames()) - threads_before
+        }
+        servers_by_address = {
+            dns_server.ip_address: dns_server
+            for dns_server in dns_servers.dns_servers
+        }
+        latencies = LatencyHistogram()
+        for _ in range(self.lookups):
+            name, path = self.generator.get_random_leaf_name(self.random)
+            dns_request = DnsMessage.new_dns_request()
+            dns_request.set_req(name)
+            request = dns_request.build_message()
+            dns_server = servers_by_address[
+                self.generator.get_server_address(path)
+            ]
+            lookup_start = monotonic()
+            dns_server.handle_request(request)
+            latencies.add(monotonic() - lookup_start)
+        for key, latency in latencies.get_summary().items():
+            if key != "count":
+                results[f"lookup_{key}_ms"] = latency * 1000
+        dns_servers.stop()
+        RequestServer.wait_till_all_drained(ScaleBenchmark.DRAIN_TIMEOUT)
+        return results
+
+    def _measure_resolver(self,
+                          dns_config: {str: str},
+                          rec_res_config: {str: str}) -> {str: int or float}:
+        simulation = Simulation(
+            dns_config, rec_res_config, self.seed,
+            zone_file_pattern=self.zone_file_pattern
+        )
+        names = [
+            self.generator.get_random_leaf_name(self.random)[0]
+            for _ in range(self.distinct_names)
+        ]
+        simulation.add_clients(names, self.query_rate, self.query_duration)
+        start_time = monotonic()
+        simulation.run()
+        summary = simulation.get_summary()
+        return {
+            "resolver_queries": summary["queries"],
+            "resolver_hit_rate": summary["hit_rate"],
+            "resolver_not_found": summary["not_found"],
+            "upstream_per_query":
+                summary["upstream_requests"] / summary["queries"]
+                if summary["queries"] else 0.0,
+            "resolver_p50_ms": summary["latency_p50_ms"],
+            "resolver_p99_ms": summary["latency_p99_ms"],
+            "simulation_seconds": monotonic() - start_time
+        }
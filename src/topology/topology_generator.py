@@ -0,0 +1,157 @@
+# std libraries
+import json
+import os
+from ipaddress import IPv4Address
+from itertools import product
+from random import Random
+from typing import Iterator
+
+
+class TopologyGenerator:
+    """
+    Generates a synthetic DNS hierarchy as zone files and a config,
+    in the format of rsrc/zone_files and rsrc/config.json.
+    Every zone above the max. depth delegates to fan_out child zones
+    by NS records, each zone at the max. depth contains
+    records_per_zone A records, so the hierarchy contains
+    fan_out ** depth * records_per_zone leaf records.
+    The zones below the root are named by their path,
+    e.g. z7.z3 is the 8th child zone of the 4th child zone of the root,
+    and the leaf names are h<index>.<zone>, e.g. h0.z7.z3.
+    Every zone gets its own DNS server, the addresses are assigned
+    in breadth first order starting at FIRST_SERVER_ADDRESS,
+    so names and addresses can be computed without reading the zone files.
+    """
+
+    ROOT_ZONE = "root"
+    ZONE_LABEL = "z{}"
+    HOST_LABEL = "h{}"
+    DEFAULT_TTL = 300
+    FIRST_SERVER_ADDRESS = IPv4Address("127.1.0.0")
+    LAST_SERVER_ADDRESS = IPv4Address("127.255.255.254")
+    FIRST_HOST_ADDRESS = IPv4Address("10.0.0.0")
+    HOST_ADDRESS_COUNT = 2 ** 24  # 10.0.0.0/8, reused if exceeded
+    ZONE_DIR = "zone_files"
+    CONFIG_FILE = "config.json"
+
+    @classmethod
+    def get_zone_file_pattern(cls, output_dir: str) -> str:
+        """
+        Returns the pattern of the generated zone files,
+        as used by DnsServerBatch.
+        """
+        return os.path.join(output_dir, cls.ZONE_DIR, "{}.zone")
+
+    @classmethod
+    def get_zone_name(cls, path: (int,)) -> str:
+        """
+        Returns the name of the zone,
+        which is reached from the root by the child indices of the path.
+        """
+        if not path:
+            return cls.ROOT_ZONE
+        return ".".join(cls.ZONE_LABEL.format(i) for i in reversed(path))
+
+    def __init__(self,
+                 depth: int = 2, fan_out: int = 10,
+                 records_per_zone: int = 100, ttl: int = DEFAULT_TTL):
+        """
+        :param depth: The count of zone levels below the root.
+        :param fan_out: The count of child zones per delegating zone.
+        :param records_per_zone: The count of A records per leaf zone.
+        :param ttl: The ttl of all records.
+        """
+        assert depth >= 1 and fan_out >= 1 and records_per_zone >= 1, \
+            "Depth, fan out and records per zone must be positive."
+        self.depth = depth
+        self.fan_out = fan_out
+        self.records_per_zone = records_per_zone
+        self.ttl = ttl
+        assert self.get_zone_count() <= int(
+            TopologyGenerator.LAST_SERVER_ADDRESS
+        ) - int(TopologyGenerator.FIRST_SERVER_ADDRESS), \
+            "Too many zones, there aren't enough loopback addresses."
+
+    def get_zone_count(self) -> int:
+        return sum(self.fan_out ** level for level in range(self.depth + 1))
+
+    def get_leaf_zone_count(self) -> int:
+        return self.fan_out ** self.depth
+
+    def get_record_count(self) -> int:
+        """
+        Returns the count of all records, the NS and the A records.
+        """
+        return self.get_zone_count() - 1 \
+            + self.get_leaf_zone_count() * self.records_per_zone
+
+    def iter_zones(self) -> Iterator[(int,)]:
+        """
+        Yields the paths of all zones in breadth first order.
+        """
+        for level in range(self.depth + 1):
+            yield from product(range(self.fan_out), repeat=level)
+
+    def get_server_address(self, path: (int,)) -> str:
+        """
+        Returns the address of the DNS server of the zone.
+        """
+        index = sum(self.fan_out ** level for level in range(len(path))) \
+            + self._get_index_in_level(path)
+        return str(TopologyGenerator.FIRST_SERVER_ADDRESS + index)
+
+    def get_random_leaf_name(self, random: Random) -> (str, (int,)):
+        """
+        Returns a random leaf name and the path of its zone.
+        """
+        path = tuple(random.randrange(self.fan_out) for _ in range(self.depth))
+        host = TopologyGenerator.HOST_LABEL.format(
+            random.randrange(self.records_per_zone)
+        )
+        return f"{host}.{self.get_zone_name(path)}", path
+
+    def generate(self, output_dir: str) -> str:
+        """
+        Writes the zone files and the config into the output directory.
+        :return: The filename of the config.
+        """
+        os.makedirs(os.path.join(output_dir, TopologyGenerator.ZONE_DIR),
+                    exist_ok=True)
+        zone_file_pattern = self.get_zone_file_pattern(output_dir)
+        dns_config = {}
+        for path in self.iter_zones():
+            zone = self.get_zone_name(path)
+            dns_config[self.get_server_address(path)] = zone
+            with open(zone_file_pattern.format(zone), "w") as zone_file:
+                zone_file.write("\n".join(self._get_zone_lines(path)))
+        config = {
+            "DnsConfig": dns_config,
+            "HttpConfig": {},
+            "RecResConfig": {"root": self.get_server_address(())}
+        }
+        config_file = os.path.join(output_dir, TopologyGenerator.CONFIG_FILE)
+        with open(config_file, "w") as file:
+            json.dump(config, file, indent=2)
+        return config_file
+
+    def _get_zone_lines(self, path: (int,)) -> Iterator[str]:
+        if len(path) < self.depth:
+            for child_index in range(self.fan_out):
+                child_path = path + (child_index,)
+                yield f"{self.get_zone_name(child_path)}\t{self.ttl} " \
+                      f"IN NS {self.get_server_address(child_path)}"
+            return
+        zone = self.get_zone_name(path)
+        first_host = self._get_index_in_level(path) * self.records_per_zone
+        address_count = TopologyGenerator.HOST_ADDRESS_COUNT
+        for host_index in range(self.records_per_zone):
+            address = TopologyGenerator.FIRST_HOST_ADDRESS \
+                + (first_host + host_index) % address_count
+            yield f"{TopologyGenerator.HOST_LABEL.format(host_index)}." \
+                  f"{zone}\t{self.ttl} IN A {address}"
+
+    def _get_index_in_level(self, path: (int,)) -> int:
+        index = 0
+        for child_index in path:
+            index = index * self.fan_out + child_index
+        return index
@@ -0,0 +1,163 @@
+# std libraries
+import json
+from collections import deque
+from contextlib import contextmanager
+from random import random
+from threading import local
+from time import perf_counter, time
+from typing import Callable, Iterator
+# local libraries
+from logger import logger
+
+
+class Tracer:
+    """
+    Records spans of requests, to find out which step of a request is slow.
+    A span is measured by the context manager span(),
+    the first span of a thread starts a trace, which ends with this span.
+    Spans are stored as tuples of the name, the nesting depth,
+    the start offset and the duration in seconds and the attributes.
+    A sample of the finished traces is kept in a ring buffer,
+    traces slower than the slow threshold are always kept
+    and written to the slow query log.
+    Functions executed by other threads can be bound to the current trace
+    by wrap().
+    Tracing is disabled until configure() is called.
+    """
+
+    DEFAULT_SAMPLE_RATE = 0.01
+    DEFAULT_SLOW_THRESHOLD = 1.0  # seconds
+    DEFAULT_BUFFER_SIZE = 1024
+    SLOW_QUERY_LOG = "../log/slow_queries.log"
+
+    @staticmethod
+    def format_trace(trace: {str: object}) -> str:
+        """
+        Formats the trace as one line per span, indented by its depth.
+        """
+        lines = [f"{trace['timestamp']:.3f} | {trace['duration']:.4f}s"]
+        for name, depth, start, duration, attributes in trace["spans"]:
+            attribute_text = " ".join(
+                f"{key}={value}" for key, value in attributes.items()
+            )
+            lines.append(f"{'  ' * (depth + 1)}{name} +{start:.4f}s "
+                         f"{duration:.4f}s {attribute_text}".rstrip())
+        return "\n".join(lines)
+
+    def __init__(self):
+        self.is_enabled = False
+        self.sample_rate = 0.0
+        self.slow_threshold = None
+        self.traces = deque(maxlen=Tracer.DEFAULT_BUFFER_SIZE)
+        self.current = local()  # trace and depth of the thread
+        self.finished_traces = 0
+        self.slow_traces = 0
+
+    def configure(self,
+                  sample_rate: float = DEFAULT_SAMPLE_RATE,
+                  slow_threshold: float or None = DEFAULT_SLOW_THRESHOLD,
+                  buffer_size: int = DEFAULT_BUFFER_SIZE,
+                  slow_query_log: str = SLOW_QUERY_LOG) -> None:
+        """
+        Enables tracing.
+        :param sample_rate: The share of traces kept in the ring buffer.
+        :param slow_threshold: The seconds after which a trace is logged
+        as slow query or None to disable the slow query log.
+        :param buffer_size: The max. count of kept traces.
+        :param slow_query_log: The file, slow traces are logged into.
+        """
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.traces = deque(self.traces, maxlen=buffer_size)
+        logger.register_logger(key_obj=self, log_file_name=slow_query_log)
+        self.is_enabled = sample_rate > 0 or slow_threshold is not None
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[None]:
+        """
+        Measures the duration of the with block as span.
+        :param attributes: Values stored with the span, e.g. the name.
+        """
+        if not self.is_enabled:
+            yield
+            return
+        trace = getattr(self.current, "trace", None)
+        is_root = trace is None
+        if is_root:
+            trace = self.current.trace = (time(), perf_counter(), [])
+            self.current.depth = 0
+        depth = self.current.depth
+        self.current.depth = depth + 1
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            duration = perf_counter() - start
+            self.current.depth = depth
+            trace[2].append(
+                (name, depth, start - trace[1], duration, attributes)
+            )
+            if is_root:
+                self.current.trace = None
+                self._finish_trace(trace, duration)
+
+    def wrap(self, function: Callable) -> Callable:
+        """
+        Returns a function, which records its spans in the current trace,
+        even if it is called by another thread.
+        """
+        trace = getattr(self.current, "trace", None)
+        if trace is None:
+            return function
+        depth = self.current.depth
+
+        def traced_function(*args, **kwargs):
+            self.current.trace, self.current.depth = trace, depth
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.current.trace = None
+
+        return traced_function
+
+    def get_traces(self) -> [{str: object}]:
+        """
+        Returns the kept traces, the oldest first.
+        """
+        return list(self.traces)
+
+    def get_metrics(self) -> {str: int}:
+        return {
+            "finished_traces": self.finished_traces,
+            "slow_traces": self.slow_traces,
+            "kept_traces": len(self.traces)
+        }
+
+    def dump(self, filename: str) -> None:
+        """
+        Writes the kept traces as JSON lines.
+        """
+        with open(filename, "w") as file:
+            for trace in self.get_traces():
+                file.write(json.dumps(trace, default=str) + "\n")
+
+    def _finish_trace(self,
+                      trace: (float, float, [tuple]),
+                      duration: float) -> None:
+        self.finished_traces += 1
+        is_slow = self.slow_threshold is not None \
+            and duration >= self.slow_threshold
+        if not is_slow and random() >= self.sample_rate:
+            return
+        finished_trace = {
+            "timestamp": trace[0],
+            "duration": duration,
+            "spans": sorted(trace[2], key=lambda span: span[2])
+        }
+        self.traces.append(finished_trace)
+        if is_slow:
+            self.slow_traces += 1
+            logger.log(self.format_trace(finished_trace), self, flush=True)
+
+
+tracer = Tracer()
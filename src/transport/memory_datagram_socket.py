@@ -0,0 +1,83 @@
+# std libraries
+import errno
+import socket
+from queue import Empty, Queue
+# local libraries
+from transport.memory_network import MemoryNetwork
+
+
+class MemoryDatagramSocket:
+    """
+    A UDP socket of a MemoryTransport.
+    Datagrams sent to an address are put into the queue
+    of the socket bound to it, datagrams to unbound addresses are lost.
+    As for kernel sockets, shutting down the receiving side
+    wakes a blocked recvfrom(), which returns an empty datagram.
+    """
+
+    SHUTDOWN = None  # put into the queue to wake up recvfrom()
+
+    def __init__(self, network: MemoryNetwork):
+        self.network = network
+        self.address = None
+        self.datagrams = Queue()
+        self.timeout = None
+        self.is_shut_down = False
+        self.is_closed = False
+
+    def setsockopt(self, *_) -> None:
+        """
+        Options are ignored, e.g. SO_REUSEPORT isn't supported.
+        """
+
+    def settimeout(self, timeout: float or None) -> None:
+        self.timeout = timeout
+
+    def bind(self, address: (str, int)) -> None:
+        self.network.bind(True, tuple(address), self)
+        self.address = tuple(address)
+
+    def getsockname(self) -> (str, int) or None:
+        return self.address
+
+    def sendto(self, data: bytes, address: (str, int)) -> int:
+        self._ensure_open()
+        if self.address is None:
+            self.bind(self.network.get_ephemeral_address())
+        receiver = self.network.get_socket(True, address)
+        if receiver is not None and not receiver.is_shut_down:
+            receiver.datagrams.put((bytes(data), self.address))
+        return len(data)
+
+    def recvfrom(self, buffer_size: int) -> (bytes, (str, int) or None):
+        """
+        Returns the next datagram, truncated to the buffer size,
+        and the address of the sender.
+        Raises socket.timeout, if no datagram arrived within the timeout.
+        """
+        self._ensure_open()
+        if self.is_shut_down and self.datagrams.empty():
+            return b"", None
+        try:
+            datagram = self.datagrams.get(timeout=self.timeout)
+        except Empty:
+            raise socket.timeout("timed out")
+        if datagram is MemoryDatagramSocket.SHUTDOWN:
+            self._ensure_open()
+            return b"", None
+        data, sender = datagram
+        return data[:buffer_size], sender
+
+    def shutdown(self, _) -> None:
+        self.is_shut_down = True
+        self.datagrams.put(MemoryDatagramSocket.SHUTDOWN)
+
+    def close(self) -> None:
+        if self.address is not None:
+            self.network.unbind(True, self.address, self)
+        self.is_closed = True
+        self.shutdown(socket.SHUT_RDWR)
+
+    def _ensure_open(self) -> None:
+        if self.is_closed:
+            raise OSError(errno.EBADF, "Bad file descriptor")
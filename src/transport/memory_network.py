@@ -0,0 +1,48 @@
+# std libraries
+import errno
+from itertools import count
+from threading import Lock
+
+
+class MemoryNetwork:
+    """
+    Routes messages between the sockets of a MemoryTransport by address,
+    like the loopback interface, but without kernel sockets.
+    Any (ip address, port) pair can be bound,
+    without configuring addresses or conflicting with other networks,
+    so multiple isolated topologies can run in one process.
+    Unbound sockets get an ephemeral address when they send the first time.
+    """
+
+    EPHEMERAL_HOST = "memory"
+    FIRST_EPHEMERAL_PORT = 49152
+
+    def __init__(self):
+        self.sockets: {(bool, (str, int)): object} = {}
+        self.lock = Lock()
+        self.ephemeral_ports = count(MemoryNetwork.FIRST_EPHEMERAL_PORT)
+
+    def bind(self, use_udp: bool, address: (str, int), sock: object) -> None:
+        """
+        Binds the socket to the address for the protocol.
+        Raises OSError, if the address is already in use.
+        """
+        with self.lock:
+            if (use_udp, address) in self.sockets:
+                raise OSError(errno.EADDRINUSE, "Address already in use")
+            self.sockets[(use_udp, address)] = sock
+
+    def unbind(self, use_udp: bool, address: (str, int), sock: object) -> None:
+        with self.lock:
+            if self.sockets.get((use_udp, address)) is sock:
+                del self.sockets[(use_udp, address)]
+
+    def get_socket(self, use_udp: bool, address: (str, int)) -> object:
+        """
+        Returns the socket bound to the address or None.
+        """
+        return self.sockets.get((use_udp, tuple(address)))
+
+    def get_ephemeral_address(self) -> (str, int):
+        with self.lock:
+            return MemoryNetwork.EPHEMERAL_HOST, next(self.ephemeral_ports)
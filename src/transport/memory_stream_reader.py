@@ -0,0 +1,21 @@
+# std libraries
+from io import RawIOBase
+
+
+class MemoryStreamReader(RawIOBase):
+    """
+    The raw reader of a MemoryStreamSocket,
+    returned as buffered reader by MemoryStreamSocket.makefile().
+    """
+
+    def __init__(self, sock: object):
+        super().__init__()
+        self.sock = sock
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: memoryview) -> int:
+        data = self.sock.recv(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
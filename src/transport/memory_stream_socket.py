@@ -0,0 +1,148 @@
+# std libraries
+import errno
+import socket
+from io import BufferedReader
+from queue import Empty, Queue
+from threading import Condition
+# local libraries
+from transport.memory_network import MemoryNetwork
+from transport.memory_stream_reader import MemoryStreamReader
+
+
+class MemoryStreamSocket:
+    """
+    A TCP socket of a MemoryTransport.
+    A listening socket queues the connections to accept,
+    connect() creates the server side socket of the connection
+    and puts it into the queue of the listening socket bound to the address.
+    Both sides of a connection append the sent bytes
+    to the buffer of the other side.
+    As for kernel sockets, shutting down the receiving side
+    wakes a blocked accept() or recv().
+    """
+
+    SHUTDOWN = None  # put into the queue to wake up accept()
+
+    def __init__(self, network: MemoryNetwork):
+        self.network = network
+        self.address = None
+        self.peer: MemoryStreamSocket or None = None
+        self.pending_connections: Queue or None = None
+        self.buffer = bytearray()
+        self.buffer_changed = Condition()
+        self.timeout = None
+        self.is_eof = False  # True, if no more bytes will be received
+        self.is_closed = False
+
+    def setsockopt(self, *_) -> None:
+        """
+        Options are ignored, e.g. SO_REUSEPORT isn't supported.
+        """
+
+    def settimeout(self, timeout: float or None) -> None:
+        self.timeout = timeout
+
+    def bind(self, address: (str, int)) -> None:
+        self.network.bind(False, tuple(address), self)
+        self.address = tuple(address)
+
+    def getsockname(self) -> (str, int) or None:
+        return self.address
+
+    def listen(self, _backlog: int = 0) -> None:
+        self.pending_connections = Queue()
+
+    def accept(self) -> ("MemoryStreamSocket", (str, int)):
+        """
+        Returns the socket and the address of the next connection.
+        Raises OSError, if the socket was shut down.
+        """
+        self._ensure_open()
+        try:
+            connection = self.pending_connections.get(timeout=self.timeout)
+        except Empty:
+            raise socket.timeout("timed out")
+        if connection is MemoryStreamSocket.SHUTDOWN:
+            self.pending_connections.put(MemoryStreamSocket.SHUTDOWN)
+            raise OSError(errno.EINVAL, "Invalid argument")
+        return connection, connection.peer.address
+
+    def connect(self, address: (str, int)) -> None:
+        """
+        Connects to the listening socket bound to the address.
+        Raises ConnectionRefusedError, if no socket is listening.
+        """
+        listener = self.network.get_socket(False, address)
+        if listener is None or listener.pending_connections is None \
+                or listener.is_closed:
+            raise ConnectionRefusedError(
+                errno.ECONNREFUSED, "Connection refused"
+            )
+        if self.address is None:
+            self.address = self.network.get_ephemeral_address()
+        server_side = MemoryStreamSocket(self.network)
+        server_side.address = tuple(address)
+        server_side.peer, self.peer = self, server_side
+        listener.pending_connections.put(server_side)
+
+    def sendall(self, data: bytes) -> None:
+        self._ensure_open()
+        if self.peer is None or self.peer.is_eof:
+            raise BrokenPipeError(errno.EPIPE, "Broken pipe")
+        with self.peer.buffer_changed:
+            self.peer.buffer += data
+            self.peer.buffer_changed.notify_all()
+
+    def send(self, data: bytes) -> int:
+        self.sendall(data)
+        return len(data)
+
+    def sendfile(self, file) -> int:
+        data = file.read()
+        self.sendall(data)
+        return len(data)
+
+    def recv(self, buffer_size: int) -> bytes:
+        """
+        Returns up to buffer_size received bytes,
+        or no bytes, if the connection was closed.
+        Raises socket.timeout, if no bytes arrived within the timeout.
+        """
+        self._ensure_open()
+        with self.buffer_changed:
+            is_ready = self.buffer_changed.wait_for(
+                lambda: self.buffer or self.is_eof, self.timeout
+            )
+            if not is_ready:
+                raise socket.timeout("timed out")
+            data = bytes(self.buffer[:buffer_size])
+            del self.buffer[:buffer_size]
+            return data
+
+    def makefile(self, _mode: str = "rb") -> BufferedReader:
+        return BufferedReader(MemoryStreamReader(self))
+
+    def shutdown(self, how: int) -> None:
+        if how in (socket.SHUT_RD, socket.SHUT_RDWR):
+            self._set_eof()
+            if self.pending_connections is not None:
+                self.pending_connections.put(MemoryStreamSocket.SHUTDOWN)
+        if how in (socket.SHUT_WR, socket.SHUT_RDWR) and self.peer:
+            self.peer._set_eof()
+
+    def close(self) -> None:
+        if self.is_closed:
+            return
+        if self.address is not None and self.pending_connections is not None:
+            self.network.unbind(False, self.address, self)
+        self.shutdown(socket.SHUT_RDWR)
+        self.is_closed = True
+
+    def _set_eof(self) -> None:
+        with self.buffer_changed:
+            self.is_eof = True
+            self.buffer_changed.notify_all()
+
+    def _ensure_open(self) -> None:
+        if self.is_closed:
+            raise OSError(errno.EBADF, "Bad file descriptor")
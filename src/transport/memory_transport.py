@@ -0,0 +1,27 @@
+# local libraries
+from transport.memory_datagram_socket import MemoryDatagramSocket
+from transport.memory_network import MemoryNetwork
+from transport.memory_stream_socket import MemoryStreamSocket
+
+
+class MemoryTransport:
+    """
+    A transport, which creates in-memory sockets,
+    connected by a MemoryNetwork instead of the kernel network.
+    UDP sockets exchange datagrams through queues,
+    TCP sockets exchange byte streams through buffers.
+    Every MemoryTransport uses its own network by default,
+    so the servers and clients of a topology must share the transport.
+    """
+
+    def __init__(self, network: MemoryNetwork or None = None):
+        self.network = network if network is not None else MemoryNetwork()
+
+    def create_socket(self,
+                      use_udp: bool
+                      ) -> MemoryDatagramSocket or MemoryStreamSocket:
+        """
+        Creates a UDP socket, if use_udp is True, else a TCP socket.
+        """
+        return MemoryDatagramSocket(self.network) if use_udp \
+            else MemoryStreamSocket(self.network)
@@ -0,0 +1,21 @@
+# std libraries
+import socket
+
+
+class SocketTransport:
+    """
+    The default transport, which creates kernel UDP and TCP sockets.
+    A transport is used by the servers and clients to create their sockets,
+    so the same code can run over the kernel network
+    or e.g. over a MemoryTransport inside one process.
+    Every transport offers create_socket(),
+    returning an object with the methods of socket.socket
+    used by the servers and clients.
+    """
+
+    def create_socket(self, use_udp: bool) -> socket.socket:
+        """
+        Creates a UDP socket, if use_udp is True, else a TCP socket.
+        """
+        socket_type = socket.SOCK_DGRAM if use_udp else socket.SOCK_STREAM
+        return socket.socket(socket.AF_INET, socket_type)
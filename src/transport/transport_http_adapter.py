@@ -0,0 +1,35 @@
+# third party libraries
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool
+# local libraries
+from transport.transport_http_connection import TransportHttpConnection
+
+
+class TransportHttpAdapter(HTTPAdapter):
+    """
+    A requests adapter, which sends HTTP requests over sockets
+    created by a transport instead of kernel sockets,
+    e.g. so a requests.Session reaches the servers of a MemoryTransport.
+    The connections are pooled like by a HTTPAdapter, only HTTP is supported.
+    """
+
+    def __init__(self, transport: object, **kwargs):
+        """
+        :param transport: Creates the sockets of the connections.
+        :param kwargs: The arguments of the HTTPAdapter.
+        """
+        self.transport = transport  # init_poolmanager() is called by init
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": self._create_pool
+        }
+
+    def _create_pool(self,
+                     host: str, port: int, **kwargs) -> HTTPConnectionPool:
+        pool = HTTPConnectionPool(host, port, **kwargs)
+        pool.ConnectionCls = TransportHttpConnection
+        pool.conn_kw["transport"] = self.transport
+        return pool
@@ -0,0 +1,41 @@
+# std libraries
+import socket
+# third party libraries
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+
+class TransportHttpConnection(HTTPConnection):
+    """
+    A urllib3 HTTP connection, whose socket is created by a transport,
+    e.g. to reach the HTTP servers of a MemoryTransport.
+    Sockets of a transport can't be polled like kernel sockets,
+    so a pooled connection counts as dropped, once the peer closed it.
+    """
+
+    def __init__(self, *args, transport: object, **kwargs):
+        """
+        :param transport: Creates the socket of the connection.
+        """
+        super().__init__(*args, **kwargs)
+        self.transport = transport
+
+    @property
+    def is_connected(self) -> bool:
+        return self.sock is not None and not self.sock.is_eof
+
+    def _new_conn(self) -> object:
+        sock = self.transport.create_socket(False)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect((self._dns_host, self.port))
+        except socket.timeout as error:
+            raise ConnectTimeoutError(
+                self, f"Connection to {self.host} timed out."
+            ) from error
+        except OSError as error:
+            raise NewConnectionError(
+                self, f"Failed to establish a new connection: {error}"
+            ) from error
+        return sock